@@ -0,0 +1,269 @@
+"""Admission control: shed low-priority work early instead of queueing it.
+
+Every route has a priority class, declared with @admission_priority:
+
+    critical - payments, login and payment sessions
+    normal   - everything not declared otherwise
+    low      - bill and list polling, export and import
+    exempt   - health checks and metrics, never shed
+
+A request is shed with a fast 503 and Retry-After when
+  * it waited longer than its class allows in the server's queue, taken
+    from the X-Request-Start header the proxy sets (Render, nginx,
+    Heroku), or
+  * the worker already has more requests in flight than its class may use:
+    low may take ADMISSION_LOW_SHARE of ADMISSION_MAX_IN_FLIGHT slots,
+    normal ADMISSION_NORMAL_SHARE and critical all of them, so payments
+    keep capacity while list polling is shed.
+
+The in-flight limit only signals overload when the worker can take on more
+requests than it has capacity for, as a gevent worker can. Sync and gthread
+workers never have more in flight than processes and threads, so they only
+shed on the queue wait. With ADMISSION_HOST_MAX_IN_FLIGHT set, the same
+shares apply to the requests in flight across every worker on the host,
+counted in a memory-mapped file (ADMISSION_HOST_PATH); set it above what
+the workers can run at once, or it sheds at normal load.
+"""
+from typing import Optional
+import fcntl
+import math
+import mmap
+import os
+import threading
+import time
+
+from flask import g, jsonify, request
+
+import metrics
+
+PRIORITIES = ('critical', 'normal', 'low', 'exempt')
+DEFAULT_PRIORITY = 'normal'
+
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+# Requests a worker runs at once; gunicorn_config.py sizes it per worker class (0 disables the check)
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 0))
+ADMISSION_LOW_SHARE = float(os.getenv('ADMISSION_LOW_SHARE', 0.5))
+ADMISSION_NORMAL_SHARE = float(os.getenv('ADMISSION_NORMAL_SHARE', 0.8))
+# Longest queue wait per class before the request is not worth serving any more
+ADMISSION_MAX_QUEUE_WAIT_MS = {
+    'low': float(os.getenv('ADMISSION_LOW_MAX_QUEUE_WAIT_MS', 1000)),
+    'normal': float(os.getenv('ADMISSION_NORMAL_MAX_QUEUE_WAIT_MS', 5000)),
+    'critical': float(os.getenv('ADMISSION_CRITICAL_MAX_QUEUE_WAIT_MS', 20000)),
+}
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 2))
+# Requests in flight across all workers on the host (0 disables the check)
+ADMISSION_HOST_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_HOST_MAX_IN_FLIGHT', 0))
+ADMISSION_HOST_PATH = os.getenv('ADMISSION_HOST_PATH', '/tmp/splitbill-admission')
+ADMISSION_HOST_SLOTS = int(os.getenv('ADMISSION_HOST_SLOTS', 128))
+
+def admission_priority(default: Optional[str] = None, **per_method: str):
+    """Declare a view's priority class, overall or per HTTP method."""
+    for priority in (default, *per_method.values()):
+        if priority is not None and priority not in PRIORITIES:
+            raise ValueError(f'Unknown priority: {priority}')
+
+    def decorator(view):
+        view.admission_priority = {'*': default, **{method.upper(): p for method, p in per_method.items()}}
+        return view
+    return decorator
+
+def exempt(view):
+    return admission_priority('exempt')(view)
+
+def priority_for(view, method: str) -> str:
+    priorities = getattr(view, 'admission_priority', None) or {}
+    return priorities.get(method.upper()) or priorities.get('*') or DEFAULT_PRIORITY
+
+def queue_wait_ms(header: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Time since the proxy received the request, from X-Request-Start.
+
+    Accepts `t=<timestamp>` or a bare timestamp in seconds, milliseconds or
+    microseconds since the epoch.
+    """
+    if not header:
+        return None
+    try:
+        started = float(header.strip().removeprefix('t='))
+    except ValueError:
+        return None
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    waited = ((now if now is not None else time.time()) - started) * 1000
+    return max(waited, 0.0)
+
+def class_limits(max_in_flight: int) -> dict:
+    return {
+        'critical': max_in_flight,
+        'normal': max(1, math.floor(max_in_flight * ADMISSION_NORMAL_SHARE)),
+        'low': max(1, math.floor(max_in_flight * ADMISSION_LOW_SHARE)),
+    }
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self.limits = class_limits(max_in_flight)
+
+    def try_acquire(self, priority: str) -> bool:
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.limits[priority]:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class HostAdmissionController:
+    """Requests in flight across every process on the host, in a memory-mapped file.
+
+    The file is a table of (pid, requests in flight) slots, one per process,
+    locked as a whole while a request is admitted or released. Counts of
+    processes that are gone (e.g. a worker killed on timeout mid-request)
+    are dropped and their slots reused.
+    """
+
+    def __init__(self, max_in_flight: int = ADMISSION_HOST_MAX_IN_FLIGHT, path: str = ADMISSION_HOST_PATH,
+                 slots: int = ADMISSION_HOST_SLOTS):
+        self.max_in_flight = max_in_flight
+        self.limits = class_limits(max_in_flight)
+        self.path = path
+        self.slots = slots
+        self._table = None
+        self._fd = None
+        self._pid = None
+        self._slot = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        # Opened per process, like ratelimit.MmapStorage
+        if self._table is None or self._pid != os.getpid():
+            size = self.slots * 2 * 8
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size != size:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+            # Signed 64-bit integers: pid, count, pid, count, ...
+            self._table = memoryview(mmap.mmap(fd, size)).cast('q')
+            self._fd = fd
+            self._pid = os.getpid()
+            self._slot = None
+        return self._table
+
+    def _locked(self, fn):
+        with self._lock:
+            table = self._open()
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                return fn(table)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _scan(self, table) -> int:
+        """Requests in flight on the host; drops the counts of dead processes."""
+        total = 0
+        for index in range(0, len(table), 2):
+            pid, count = table[index], table[index + 1]
+            if not count:
+                continue
+            if pid != self._pid and not _process_alive(pid):
+                table[index + 1] = 0
+                continue
+            total += count
+        return total
+
+    def _claim_slot(self, table) -> Optional[int]:
+        """This process's slot: an empty one, or one left by a dead process."""
+        for index in range(0, len(table), 2):
+            if table[index] == self._pid:
+                return index
+        for index in range(0, len(table), 2):
+            pid = table[index]
+            if not pid or (not table[index + 1] and not _process_alive(pid)):
+                table[index], table[index + 1] = self._pid, 0
+                return index
+        return None
+
+    def total_in_flight(self) -> int:
+        return self._locked(self._scan)
+
+    def try_acquire(self, priority: str) -> bool:
+        def acquire(table):
+            if self._scan(table) >= self.limits[priority]:
+                return False
+            if self._slot is None:
+                self._slot = self._claim_slot(table)
+                if self._slot is None:
+                    return True  # table full: admit without counting
+            table[self._slot + 1] += 1
+            return True
+        return self._locked(acquire)
+
+    def release(self) -> None:
+        def release(table):
+            if self._slot is not None and table[self._slot] == self._pid and table[self._slot + 1] > 0:
+                table[self._slot + 1] -= 1
+        self._locked(release)
+
+def default_controller():
+    """Per-worker in-flight limit if set, else the host-wide one, else None."""
+    if ADMISSION_MAX_IN_FLIGHT:
+        return AdmissionController(ADMISSION_MAX_IN_FLIGHT)
+    if ADMISSION_HOST_MAX_IN_FLIGHT:
+        return HostAdmissionController()
+    print('Admission control: no in-flight limit (ADMISSION_MAX_IN_FLIGHT / ADMISSION_HOST_MAX_IN_FLIGHT); '
+          'requests are only shed on the X-Request-Start queue wait, so nothing is shed if the proxy '
+          'does not set that header')
+    return AdmissionController(0)
+
+def shed(priority: str, reason: str):
+    metrics.ADMISSION_SHED.labels(priority, reason).inc()
+    response = jsonify({'error': 'Server is busy, please retry shortly', 'reason': reason})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(ADMISSION_RETRY_AFTER)
+    return response
+
+def init_app(app, controller=None) -> None:
+    if not ADMISSION_ENABLED:
+        return
+    controller = controller or default_controller()
+    app.extensions['admission'] = controller
+
+    @app.before_request
+    def admit():
+        if request.method == 'OPTIONS':
+            return None
+        view = app.view_functions.get(request.endpoint)
+        priority = priority_for(view, request.method) if view else DEFAULT_PRIORITY
+        if priority == 'exempt':
+            return None
+
+        waited = queue_wait_ms(request.headers.get('X-Request-Start'))
+        if waited is not None and waited > ADMISSION_MAX_QUEUE_WAIT_MS[priority]:
+            return shed(priority, 'queue_wait')
+        if not controller.try_acquire(priority):
+            return shed(priority, 'in_flight')
+        g.admission_slot = True
+        return None
+
+    @app.teardown_request
+    def release(exc=None):
+        if g.pop('admission_slot', False):
+            controller.release()
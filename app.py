@@ -3,25 +3,40 @@ from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
-from routes.auth import auth_bp
-from routes.bill import bill_bp
-from database import client, get_db
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 
-# Load environment variables
+# Load environment variables before the modules below read their settings
 load_dotenv()
 
+from routes.auth import auth_bp
+from routes.bill import bill_bp
+from routes.ledger import ledger_bp
+from routes.settlement import settlement_bp
+from database import pool_stats
+from health import database_probe
+from security import PAYMENT_SCOPE, get_bcrypt_stats
+from json_provider import OrjsonProvider
+import metrics
+import querybudget
+import admission
+import ratelimit
+
 def create_app():
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
     
-    # Initialize rate limiter
-    limiter = Limiter(
-        app=app,
-        key_func=get_remote_address,
-        default_limits=[os.getenv('RATE_LIMIT', '100 per minute')]
-    )
+    # Rate limiter shared by all workers (see ratelimit.py); attached below, once the routes exist
+    limiter = ratelimit.limiter
     
+    # Request timing and Prometheus metrics at /api/metrics
+    metrics.init_app(app, limiter)
+
+    # Development check of per-route MongoDB round trips (QUERY_BUDGET_MODE=log|raise)
+    querybudget.init_app(app)
+
+    # Shed low-priority requests early under overload (see admission.py)
+    admission.init_app(app)
+    admission.exempt(app.view_functions['metrics'])
+
     # Configure CORS
     CORS(app, 
         resources={r"/api/*": {
@@ -30,7 +45,7 @@ def create_app():
                 "https://splitbill-frontend-2v7w.vercel.app"
             ],  # Explicitly allow only these origins
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"],
+            "allow_headers": ["Content-Type", "Authorization", "X-Payment-Token", "Last-Event-ID"],
             "expose_headers": ["Content-Type", "Authorization"],
             "supports_credentials": True,  # Required for cookies, sessions, or authentication
             "max_age": 3600,
@@ -50,9 +65,32 @@ def create_app():
     # Initialize JWT
     jwt = JWTManager(app)
 
+    # Payment-session tokens only authorize payments (in X-Payment-Token),
+    # never a request on their own
+    @jwt.token_verification_loader
+    def reject_payment_tokens(jwt_header, jwt_data):
+        return jwt_data.get('scope') != PAYMENT_SCOPE
+
+    @jwt.token_verification_failed_loader
+    def payment_token_rejected(jwt_header, jwt_data):
+        return jsonify({'error': 'Payment tokens can only be sent in the X-Payment-Token header'}), 401
+
     # Register blueprints with proper URL prefixes
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(bill_bp, url_prefix='/api/bills')
+    app.register_blueprint(ledger_bp, url_prefix='/api/ledger')
+    app.register_blueprint(settlement_bp, url_prefix='/api/settlements')
+
+    # Default limit per user (or address) plus the routes' own @rate_limit limits
+    ratelimit.init_app(app)
+
+    # Optionally reconcile indexes on startup (idempotent, see manage.py ensure-indexes)
+    if os.getenv('ENSURE_INDEXES_ON_STARTUP', 'false').lower() == 'true':
+        try:
+            from indexes import ensure_indexes
+            ensure_indexes()
+        except Exception as e:
+            print('Error ensuring indexes:', str(e))
 
     # Security headers
     @app.after_request
@@ -64,24 +102,44 @@ def create_app():
         response.headers['Content-Security-Policy'] = "default-src 'self'"
         return response
 
-    # Health check endpoint
+    # Health checks answer from the cached background probe and never wait on MongoDB
+    @app.route('/api/health/live')
+    @limiter.exempt
+    @admission.exempt
+    def health_live():
+        return jsonify({'status': 'alive'}), 200
+
+    @app.route('/api/health/ready')
+    @limiter.exempt
+    @admission.exempt
+    def health_ready():
+        database = database_probe.snapshot()
+        return jsonify({
+            'status': 'ready' if database['healthy'] else 'not_ready',
+            'database': database,
+            'pool': pool_stats()
+        }), 200 if database['healthy'] else 503
+
     @app.route('/api/health')
+    @limiter.exempt
+    @admission.exempt
     def health_check():
-        try:
-            # Check database connection
-            db = get_db()
-            db.command('ping')
-            return jsonify({
-                'status': 'healthy',
-                'database': 'connected',
-                'environment': os.getenv('ENVIRONMENT', 'development')
-            }), 200
-        except Exception as e:
+        database = database_probe.snapshot()
+        if not database['healthy']:
             return jsonify({
                 'status': 'unhealthy',
-                'database': 'disconnected',
-                'error': str(e)
+                'database': 'disconnected' if database['database'] == 'disconnected' else 'unknown',
+                'error': database['error'],
+                'checked_at': database['checked_at']
             }), 500
+        return jsonify({
+            'status': 'healthy',
+            'database': 'connected',
+            'checked_at': database['checked_at'],
+            'environment': os.getenv('ENVIRONMENT', 'development'),
+            'bcrypt': get_bcrypt_stats(),
+            'pool': pool_stats()
+        }), 200
 
     # Global error handler for CORS preflight
     @app.before_request
@@ -0,0 +1,7 @@
+"""Benchmarks for the API.
+
+The standalone scripts (bench_*.py, loadtest.py) each measure one thing.
+The API suite replays mixed workloads against a seeded database:
+
+    python benchmarks/api_suite.py --users 200 --bills 2000 --output bench.json
+"""
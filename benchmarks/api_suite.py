@@ -0,0 +1,178 @@
+"""Replay a mixed workload through the Flask app against seeded data.
+
+Seeds users and per_product bills (benchmarks/seed.py), then each thread
+logs in as its own user and replays a weighted mix of login, list bills,
+get bill, create bill and pay through the Flask test client. Reports
+throughput, p50/p95/p99 latency and MongoDB round trips per endpoint, and
+writes them with the commit and settings to --output so runs can be
+diffed between commits.
+
+Against the configured MongoDB (MONGODB_URI / MONGODB_DB), or in memory
+with --backend mongomock (no transactions; measures the app's overhead):
+
+    python benchmarks/api_suite.py --users 200 --bills 2000 --threads 8 \\
+        --requests 500 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stats import percentile  # noqa: E402
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(samples, round_trips, errors, wall):
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': len(samples) / wall if wall else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000 if samples else None,
+        'p95_ms': percentile(samples, 95) * 1000 if samples else None,
+        'p99_ms': percentile(samples, 99) * 1000 if samples else None,
+        'round_trips_mean': sum(round_trips) / len(round_trips) if round_trips else None,
+        'round_trips_max': max(round_trips) if round_trips else None,
+    }
+
+
+def run(app, dataset, mix, threads, requests, warmup, seed_value):
+    from benchmarks.workloads import WORKLOADS, Session
+    from querybudget import count_queries
+
+    unknown = set(mix) - set(WORKLOADS)
+    if unknown:
+        raise SystemExit(f'Unknown workloads: {", ".join(sorted(unknown))}')
+    names, weights = list(mix), list(mix.values())
+    samples = {name: [] for name in names}
+    round_trips = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+
+    sessions = [
+        Session(app.test_client(), dataset, dataset.usernames[i % len(dataset.usernames)], seed_value + i)
+        for i in range(threads)
+    ]
+    for session in sessions:
+        session.start()
+
+    def replay(session, count, record):
+        done = 0
+        while done < count:
+            name = session.rng.choices(names, weights)[0]
+            with count_queries() as counter:
+                start = time.perf_counter()
+                response = WORKLOADS[name](session)
+                elapsed = time.perf_counter() - start
+            if response is None:
+                continue
+            done += 1
+            if record:
+                with lock:
+                    samples[name].append(elapsed)
+                    round_trips[name].append(counter.total)
+                    if response.status_code >= 400:
+                        errors[name] += 1
+
+    for session in sessions:
+        replay(session, warmup, record=False)
+
+    workers = [threading.Thread(target=replay, args=(session, requests, True)) for session in sessions]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - started
+
+    endpoints = {name: summarize(samples[name], round_trips[name], errors[name], wall) for name in names}
+    total = summarize(
+        [s for values in samples.values() for s in values],
+        [r for values in round_trips.values() for r in values],
+        sum(errors.values()),
+        wall
+    )
+    return {'wall_seconds': wall, 'endpoints': endpoints, 'total': total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['mongo', 'mongomock'], default='mongo')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--bills', type=int, default=2000)
+    parser.add_argument('--items', type=int, default=6, help='items per seeded bill')
+    parser.add_argument('--participants', type=int, default=4, help='registered participants per seeded bill')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='measured requests per thread')
+    parser.add_argument('--warmup', type=int, default=20, help='unmeasured requests per thread')
+    parser.add_argument('--mix', type=parse_mix,
+                        default='login=5,list_bills=40,get_bill=30,create_bill=15,pay=10',
+                        help='comma-separated workload=weight pairs')
+    parser.add_argument('--bcrypt-rounds', type=int, help='override BCRYPT_ROUNDS for the run')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--keep', action='store_true', help='keep the seeded data')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    # Settings read at import time must be in place before the app is imported
+    # Neither the default nor the per-route limits (login, payments, ...) may throttle the workload
+    os.environ['RATELIMIT_ENABLED'] = 'false'
+    if args.bcrypt_rounds:
+        os.environ['BCRYPT_ROUNDS'] = str(args.bcrypt_rounds)
+    if args.backend == 'mongomock':
+        from benchmarks.backends import use_mongomock
+        use_mongomock()
+
+    from app import create_app
+    from benchmarks.seed import cleanup, seed
+
+    app = create_app()
+    started = time.perf_counter()
+    dataset = seed(args.users, args.bills, args.items, args.participants, args.seed)
+    seed_seconds = time.perf_counter() - started
+    try:
+        results = run(app, dataset, args.mix, args.threads, args.requests, args.warmup, args.seed)
+    finally:
+        if not args.keep:
+            cleanup(dataset)
+
+    output = json.dumps({
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'backend': args.backend,
+            'seed_seconds': seed_seconds,
+            'settings': {key: value for key, value in vars(args).items() if key != 'output'},
+        },
+        **results
+    }, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Database backends for the benchmarks: the configured MongoDB or mongomock."""
+import functools
+
+import database
+import querybudget
+
+_SESSION_METHODS = (
+    'find', 'find_one', 'find_one_and_update', 'insert_one', 'insert_many',
+    'update_one', 'update_many', 'replace_one', 'bulk_write', 'delete_one', 'delete_many'
+)
+
+
+class _NoTransactionSession:
+    """Stands in for a ClientSession: runs transaction callbacks directly."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def with_transaction(self, callback, *args, **kwargs):
+        return callback(self)
+
+    def end_session(self):
+        pass
+
+
+def _find_one_and_update(self, filter, update, projection=None, return_document=False, **kwargs):
+    """find_one_and_update that keeps the filter for the update.
+
+    mongomock narrows the update to the matched _id, which loses the array
+    match a positional `participants.$` update needs. No upserts: the app
+    doesn't use them.
+    """
+    matched = self.find_one(filter, {'_id': 1})
+    if matched is None:
+        return None
+    selector = {'_id': matched['_id']}
+    before = None if return_document else self.find_one(selector, projection)
+    self.update_one({**filter, **selector}, update)
+    return self.find_one(selector, projection) if return_document else before
+
+
+def use_mongomock():
+    """Point the app at an in-memory mongomock client.
+
+    mongomock has no sessions or transactions, so transactional writes run
+    without one; use it for micro-benchmarks of the app's own overhead, not
+    for numbers that include MongoDB. Round trips are still counted (one
+    per collection call) through querybudget.instrument_mongomock().
+    """
+    import mongomock
+    from mongomock.collection import Collection
+
+    def without_session(method):
+        original = getattr(Collection, method)
+
+        @functools.wraps(original)
+        def wrapper(self, *args, **kwargs):
+            kwargs.pop('session', None)
+            return original(self, *args, **kwargs)
+        return wrapper
+
+    for method in _SESSION_METHODS:
+        setattr(Collection, method, without_session(method))
+    Collection.find_one_and_update = _find_one_and_update
+    querybudget.instrument_mongomock()
+
+    client = mongomock.MongoClient()
+    client.start_session = lambda **kwargs: _NoTransactionSession()
+    database.get_client = lambda: client
+    return client
@@ -0,0 +1,125 @@
+"""Benchmark create_bill username resolution.
+
+Compares resolving every participant/split name with one find_one per name
+(the old create_bill behaviour) against the batched `$in` resolver, and
+measures end-to-end POST /api/bills/ latency and Mongo round trips.
+
+Needs a reachable MongoDB (MONGODB_URI / MONGODB_DB). Seeds its own users
+under a `bench_` prefix and removes them afterwards.
+
+    python benchmarks/bench_create_bill.py --items 30 --diners 8 --runs 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+counter = CommandCounter()
+monitoring.register(counter)
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+from app import create_app  # noqa: E402
+from database import get_db  # noqa: E402
+from models.user import User  # noqa: E402
+from benchmarks.stats import percentile  # noqa: E402
+
+
+def report(label, samples, commands=None):
+    line = (f"{label:<28} p50={percentile(samples, 50) * 1000:8.2f}ms "
+            f"p99={percentile(samples, 99) * 1000:8.2f}ms "
+            f"mean={statistics.mean(samples) * 1000:8.2f}ms")
+    if commands is not None:
+        line += f" round_trips/op={commands:.1f}"
+    print(line)
+
+
+def build_payload(names, items):
+    return {
+        'bill_name': 'bench dinner',
+        'split_method': 'per_product',
+        'participants': [{'external_name': name} for name in names],
+        'items': [
+            {
+                'name': f'item {i}',
+                'price_per_unit': 1000 + i,
+                'quantity': len(names),
+                'split': [{'external_name': name, 'quantity': 1} for name in names]
+            }
+            for i in range(items)
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=30)
+    parser.add_argument('--diners', type=int, default=8)
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    db = get_db()
+    names = [f'bench_user_{i}' for i in range(args.diners)]
+    db.users.delete_many({'username': {'$in': names}})
+    db.users.insert_many([{'username': name, 'balance': 0} for name in names])
+    creator_id = str(db.users.find_one({'username': names[0]})['_id'])
+    payload = build_payload(names, args.items)
+    lookups = [s['external_name'] for item in payload['items'] for s in item['split']]
+    lookups += [p['external_name'] for p in payload['participants']]
+
+    try:
+        per_name, batched = [], []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            for name in lookups:
+                db.users.find_one({'username': name})
+            per_name.append(time.perf_counter() - start)
+
+            with app.test_request_context():
+                start = time.perf_counter()
+                User.find_by_usernames(lookups)
+                batched.append(time.perf_counter() - start)
+
+        report(f'resolve per name ({len(lookups)})', per_name)
+        report('resolve batched ($in)', batched)
+
+        with app.app_context():
+            token = create_access_token(identity=creator_id)
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        latencies = []
+        commands_before = counter.count
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            response = client.post('/api/bills/', json=payload, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 201, response.get_json()
+        commands = (counter.count - commands_before) / args.runs
+        report('POST /api/bills/', latencies, commands)
+    finally:
+        db.bills.delete_many({'created_by': creator_id, 'bill_name': 'bench dinner'})
+        db.users.delete_many({'username': {'$in': names}})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Serialization micro-benchmark: Flask's default JSON provider vs OrjsonProvider.
+
+Serializes a realistic GET /api/bills/ payload (raw Mongo documents with
+ObjectIds and datetimes) through both providers. Runs without a database.
+
+    python benchmarks/bench_json.py --bills 500 --items 20 --participants 8
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_provider import OrjsonProvider  # noqa: E402
+
+
+class BSONDefaultProvider(DefaultJSONProvider):
+    """The stdlib provider plus ObjectId support, i.e. what the routes relied on."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        return DefaultJSONProvider.default(o)
+
+
+def make_bills(count, items, participants):
+    now = datetime.utcnow()
+    names = [f'friend_{i}' for i in range(participants)]
+    return [
+        {
+            '_id': ObjectId(),
+            'bill_name': f'Dinner {n}',
+            'total_amount': 1234567.0,
+            'created_by': str(ObjectId()),
+            'created_by_username': 'john_doe',
+            'split_method': 'per_product',
+            'participants': [
+                {'user_id': str(ObjectId()), 'username': name, 'external_name': name,
+                 'amount_due': 154320.88, 'status': 'unpaid'}
+                for name in names
+            ],
+            'items': [
+                {'name': f'item {i}', 'price_per_unit': 15000.0, 'quantity': participants,
+                 'split': [{'external_name': name, 'quantity': 1} for name in names]}
+                for i in range(items)
+            ],
+            'created_at': now - timedelta(minutes=n),
+            'updated_at': now - timedelta(minutes=n),
+            'version': 1,
+        }
+        for n in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bills', type=int, default=500)
+    parser.add_argument('--items', type=int, default=20)
+    parser.add_argument('--participants', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    bills = make_bills(args.bills, args.items, args.participants)
+    app = Flask('bench')
+    providers = {
+        'flask default (json)': BSONDefaultProvider(app),
+        'orjson': OrjsonProvider(app),
+    }
+
+    results = {}
+    with app.app_context():
+        for label, provider in providers.items():
+            body = provider.response(bills).get_data()
+            seconds = min(timeit.repeat(lambda: provider.response(bills), number=1, repeat=args.repeat))
+            results[label] = seconds
+            print(f'{label:<22} {seconds * 1000:9.2f} ms/response  {len(body) / 1024:9.1f} KiB')
+
+    baseline = results['flask default (json)']
+    print(f"speedup: {baseline / results['orjson']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Per-request rate-limiter overhead for each storage backend.
+
+Times a trivial route through the Flask test client with no limiter and
+with the limiter on each storage (memory, mmap, fakeredis, and Redis when
+--redis-url is given), keyed by JWT identity like the API. Also times raw
+storage increments.
+
+    python benchmarks/bench_ratelimit.py --requests 5000 --redis-url redis://localhost:6379/15
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask_jwt_extended import JWTManager, create_access_token  # noqa: E402
+from flask_limiter import Limiter  # noqa: E402
+from limits.storage import storage_from_string  # noqa: E402
+
+import ratelimit  # noqa: E402
+
+
+def make_app(storage_uri):
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'bench-secret-key-of-at-least-32-bytes'
+    JWTManager(app)
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+
+    if storage_uri:
+        Limiter(
+            app=app,
+            key_func=ratelimit.identity_key,
+            default_limits=['1000000000 per minute'],
+            strategy='fixed-window',
+            storage_uri=storage_uri
+        )
+    with app.app_context():
+        token = create_access_token(identity='bench-user')
+    return app, {'Authorization': f'Bearer {token}'}
+
+
+def time_requests(storage_uri, requests):
+    app, headers = make_app(storage_uri)
+    client = app.test_client()
+    for _ in range(100):
+        client.get('/ping', headers=headers)
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get('/ping', headers=headers)
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--redis-url')
+    args = parser.parse_args()
+
+    mmap_path = os.path.join(tempfile.mkdtemp(), 'ratelimit')
+    storages = {'memory': 'memory://', 'mmap': f'mmap://{mmap_path}', 'fakeredis': 'fakeredis://'}
+    if args.redis_url:
+        storages['redis'] = args.redis_url
+
+    baseline = time_requests(None, args.requests)
+    print(f'{"no limiter":<12} {baseline * 1e6:9.1f} us/request')
+    for name, uri in storages.items():
+        per_request = time_requests(uri, args.requests)
+        storage = storage_from_string(uri)
+        per_incr = min(timeit.repeat(lambda: storage.incr('bench', 60), number=1000, repeat=5)) / 1000
+        print(f'{name:<12} {per_request * 1e6:9.1f} us/request  '
+              f'(+{(per_request - baseline) * 1e6:7.1f} us overhead, incr {per_incr * 1e6:6.1f} us)')
+
+
+if __name__ == '__main__':
+    main()
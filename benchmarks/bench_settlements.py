@@ -0,0 +1,51 @@
+"""Settlement optimizer benchmark: naive per-debt transfers vs minimized transfers.
+
+Generates a group's worth of unpaid shares (each bill paid by a random
+creator and split across a random subset of the group), nets them and
+times the transfer minimization, reporting how many transfers it saves.
+
+    python benchmarks/bench_settlements.py --people 100 1000 5000 --bills 2000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from settlements import minimize_transfers, net_balances  # noqa: E402
+
+
+def make_debts(people, bills, seed=7):
+    rng = random.Random(seed)
+    debts = []
+    for _ in range(bills):
+        creditor = rng.randrange(people)
+        for debtor in rng.sample(range(people), rng.randint(2, min(12, people))):
+            if debtor != creditor:
+                debts.append((debtor, creditor, rng.randint(100, 50000)))
+    return debts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--people', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--bills', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for people in args.people:
+        debts = make_debts(people, args.bills)
+        balances = net_balances(debts)
+        transfers = minimize_transfers(balances)
+        # The transfers, taken as debts, must reproduce exactly the balances they settle
+        assert net_balances(transfers) == balances
+        net_seconds = min(timeit.repeat(lambda: net_balances(debts), number=1, repeat=args.repeat))
+        plan_seconds = min(timeit.repeat(lambda: minimize_transfers(balances), number=1, repeat=args.repeat))
+        print(f'{people:>6} people  {len(debts):>7} debts -> {len(transfers):>6} transfers  '
+              f'net {net_seconds * 1000:7.2f} ms  minimize {plan_seconds * 1000:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Split math benchmark: the previous float loop vs the integer split engine.
+
+Builds an event-sized per_product bill (every item split across a random
+subset of participants) and times the per-participant totals plus a
+service charge distribution, then times largest-remainder allocation
+across many participants with and without the NumPy path.
+
+    python benchmarks/bench_splits.py --items 5000 --participants 300
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import splitting  # noqa: E402
+
+
+def make_bill(items, participants, seed=7):
+    rng = random.Random(seed)
+    names = [f'guest_{i}' for i in range(participants)]
+    bill = []
+    for _ in range(items):
+        takers = rng.sample(names, rng.randint(1, min(10, participants)))
+        bill.append((round(rng.uniform(1, 500), 2), [(name, rng.randint(1, 3)) for name in takers]))
+    return names, bill
+
+
+def previous_loop(names, bill, service_charge):
+    amounts = {}
+    for price, splits in bill:
+        for name, quantity in splits:
+            amounts[name] = amounts.get(name, 0) + price * quantity
+    subtotal = sum(amounts.values())
+    return {name: round(amounts.get(name, 0) * (1 + service_charge / subtotal), 2) for name in names}
+
+
+def engine(names, bill, service_charge):
+    index = {name: i for i, name in enumerate(names)}
+    indices, amounts = [], []
+    prices = splitting.to_minor_many([price for price, _ in bill])
+    for minor, (_, splits) in zip(prices, bill):
+        for name, quantity in splits:
+            indices.append(index[name])
+            amounts.append(minor * quantity)
+    totals = splitting.sum_by_participant(len(names), indices, amounts)
+    return splitting.add_charges(totals, splitting.to_minor(service_charge))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--participants', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    names, bill = make_bill(args.items, args.participants)
+    service_charge = 12345.67
+
+    previous = previous_loop(names, bill, service_charge)
+    drift = abs(round(sum(previous.values()), 2) - round(
+        sum(p * q for p, splits in bill for _, q in splits) + service_charge, 2))
+    exact = engine(names, bill, service_charge)
+    print(f'previous loop total drift: {drift:.2f}; engine total drift: '
+          f'{sum(exact) - sum(splitting.to_minor(p) * q for p, s in bill for _, q in s) - splitting.to_minor(service_charge)}')
+
+    for label, fn in (('previous float loop', previous_loop), ('integer engine', engine)):
+        seconds = min(timeit.repeat(lambda: fn(names, bill, service_charge), number=1, repeat=args.repeat))
+        print(f'{label:<26} {seconds * 1000:8.2f} ms')
+
+    weights = [random.Random(i).randint(1, 10 ** 6) for i in range(args.participants * 10)]
+    numpy_module = splitting.np
+
+    def allocate_pure_python():
+        splitting.np = None
+        try:
+            splitting.allocate(10 ** 9 + 7, weights)
+        finally:
+            splitting.np = numpy_module
+
+    allocations = {'allocate (pure python)': allocate_pure_python}
+    if numpy_module is not None:
+        allocations['allocate (numpy)'] = lambda: splitting.allocate(10 ** 9 + 7, weights)
+    for label, fn in allocations.items():
+        seconds = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        print(f'{label:<26} {seconds * 1000:8.2f} ms  ({len(weights)} shares)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""CPU cost of turning a create-bill payload into the stored document.
+
+Compares the previous path (per-object Item/ItemSplit/Participant models,
+then Bill and Bill.to_dict) with create_bill_adapter + build_bill_document.
+Runs without a database.
+
+    python benchmarks/bench_validation.py --items 150 --participants 10
+"""
+import argparse
+import os
+import sys
+import timeit
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.bill import (  # noqa: E402
+    Bill, Item, ItemSplit, Participant, build_bill_document, create_bill_adapter
+)
+
+
+def make_payload(items, participants):
+    names = [f'friend_{i}' for i in range(participants)]
+    return {
+        'bill_name': 'Receipt',
+        'split_method': 'per_product',
+        'participants': [{'external_name': name} for name in names],
+        'items': [
+            {'name': f'item {i}', 'price_per_unit': 12500, 'quantity': participants,
+             'split': [{'external_name': name, 'quantity': 1} for name in names]}
+            for i in range(items)
+        ]
+    }
+
+
+def previous_path(data, creator, users_by_name):
+    items = []
+    for item in data['items']:
+        splits = []
+        for split in item['split']:
+            split_data = {'external_name': split['external_name'], 'quantity': int(split['quantity'])}
+            user = users_by_name.get(split['external_name'])
+            if user:
+                split_data.update({'user_id': str(user['_id']), 'username': user['username']})
+            splits.append(ItemSplit(**split_data))
+        items.append(Item(name=item['name'].strip(), price_per_unit=float(item['price_per_unit']),
+                          quantity=int(item['quantity']), split=splits))
+    amounts = {}
+    for item in items:
+        for split in item.split:
+            amounts[split.external_name] = amounts.get(split.external_name, 0) + item.price_per_unit * split.quantity
+    participants = [
+        Participant(external_name=p['external_name'], amount_due=round(amounts.get(p['external_name'], 0), 2))
+        for p in data['participants']
+    ]
+    bill = Bill(bill_name=data['bill_name'], total_amount=sum(i.price_per_unit * i.quantity for i in items),
+                created_by=str(creator['_id']), created_by_username=creator['username'],
+                split_method=data['split_method'], participants=participants, items=items)
+    return bill.to_dict()
+
+
+def current_path(data, creator, users_by_name):
+    return build_bill_document(create_bill_adapter.validate_python(data), creator, users_by_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=150)
+    parser.add_argument('--participants', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    data = make_payload(args.items, args.participants)
+    creator = {'_id': ObjectId(), 'username': 'creator'}
+    users_by_name = {f'friend_{i}': {'_id': ObjectId(), 'username': f'friend_{i}'} for i in range(args.participants)}
+
+    results = {}
+    for label, fn in (('previous (per-object models)', previous_path), ('TypeAdapter + builder', current_path)):
+        results[label] = min(timeit.repeat(lambda: fn(data, creator, users_by_name), number=1, repeat=args.repeat))
+        print(f'{label:<30} {results[label] * 1000:8.2f} ms/bill')
+    print(f"speedup: {results['previous (per-object models)'] / results['TypeAdapter + builder']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Compare gunicorn worker classes under load.
+
+For each worker class, starts gunicorn with gunicorn_config.py and
+GUNICORN_WORKER_CLASS set, seeds a creator and a payer through the API,
+then drives GET /api/bills/ and POST /api/bills/<id>/pay concurrently and
+reports requests/s and latency percentiles per endpoint as JSON.
+
+Needs a reachable MongoDB (MONGODB_URI / MONGODB_DB) and, for the gevent
+run, `pip install gevent`.
+
+    python benchmarks/loadtest.py --worker-classes sync gthread gevent \\
+        --concurrency 50 --duration 20 --output loadtest.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stats import percentile  # noqa: E402
+
+
+def call(base_url, method, path, body=None, token=None, headers=None):
+    request = urllib.request.Request(base_url + path, method=method)
+    request.add_header('Content-Type', 'application/json')
+    if token:
+        request.add_header('Authorization', f'Bearer {token}')
+    for name, value in (headers or {}).items():
+        request.add_header(name, value)
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    try:
+        with urllib.request.urlopen(request, data, timeout=30) as response:
+            return response.status, json.loads(response.read() or b'null')
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'null')
+
+
+def start_server(worker_class, port, workers):
+    env = dict(os.environ)
+    env.update({
+        'GUNICORN_WORKER_CLASS': worker_class,
+        'GUNICORN_WORKERS': str(workers),
+        'PORT': str(port),
+        'RATELIMIT_ENABLED': 'false',
+        'LOG_LEVEL': 'warning',
+    })
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:create_app()', '-c', 'gunicorn_config.py',
+         '--access-logfile', '/dev/null'],
+        cwd=ROOT, env=env
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if call(base_url, 'GET', '/api/health')[0] == 200:
+                return process, base_url
+        except OSError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f'gunicorn ({worker_class}) did not become healthy')
+
+
+def seed(base_url, bills):
+    """Register a creator and a payer, and create `bills` bills owed by the payer."""
+    password = 'Bench1234'
+    tokens = {}
+    names = {}
+    for role in ('creator', 'payer'):
+        names[role] = f'bench_{role}_{uuid.uuid4().hex[:8]}'
+        call(base_url, 'POST', '/api/auth/register', {'username': names[role], 'password': password})
+        status, body = call(base_url, 'POST', '/api/auth/login', {'username': names[role], 'password': password})
+        assert status == 200, body
+        tokens[role] = body['access_token']
+
+    call(base_url, 'POST', '/api/auth/balance', {'amount': 10 ** 12}, token=tokens['payer'])
+    bill_ids = []
+    for i in range(bills):
+        status, body = call(base_url, 'POST', '/api/bills/', {
+            'bill_name': f'bench {i}',
+            'split_method': 'equal',
+            'participants': [{'external_name': names['creator']}, {'external_name': names['payer']}],
+            'items': [{'name': 'item', 'price_per_unit': 1000, 'quantity': 2}]
+        }, token=tokens['creator'])
+        assert status == 201, body
+        bill_ids.append(body['_id'])
+
+    status, body = call(base_url, 'POST', '/api/auth/payment-session', {'password': password}, token=tokens['payer'])
+    assert status == 200, body
+    return tokens['payer'], body['payment_token'], bill_ids
+
+
+def run_load(base_url, token, payment_token, bill_ids, concurrency, duration):
+    samples = {'list_bills': [], 'pay': []}
+    errors = {'list_bills': 0, 'pay': 0}
+    lock = threading.Lock()
+    pending = list(bill_ids)
+    stop = time.time() + duration
+
+    def worker(index):
+        while time.time() < stop:
+            # Every fourth request pays a bill while bills remain, the rest list
+            endpoint = 'list_bills'
+            bill_id = None
+            if index % 4 == 0:
+                with lock:
+                    bill_id = pending.pop() if pending else None
+                endpoint = 'pay' if bill_id else 'list_bills'
+            start = time.perf_counter()
+            if endpoint == 'pay':
+                status, _ = call(base_url, 'POST', f'/api/bills/{bill_id}/pay', {}, token=token,
+                                 headers={'X-Payment-Token': payment_token})
+            else:
+                status, _ = call(base_url, 'GET', '/api/bills/?view=summary&limit=20', token=token)
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples[endpoint].append(elapsed)
+                if status >= 400:
+                    errors[endpoint] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    return {
+        endpoint: {
+            'requests': len(values),
+            'errors': errors[endpoint],
+            'requests_per_second': len(values) / wall,
+            'p50_ms': percentile(values, 50) * 1000 if values else None,
+            'p99_ms': percentile(values, 99) * 1000 if values else None,
+        }
+        for endpoint, values in samples.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--worker-classes', nargs='+', default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--bills', type=int, default=2000)
+    parser.add_argument('--port', type=int, default=18000)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    results = {}
+    for worker_class in args.worker_classes:
+        process, base_url = start_server(worker_class, args.port, args.workers)
+        try:
+            token, payment_token, bill_ids = seed(base_url, args.bills)
+            results[worker_class] = run_load(
+                base_url, token, payment_token, bill_ids, args.concurrency, args.duration
+            )
+        finally:
+            process.terminate()
+            process.wait()
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Seed benchmark users and bills straight into the database.
+
+Every run gets its own `bench_<run id>_` username prefix, so runs never
+collide and cleanup() only removes what the run created. Bills are built
+with the same code path as POST /api/bills/ (validation, split engine,
+ledger), so the data has realistic shapes and sizes.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List
+import random
+import uuid
+
+from bson import ObjectId
+
+from database import get_db
+from models.bill import build_bill_document, create_bill_adapter
+from models.ledger import Ledger, bill_edges
+from models.user import User
+from security import hash_password
+
+PASSWORD = 'Bench1234'
+INSERT_BATCH = 500
+EXTERNAL_NAMES = ['Ana', 'Budi', 'Citra', 'Dewi', 'Eko', 'Fajar', 'Gita', 'Hadi']
+MENU = [('Nasi goreng', 25000), ('Mie ayam', 18000), ('Sate', 30000), ('Es teh', 5000),
+        ('Kopi susu', 22000), ('Martabak', 45000), ('Soto', 20000), ('Jus alpukat', 15000)]
+
+
+@dataclass
+class Dataset:
+    run_id: str
+    usernames: List[str]
+    user_ids: Dict[str, str]
+    bill_ids: List[str] = field(default_factory=list)
+    # user id -> bills that user still owes a share of
+    unpaid: Dict[str, List[str]] = field(default_factory=dict)
+    # user id -> bills the user can read
+    visible: Dict[str, List[str]] = field(default_factory=dict)
+
+
+def bill_payload(rng, names, items, name='bench dinner'):
+    """A per_product create-bill payload where every item is split across some of `names`."""
+    lines = []
+    for _ in range(items):
+        dish, price = rng.choice(MENU)
+        takers = rng.sample(names, rng.randint(1, len(names)))
+        lines.append({
+            'name': dish,
+            'price_per_unit': price,
+            'quantity': len(takers),
+            'split': [{'external_name': taker, 'quantity': 1} for taker in takers]
+        })
+    return {
+        'bill_name': name,
+        'split_method': 'per_product',
+        'service_charge': round(sum(line['price_per_unit'] * line['quantity'] for line in lines) * 0.05, 2),
+        'participants': [{'external_name': n} for n in names],
+        'items': lines
+    }
+
+
+def seed(users=200, bills=2000, items_per_bill=6, participants_per_bill=4, seed_value=7):
+    """Insert `users` users and `bills` bills; returns the Dataset describing them."""
+    rng = random.Random(seed_value)
+    db = get_db()
+    run_id = uuid.uuid4().hex[:8]
+    now = datetime.utcnow()
+    hashed_password = hash_password(PASSWORD)  # same password for everyone, hashed once
+
+    users = [
+        {'username': f'bench_{run_id}_{i}', 'hashed_password': hashed_password, 'balance': 10 ** 12,
+         'bills_version': 0, 'created_at': now, 'updated_at': now}
+        for i in range(users)
+    ]
+    db.users.insert_many(users)
+    users_by_name = {user['username']: user for user in users}
+    dataset = Dataset(
+        run_id=run_id,
+        usernames=[user['username'] for user in users],
+        user_ids={user['username']: str(user['_id']) for user in users}
+    )
+
+    registered = min(participants_per_bill, len(users))
+    batch = []
+    for _ in range(bills):
+        members = rng.sample(users, registered)
+        names = [member['username'] for member in members]
+        names += rng.sample(EXTERNAL_NAMES, rng.randint(0, 2))
+        request = create_bill_adapter.validate_python(bill_payload(rng, names, items_per_bill))
+        batch.append(build_bill_document(request, members[0], users_by_name))
+        if len(batch) >= INSERT_BATCH:
+            _insert(batch, dataset)
+            batch = []
+    if batch:
+        _insert(batch, dataset)
+    User.bump_bills_version(dataset.user_ids.values())
+    return dataset
+
+
+def _insert(bills, dataset):
+    get_db().bills.insert_many(bills)
+    Ledger.apply([edge for bill in bills for edge in bill_edges(bill)])
+    for bill in bills:
+        bill_id = str(bill['_id'])
+        dataset.bill_ids.append(bill_id)
+        dataset.visible.setdefault(bill['created_by'], []).append(bill_id)
+        for participant in bill['participants']:
+            user_id = participant.get('user_id')
+            if not user_id or user_id == bill['created_by']:
+                continue
+            dataset.visible.setdefault(user_id, []).append(bill_id)
+            if participant['status'] == 'unpaid':
+                dataset.unpaid.setdefault(user_id, []).append(bill_id)
+
+
+def cleanup(dataset):
+    """Remove the run's users, the bills they created and their ledgers."""
+    db = get_db()
+    user_ids = list(dataset.user_ids.values())
+    db.bills.delete_many({'created_by': {'$in': user_ids}})
+    db.ledgers.delete_many({'_id': {'$in': user_ids}})
+    db.users.delete_many({'_id': {'$in': [ObjectId(user_id) for user_id in user_ids]}})
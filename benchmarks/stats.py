@@ -0,0 +1,9 @@
+"""Helpers shared by the benchmark reports."""
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of samples, or None when there are none."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
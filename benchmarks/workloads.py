@@ -0,0 +1,72 @@
+"""The requests the API suite replays, one function per endpoint.
+
+Each workload takes a Session (one logged-in virtual user driving the Flask
+test client) and returns the response, or None when it has nothing to do
+(e.g. the user has no unpaid bills left), in which case the runner picks
+another workload.
+"""
+import random
+
+from benchmarks.seed import PASSWORD, bill_payload
+
+DEFAULT_MIX = {'login': 5, 'list_bills': 40, 'get_bill': 30, 'create_bill': 15, 'pay': 10}
+
+
+class Session:
+    def __init__(self, client, dataset, username, seed_value):
+        self.client = client
+        self.dataset = dataset
+        self.username = username
+        self.user_id = dataset.user_ids[username]
+        self.rng = random.Random(seed_value)
+        self.headers = {}
+        self.payment_headers = {}
+
+    def start(self):
+        """Log in and open a payment session, outside the measured window."""
+        response = login(self)
+        assert response.status_code == 200, response.get_json()
+        response = self.client.post('/api/auth/payment-session', json={'password': PASSWORD}, headers=self.headers)
+        assert response.status_code == 200, response.get_json()
+        self.payment_headers = {**self.headers, 'X-Payment-Token': response.get_json()['payment_token']}
+
+
+def login(session):
+    response = session.client.post('/api/auth/login', json={'username': session.username, 'password': PASSWORD})
+    if response.status_code == 200:
+        session.headers = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+    return response
+
+
+def list_bills(session):
+    return session.client.get('/api/bills/?view=summary&limit=20', headers=session.headers)
+
+
+def get_bill(session):
+    bill_ids = session.dataset.visible.get(session.user_id)
+    if not bill_ids:
+        return None
+    return session.client.get(f'/api/bills/{session.rng.choice(bill_ids)}', headers=session.headers)
+
+
+def create_bill(session):
+    others = session.rng.sample(session.dataset.usernames, min(4, len(session.dataset.usernames)))
+    names = [session.username] + [name for name in others if name != session.username][:3]
+    payload = bill_payload(session.rng, names, 6)
+    return session.client.post('/api/bills/', json=payload, headers=session.headers)
+
+
+def pay(session):
+    bill_ids = session.dataset.unpaid.get(session.user_id)
+    if not bill_ids:
+        return None
+    return session.client.post(f'/api/bills/{bill_ids.pop()}/pay', json={}, headers=session.payment_headers)
+
+
+WORKLOADS = {
+    'login': login,
+    'list_bills': list_bills,
+    'get_bill': get_bill,
+    'create_bill': create_bill,
+    'pay': pay,
+}
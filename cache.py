@@ -0,0 +1,149 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+import os
+import threading
+import time
+
+BILL_CACHE_TTL = int(os.getenv('BILL_CACHE_TTL', 60))
+BILL_CACHE_MAX_ENTRIES = int(os.getenv('BILL_CACHE_MAX_ENTRIES', 1000))
+# Memory budget for each worker's local tier, and the largest single response
+# worth caching (an unpaginated list for a heavy user can be megabytes)
+BILL_CACHE_MAX_BYTES = int(os.getenv('BILL_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+BILL_CACHE_MAX_ENTRY_BYTES = int(os.getenv('BILL_CACHE_MAX_ENTRY_BYTES', 1024 * 1024))
+SETTLEMENT_CACHE_MAX_ENTRIES = int(os.getenv('SETTLEMENT_CACHE_MAX_ENTRIES', 500))
+
+class LRUCache:
+    """In-process LRU cache with a per-entry TTL, grouped by owner for invalidation.
+
+    With max_bytes set, least recently used entries are also evicted to keep
+    the values' total size within it.
+    """
+
+    def __init__(self, max_entries: int, ttl: int, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[float, bytes]]' = OrderedDict()
+        self._by_owner: Dict[str, Set[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, owner: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get((owner, key))
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._remove((owner, key))
+                return None
+            self._entries.move_to_end((owner, key))
+            return value
+
+    def set(self, owner: str, key: str, value: bytes) -> None:
+        if self.max_bytes is not None and len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove((owner, key))
+            self._entries[(owner, key)] = (time.monotonic() + self.ttl, value)
+            self._by_owner.setdefault(owner, set()).add((owner, key))
+            self.size += len(value)
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self.size > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, owner: str) -> None:
+        with self._lock:
+            for entry_key in list(self._by_owner.get(owner, ())):
+                self._remove(entry_key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_owner.clear()
+            self.size = 0
+
+    def _remove(self, entry_key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+        keys = self._by_owner.get(entry_key[0])
+        if keys is not None:
+            keys.discard(entry_key)
+            if not keys:
+                del self._by_owner[entry_key[0]]
+
+class BillListCache:
+    """Serialized GET /api/bills responses, keyed by user id and list ETag.
+
+    The ETag already encodes the user's bills_version, so an entry can never
+    be served after the list changed, even from another worker's cache.
+    Write paths still invalidate explicitly to free memory early. The Redis
+    tier (REDIS_URL) is shared across workers and hosts; if Redis is
+    unreachable the cache just falls back to the local tier. Responses over
+    max_entry_bytes are not cached in either tier.
+    """
+
+    def __init__(self, redis_client=None, max_entries: int = BILL_CACHE_MAX_ENTRIES, ttl: int = BILL_CACHE_TTL,
+                 max_bytes: int = BILL_CACHE_MAX_BYTES, max_entry_bytes: int = BILL_CACHE_MAX_ENTRY_BYTES):
+        self.local = LRUCache(max_entries, ttl, max_bytes)
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        self._redis = redis_client
+        self._redis_configured = redis_client is not None
+
+    @property
+    def redis(self):
+        if not self._redis_configured:
+            self._redis_configured = True
+            if os.getenv('REDIS_URL'):
+                import redis
+                self._redis = redis.Redis.from_url(os.getenv('REDIS_URL'), socket_timeout=0.5)
+        return self._redis
+
+    @staticmethod
+    def _redis_key(user_id: str) -> str:
+        return f'bills:{user_id}'
+
+    def get(self, user_id: str, etag: str) -> Optional[bytes]:
+        value = self.local.get(user_id, etag)
+        if value is not None or self.redis is None:
+            return value
+        try:
+            value = self.redis.hget(self._redis_key(user_id), etag)
+        except Exception as e:
+            print('Error reading bill cache:', str(e))
+            return None
+        if value is not None:
+            self.local.set(user_id, etag, value)
+        return value
+
+    def set(self, user_id: str, etag: str, value: bytes) -> None:
+        if len(value) > self.max_entry_bytes:
+            return
+        self.local.set(user_id, etag, value)
+        if self.redis is None:
+            return
+        try:
+            pipeline = self.redis.pipeline()
+            pipeline.hset(self._redis_key(user_id), etag, value)
+            pipeline.expire(self._redis_key(user_id), self.ttl)
+            pipeline.execute()
+        except Exception as e:
+            print('Error writing bill cache:', str(e))
+
+    def invalidate(self, user_ids: Iterable[str]) -> None:
+        user_ids = list(user_ids)
+        for user_id in user_ids:
+            self.local.invalidate(user_id)
+        if self.redis is None or not user_ids:
+            return
+        try:
+            self.redis.delete(*[self._redis_key(user_id) for user_id in user_ids])
+        except Exception as e:
+            print('Error invalidating bill cache:', str(e))
+
+bill_list_cache = BillListCache()
+
+# Settlement plans, keyed by the ETags of the bills they were computed from
+settlement_cache = LRUCache(SETTLEMENT_CACHE_MAX_ENTRIES, BILL_CACHE_TTL)
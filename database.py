@@ -1,22 +1,202 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
 from dotenv import load_dotenv
 import os
 import certifi
-import ssl
+import threading
+import time
 
+# Before metrics and querybudget, which read their settings at import time
 load_dotenv()
 
-# MongoDB Configuration
-client = MongoClient(
-    os.getenv('MONGODB_URI', 'mongodb://localhost:27017'),
-    tlsCAFile=certifi.where(),
-    ssl=True,
-    serverSelectionTimeoutMS=5000,
-    connectTimeoutMS=5000,
-    socketTimeoutMS=5000
-)
+import metrics
+import querybudget
 
-db = client[os.getenv('MONGODB_DB', 'splitbill')]
+DB_NAME = os.getenv('MONGODB_DB', 'splitbill')
+
+# The client is created lazily, once per process. gunicorn workers build it
+# in the post_worker_init hook (see gunicorn_config.py), after the fork and
+# after any gevent monkey-patching, so no pool or monitor thread is ever
+# shared across a fork.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def _pool_options():
+    """Connection pool settings, read from the environment."""
+    options = {
+        'maxPoolSize': int(os.getenv('MONGODB_MAX_POOL_SIZE', 100)),
+        'minPoolSize': int(os.getenv('MONGODB_MIN_POOL_SIZE', 0)),
+        'waitQueueTimeoutMS': int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+    }
+    if os.getenv('MONGODB_MAX_IDLE_TIME_MS'):
+        options['maxIdleTimeMS'] = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS'))
+    return options
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Tracks open connections and how long requests wait to check one out."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.open_connections = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+
+    def _wait_time(self):
+        started = getattr(self._local, 'started', None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = self._wait_time()
+        metrics.MONGO_POOL_WAIT.observe(waited)
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def connection_check_out_failed(self, event):
+        self._wait_time()
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_ready(self, event):
+        metrics.MONGO_POOL_OPEN.inc()
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        metrics.MONGO_POOL_OPEN.dec()
+        with self._lock:
+            self.open_connections -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+pool_listener = PoolStatsListener()
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Counts and times every command the driver sends, and reports it to any active query counter."""
+
+    def started(self, event):
+        querybudget.record_command(event.command_name, event.command)
+
+    def succeeded(self, event):
+        metrics.MONGO_COMMAND_LATENCY.labels(event.command_name).observe(event.duration_micros / 1e6)
+        metrics.MONGO_COMMANDS.labels(event.command_name, 'succeeded').inc()
+
+    def failed(self, event):
+        metrics.MONGO_COMMAND_LATENCY.labels(event.command_name).observe(event.duration_micros / 1e6)
+        metrics.MONGO_COMMANDS.labels(event.command_name, 'failed').inc()
+
+command_listener = CommandMetricsListener()
+
+def _create_client():
+    options = {}
+    if os.getenv('MONGODB_TLS', 'true').lower() == 'true':
+        options.update(tlsCAFile=certifi.where(), tls=True)
+    return MongoClient(
+        os.getenv('MONGODB_URI', 'mongodb://localhost:27017'),
+        serverSelectionTimeoutMS=5000,
+        connectTimeoutMS=5000,
+        socketTimeoutMS=5000,
+        event_listeners=[pool_listener, command_listener],
+        **_pool_options(),
+        **options
+    )
+
+def get_client():
+    """Return this process's MongoClient, creating it on first use."""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                # A client inherited through fork must not be reused or closed here
+                pool_listener.reset()
+                metrics.MONGO_POOL_OPEN.set(0)
+                _client = _create_client()
+                _client_pid = os.getpid()
+    return _client
+
+def warm_up(timeout: float = 10.0) -> int:
+    """Open minPoolSize connections before the worker takes traffic.
+
+    Returns the number of open connections once warm (or at the timeout).
+    """
+    client = get_client()
+    target = client.options.pool_options.min_pool_size
+    if not target:
+        client.admin.command('ping')
+        return pool_listener.open_connections
+
+    # Concurrent pings each need their own connection
+    threads = [
+        threading.Thread(target=client.admin.command, args=('ping',))
+        for _ in range(target)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout)
+
+    deadline = time.monotonic() + timeout
+    while pool_listener.open_connections < target and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return pool_listener.open_connections
+
+def init_client(warm: bool = True) -> None:
+    """Build (and optionally warm) the client for the current worker."""
+    get_client()
+    if warm:
+        try:
+            warm_up()
+        except Exception as e:
+            print('Error warming up MongoDB pool:', str(e))
+
+def close_client() -> None:
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+def pool_stats() -> dict:
+    listener = pool_listener
+    with listener._lock:
+        return {
+            'open_connections': listener.open_connections,
+            'checkouts': listener.checkouts,
+            'checkout_failures': listener.checkout_failures,
+            'checkout_wait_ms_mean': (
+                listener.wait_seconds_total / listener.checkouts * 1000 if listener.checkouts else 0.0
+            ),
+            'checkout_wait_ms_max': listener.wait_seconds_max * 1000,
+        }
 
 def get_db():
-    return db 
\ No newline at end of file
+    return get_client()[DB_NAME]
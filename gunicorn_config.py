@@ -1,23 +1,94 @@
+from dotenv import load_dotenv
+from gunicorn.glogging import Logger
 import multiprocessing
 import os
+import re
+
+# Read .env before the defaults below, so values set there win over them
+load_dotenv()
 
 # Server socket
 bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
-backlog = 2048
+backlog = int(os.getenv('GUNICORN_BACKLOG', 2048))
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'sync'
-worker_connections = 1000
+# GUNICORN_WORKER_CLASS selects the serving mode:
+#   sync    - one request per process (default)
+#   gthread - GUNICORN_THREADS requests per process on OS threads
+#   gevent  - up to worker_connections requests per process on greenlets;
+#             gunicorn monkey-patches the worker before the app (and pymongo)
+#             is imported. Requires `pip install gevent`.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+if worker_class not in ('sync', 'gthread', 'gevent'):
+    raise ValueError(f'Unsupported GUNICORN_WORKER_CLASS: {worker_class}')
+
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
 timeout = 120
 keepalive = 2
 
+# Size each worker's Mongo pool to the requests it can run at once, unless set explicitly
+if worker_class == 'gthread':
+    os.environ.setdefault('MONGODB_MAX_POOL_SIZE', str(threads))
+elif worker_class == 'gevent':
+    os.environ.setdefault('MONGODB_MAX_POOL_SIZE', str(min(worker_connections, 100)))
+else:
+    os.environ.setdefault('MONGODB_MAX_POOL_SIZE', '2')
+os.environ.setdefault('MONGODB_MIN_POOL_SIZE', '1')
+
+# With several workers on one host, share rate-limit counters through a
+# memory-mapped file unless Redis is configured (see ratelimit.py)
+if workers > 1 and not os.getenv('REDIS_URL'):
+    os.environ.setdefault('RATELIMIT_STORAGE_URI', 'mmap:///tmp/splitbill-ratelimit')
+
+# Workers write their Prometheus samples to a shared directory that
+# /api/metrics aggregates (see metrics.py). It must be in the environment
+# before a worker imports the app; on_starting creates and clears it.
+if workers > 1:
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/splitbill-metrics')
+
+# SSE streams hold a worker slot for their whole life, so only gevent
+# workers serve them; the other classes answer the stream routes with a 503
+os.environ.setdefault('SSE_ENABLED', 'true' if worker_class == 'gevent' else 'false')
+if worker_class != 'gevent':
+    # If enabled anyway, end them before the worker timeout (clients resume by event id)
+    os.environ.setdefault('SSE_MAX_STREAM_SECONDS', '60')
+
+# Every worker serving streams must see every bill event (see pubsub.py)
+if workers > 1 and os.environ['SSE_ENABLED'].lower() == 'true':
+    os.environ.setdefault('PUBSUB_BACKEND', 'redis' if os.getenv('REDIS_URL') else 'mongo')
+
+# Admission control (admission.py): a gevent worker accepts more requests
+# than its Mongo pool can serve, so it sheds lower priorities once they use
+# their share of the pool. Sync and gthread workers never run more requests
+# than they have processes and threads; a share of those would shed at
+# normal load, so they only shed on the proxy queue wait (X-Request-Start).
+if worker_class == 'gevent':
+    os.environ.setdefault('ADMISSION_MAX_IN_FLIGHT', os.environ['MONGODB_MAX_POOL_SIZE'])
+
 # Logging
 accesslog = '-'
 errorlog = '-'
 loglevel = os.getenv('LOG_LEVEL', 'info').lower()
 access_log_format = '%({x-real-ip}i)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(L)s'
 
+# The SSE routes take the access token as ?jwt= (EventSource can't set
+# headers); keep it out of the access log
+_TOKEN_PARAM = re.compile(r'(?<=[?&]jwt=)[^&\s]*|(?<=^jwt=)[^&\s]*')
+
+def redact_tokens(value):
+    return _TOKEN_PARAM.sub('[redacted]', value) if value and 'jwt=' in value else value
+
+class RedactingLogger(Logger):
+    def atoms(self, resp, req, environ, request_time):
+        atoms = super().atoms(resp, req, environ, request_time)
+        atoms['r'] = redact_tokens(atoms['r'])
+        atoms['q'] = redact_tokens(atoms['q'])
+        return atoms
+
+logger_class = RedactingLogger
+
 # Process naming
 proc_name = 'livin-backend'
 
@@ -46,4 +117,35 @@ keep_alive = 5
 
 # Error handling
 capture_output = True
-enable_stdio_inheritance = True 
\ No newline at end of file
+enable_stdio_inheritance = True 
+
+# Server hooks
+def on_starting(server):
+    # Samples left over from a previous run would be summed into the new one
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.endswith('.db'):
+                os.remove(os.path.join(directory, name))
+
+def post_worker_init(worker):
+    # Build and warm this worker's Mongo client before it accepts traffic.
+    # Runs after the fork and after gevent monkey-patching (post_fork would
+    # run before the patch), so the pool never crosses a fork.
+    from database import init_client
+    from health import database_probe
+    init_client()
+    database_probe.start()
+
+def worker_exit(server, worker):
+    from database import close_client
+    from health import database_probe
+    database_probe.stop()
+    close_client()
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges from the aggregated metrics
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
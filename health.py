@@ -0,0 +1,71 @@
+from typing import Any, Dict, Optional
+import os
+import threading
+import time
+
+from database import get_client
+
+# Health endpoints answer from a per-worker cache, refreshed by a background
+# thread (a greenlet under gevent), so a slow MongoDB never holds a worker
+# for a probe.
+HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', 5))
+# A cached result older than this is treated as unknown
+HEALTH_STALE_AFTER = float(os.getenv('HEALTH_STALE_AFTER', HEALTH_PROBE_INTERVAL * 3))
+
+class DatabaseProbe:
+    """Pings MongoDB every HEALTH_PROBE_INTERVAL seconds and keeps the last result."""
+
+    def __init__(self, interval: float = HEALTH_PROBE_INTERVAL, stale_after: float = HEALTH_STALE_AFTER):
+        self.interval = interval
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._state: Dict[str, Any] = {'database': 'unknown', 'checked_at': None, 'latency_ms': None, 'error': None}
+
+    def start(self) -> None:
+        # A thread doesn't survive fork, so every worker starts its own
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='health-probe', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def probe(self) -> None:
+        start = time.perf_counter()
+        try:
+            get_client().admin.command('ping')
+            state = {'database': 'connected', 'error': None}
+        except Exception as e:
+            state = {'database': 'disconnected', 'error': str(e)}
+        state['latency_ms'] = (time.perf_counter() - start) * 1000
+        state['checked_at'] = time.time()
+        with self._lock:
+            self._state = state
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The last probe result with its age; 'unknown' until the first probe or once stale."""
+        self.start()
+        with self._lock:
+            state = dict(self._state)
+        if state['checked_at'] is not None:
+            state['age_seconds'] = time.time() - state['checked_at']
+            if state['age_seconds'] > self.stale_after:
+                state['database'] = 'unknown'
+        else:
+            state['age_seconds'] = None
+        state['healthy'] = state['database'] == 'connected'
+        return state
+
+database_probe = DatabaseProbe()
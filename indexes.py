@@ -0,0 +1,94 @@
+from pymongo.errors import OperationFailure
+from bson import ObjectId
+from database import get_db
+from models.bill import Bill
+from models.user import User
+from pubsub import EventLog
+
+# Collection name -> model declaring its INDEXES
+MODELS = {
+    'bills': Bill,
+    'users': User,
+    'bill_events': EventLog,
+}
+
+# Queries issued on hot paths, checked with explain() after reconciling.
+# Each entry is (label, collection, filter, sort).
+_SAMPLE_USER_ID = str(ObjectId())
+HOT_QUERIES = [
+    ('bills.list', 'bills', {
+        '$or': [
+            {'created_by': _SAMPLE_USER_ID},
+            {'participants.user_id': _SAMPLE_USER_ID}
+        ]
+    }, [('created_at', -1), ('_id', -1)]),
+    ('bills.by_id', 'bills', {'_id': ObjectId()}, None),
+    ('users.by_username', 'users', {'username': 'sample'}, None),
+    ('users.by_username_in', 'users', {'username': {'$in': ['sample_a', 'sample_b']}}, None),
+    ('users.by_id', 'users', {'_id': ObjectId()}, None),
+]
+
+def ensure_indexes(db=None, drop_extra=False):
+    """Create every declared index that is missing. Safe to run repeatedly.
+
+    Returns a report per collection with the indexes created, the indexes
+    present in the database but not declared (dropped when drop_extra is
+    set) and any declarations that conflict with an existing index.
+    """
+    db = db if db is not None else get_db()
+    report = {}
+    for collection_name, model in MODELS.items():
+        collection = db[collection_name]
+        existing = {name for name in collection.index_information() if name != '_id_'}
+        declared = {index.document['name'] for index in model.INDEXES}
+
+        created, conflicts = [], []
+        for index in model.INDEXES:
+            name = index.document['name']
+            if name in existing:
+                continue
+            try:
+                collection.create_indexes([index])
+                created.append(name)
+            except OperationFailure as e:
+                conflicts.append({'name': name, 'error': str(e)})
+
+        extra = sorted(existing - declared)
+        if drop_extra:
+            for name in extra:
+                collection.drop_index(name)
+
+        report[collection_name] = {
+            'created': created,
+            'extra': extra,
+            'dropped': extra if drop_extra else [],
+            'conflicts': conflicts
+        }
+    return report
+
+def _plan_stages(plan):
+    yield plan.get('stage')
+    for key in ('inputStage', 'inputStages'):
+        children = plan.get(key)
+        if isinstance(children, dict):
+            children = [children]
+        for child in children or []:
+            yield from _plan_stages(child)
+
+def uncovered_queries(db=None):
+    """Explain each hot query and return the ones that still scan a collection
+    or sort in memory."""
+    db = db if db is not None else get_db()
+    uncovered = []
+    for label, collection_name, query, sort in HOT_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()['queryPlanner']['winningPlan']
+        # Slot-based engine nests the classic plan under queryPlan
+        plan = plan.get('queryPlan', plan)
+        stages = set(_plan_stages(plan))
+        problems = sorted(stages & {'COLLSCAN', 'SORT'})
+        if problems:
+            uncovered.append({'query': label, 'stages': problems})
+    return uncovered
@@ -0,0 +1,47 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from flask.json.provider import JSONProvider
+from pydantic import BaseModel
+from werkzeug.http import http_date
+import orjson
+
+# Datetimes are passed through to _default so they keep the HTTP date format
+# Flask's default provider uses, and clients see the same wire format.
+_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return http_date(obj)
+    if isinstance(obj, time):
+        return obj.isoformat()
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Serialize straight to UTF-8 bytes, for streaming and caching."""
+    return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson that understands BSON and pydantic types."""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
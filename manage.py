@@ -0,0 +1,62 @@
+import argparse
+import json
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def ensure_indexes_command(args):
+    from indexes import ensure_indexes, uncovered_queries
+
+    report = ensure_indexes(drop_extra=args.drop_extra)
+    print(json.dumps(report, indent=2))
+
+    uncovered = uncovered_queries()
+    if uncovered:
+        print('Hot queries not covered by an index:')
+        for entry in uncovered:
+            print(f"  {entry['query']}: {', '.join(entry['stages'])}")
+    else:
+        print('All hot queries are covered by an index.')
+
+    has_conflicts = any(r['conflicts'] for r in report.values())
+    return 1 if has_conflicts or uncovered else 0
+
+def rebuild_ledger_command(args):
+    from models.ledger import Ledger
+
+    report = Ledger.rebuild(apply=not args.verify)
+    print(json.dumps(report, indent=2))
+    return 1 if args.verify and report['drifted'] else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Livin backend maintenance commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    indexes_parser = subparsers.add_parser(
+        'ensure-indexes',
+        help='Create missing indexes and report hot queries that are not covered'
+    )
+    indexes_parser.add_argument(
+        '--drop-extra',
+        action='store_true',
+        help='Drop indexes that exist in the database but are not declared by a model'
+    )
+    indexes_parser.set_defaults(func=ensure_indexes_command)
+
+    ledger_parser = subparsers.add_parser(
+        'rebuild-ledger',
+        help='Recompute the per-user ledgers from bills and repair any drift'
+    )
+    ledger_parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='Only report drifted ledgers, exit non-zero if any'
+    )
+    ledger_parser.set_defaults(func=rebuild_ledger_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+)
+import os
+import time
+
+# Under gunicorn set PROMETHEUS_MULTIPROC_DIR (an empty, writable directory)
+# before the app starts: every worker then writes its samples there and
+# /api/metrics aggregates all workers. gunicorn_config.py clears the
+# directory on start and marks exited workers dead.
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+REQUEST_LATENCY = Histogram(
+    'splitbill_http_request_duration_seconds',
+    'Request latency by blueprint and endpoint',
+    ['blueprint', 'endpoint', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+REQUEST_COUNT = Counter(
+    'splitbill_http_requests_total',
+    'Requests by blueprint, endpoint and status code',
+    ['blueprint', 'endpoint', 'method', 'status']
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    'splitbill_mongodb_command_duration_seconds',
+    'MongoDB command round-trip time',
+    ['command'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+)
+MONGO_COMMANDS = Counter(
+    'splitbill_mongodb_commands_total',
+    'MongoDB commands by outcome',
+    ['command', 'outcome']
+)
+MONGO_POOL_WAIT = Histogram(
+    'splitbill_mongodb_pool_checkout_wait_seconds',
+    'Time spent waiting to check out a pooled MongoDB connection',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+MONGO_POOL_OPEN = Gauge(
+    'splitbill_mongodb_pool_open_connections',
+    'Open MongoDB connections across live workers',
+    multiprocess_mode='livesum'
+)
+BCRYPT_LATENCY = Histogram(
+    'splitbill_bcrypt_duration_seconds',
+    'bcrypt time including the wait for a bcrypt thread',
+    ['operation'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+ADMISSION_SHED = Counter(
+    'splitbill_admission_shed_total',
+    'Requests rejected by admission control',
+    ['priority', 'reason']
+)
+
+def _labels():
+    return request.blueprint or 'app', request.endpoint or 'unmatched', request.method
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+def _record_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        blueprint, endpoint, method = _labels()
+        REQUEST_LATENCY.labels(blueprint, endpoint, method).observe(time.perf_counter() - started)
+        REQUEST_COUNT.labels(blueprint, endpoint, method, str(response.status_code)).inc()
+    return response
+
+def metrics_view():
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+def init_app(app, limiter=None) -> None:
+    """Time every request and serve the metrics at /api/metrics."""
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/api/metrics', 'metrics', metrics_view)
+    if limiter is not None:
+        limiter.exempt(metrics_view)
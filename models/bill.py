@@ -1,8 +1,53 @@
 from datetime import datetime
-from typing import List, Optional, Literal, Dict, Any
-from pydantic import BaseModel, Field
+from typing import List, Optional, Literal, Dict, Any, Tuple, ClassVar
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, constr, model_validator
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from database import get_db
 from bson import ObjectId
+from splitting import add_charges, allocate, from_minor, split_equal, sum_by_participant, to_minor, to_minor_many
+import base64
+import hashlib
+import json
+
+# Fields returned by the summary view of the bill list
+SUMMARY_FIELDS = ['bill_name', 'total_amount', 'created_by', 'created_by_username', 'split_method', 'created_at']
+
+def encode_cursor(bill: Dict[str, Any]) -> str:
+    """Build an opaque pagination cursor from the last bill of a page."""
+    position = {'t': bill['created_at'].isoformat(), 'id': str(bill['_id'])}
+    return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+def has_bill_access(bill: Dict[str, Any], user_id: str) -> bool:
+    """Only the creator and registered participants may see a bill."""
+    return bill['created_by'] == user_id or any(
+        p.get('user_id') == user_id for p in bill.get('participants', [])
+    )
+
+def bill_user_ids(bill: Dict[str, Any]) -> List[str]:
+    """Creator and registered participants, whose bill lists change with the bill."""
+    user_ids = {bill['created_by']}
+    user_ids.update(p['user_id'] for p in bill.get('participants', []) if p.get('user_id'))
+    return sorted(user_ids)
+
+def bill_etag(bill: Dict[str, Any]) -> str:
+    """Strong ETag for a bill, from its version counter and updated_at."""
+    updated_at = bill.get('updated_at')
+    key = f"{bill['_id']}:{bill.get('version', 0)}:{updated_at.isoformat() if updated_at else ''}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def bill_list_etag(user_id: str, bills_version: int, args: Dict[str, str]) -> str:
+    """Strong ETag for a user's bill list (or one page of it)."""
+    query = '&'.join(f'{k}={v}' for k, v in sorted(args.items()))
+    key = f'{user_id}:{bills_version}:{query}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Inverse of encode_cursor. Raises ValueError on a malformed cursor."""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(position['t']), ObjectId(position['id'])
+    except Exception:
+        raise ValueError('Invalid cursor')
 
 class ItemSplit(BaseModel):
     user_id: Optional[str] = None
@@ -22,17 +67,36 @@ class Participant(BaseModel):
     external_name: str
     amount_due: float = Field(ge=0)
     status: Literal["unpaid", "paid"] = "unpaid"
+    weight: Optional[float] = None
 
 class Bill(BaseModel):
     bill_name: str
     total_amount: float = Field(ge=0)
     created_by: str
     created_by_username: str
-    split_method: Literal["equal", "per_product"]
+    split_method: Literal["equal", "per_product", "weighted"]
     participants: List[Participant]
     items: List[Item]
+    tax: float = Field(default=0, ge=0)
+    service_charge: float = Field(default=0, ge=0)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Bumped on every change to the bill, see bill_etag
+    version: int = 1
+
+    # Indexes for the `bills` collection, reconciled by indexes.ensure_indexes.
+    # Both list branches ($or on creator / participant) end in the
+    # (created_at, _id) keyset so the sort is served from the index.
+    INDEXES: ClassVar[List[IndexModel]] = [
+        IndexModel(
+            [('created_by', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+            name='created_by_created_at'
+        ),
+        IndexModel(
+            [('participants.user_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+            name='participants_user_id_created_at'
+        ),
+    ]
 
     class Config:
         json_schema_extra = {
@@ -70,16 +134,17 @@ class Bill(BaseModel):
             "created_by": self.created_by,
             "created_by_username": self.created_by_username,
             "split_method": self.split_method,
-            "participants": [p.dict() for p in self.participants],
-            "items": [i.dict() for i in self.items],
+            "participants": [p.model_dump() for p in self.participants],
+            "items": [i.model_dump() for i in self.items],
             "created_at": self.created_at,
-            "updated_at": self.updated_at
+            "updated_at": self.updated_at,
+            "version": self.version
         }
 
     def save(self) -> bool:
         try:
             db = get_db()
-            data = self.dict(exclude={'_id'})
+            data = self.model_dump(exclude={'_id'})
             if hasattr(self, '_id'):
                 result = db.bills.update_one(
                     {'_id': self._id},
@@ -94,27 +159,218 @@ class Bill(BaseModel):
             print(f"Error saving bill: {str(e)}")
             return False
 
+    @staticmethod
+    def insert(document: Dict[str, Any], session=None) -> ObjectId:
+        """Insert a bill document as built by build_bill_document.
+
+        pymongo sets `_id` on the document in place.
+        """
+        return get_db().bills.insert_one(document, session=session).inserted_id
+
     @staticmethod
     def find(query: Dict[str, Any]) -> List['Bill']:
         try:
             db = get_db()
-            bills = []
-            for bill_data in db.bills.find(query).sort('created_at', -1):
-                bill_data['_id'] = str(bill_data['_id'])
-                bills.append(bill_data)
-            return bills
+            return list(db.bills.find(query).sort('created_at', -1))
         except Exception as e:
             print(f"Error finding bills: {str(e)}")
             return []
 
+    @staticmethod
+    def find_page(user_id: str, limit: int, cursor: Optional[str] = None,
+                  summary: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return one page of the bills a user created or participates in.
+
+        Pages are keyed on (created_at, _id), newest first, so the cost of a
+        page doesn't depend on how deep into the history it is. Returns the
+        bills and the cursor for the next page (None on the last page).
+        """
+        query = {
+            '$or': [
+                {'created_by': user_id},
+                {'participants.user_id': user_id}
+            ]
+        }
+        if cursor:
+            created_at, last_id = decode_cursor(cursor)
+            query = {
+                '$and': [
+                    query,
+                    {'$or': [
+                        {'created_at': {'$lt': created_at}},
+                        {'created_at': created_at, '_id': {'$lt': last_id}}
+                    ]}
+                ]
+            }
+
+        projection = None
+        if summary:
+            projection = {field: 1 for field in SUMMARY_FIELDS}
+            projection['participants'] = {'$elemMatch': {'user_id': user_id}}
+
+        db = get_db()
+        bills = list(
+            db.bills.find(query, projection)
+            .sort([('created_at', -1), ('_id', -1)])
+            .limit(limit + 1)
+        )
+        next_cursor = encode_cursor(bills[limit - 1]) if len(bills) > limit else None
+        bills = bills[:limit]
+
+        if summary:
+            for bill in bills:
+                own_entry = (bill.pop('participants', None) or [{}])[0]
+                bill['status'] = own_entry.get('status')
+                bill['amount_due'] = own_entry.get('amount_due')
+        return bills, next_cursor
+
     @staticmethod
     def find_by_id(bill_id: str) -> Optional[Dict[str, Any]]:
         try:
             db = get_db()
-            bill = db.bills.find_one({'_id': ObjectId(bill_id)})
-            if bill:
-                bill['_id'] = str(bill['_id'])
-            return bill
+            return db.bills.find_one({'_id': ObjectId(bill_id)})
         except Exception as e:
             print(f"Error finding bill by ID: {str(e)}")
-            return None 
\ No newline at end of file
+            return None 
+
+# Create-bill request schema. Validated once through a module-level
+# TypeAdapter; the validated model is turned into the stored document by
+# build_bill_document without going through the Bill model again.
+NonEmptyStr = constr(min_length=1)
+StrippedStr = constr(strip_whitespace=True, min_length=1)
+
+class SplitRequest(BaseModel):
+    external_name: NonEmptyStr
+    quantity: int = Field(gt=0)
+
+class ItemRequest(BaseModel):
+    name: StrippedStr
+    price_per_unit: float = Field(gt=0)
+    quantity: int = Field(gt=0)
+    split: Optional[List[SplitRequest]] = None
+
+class ParticipantRequest(BaseModel):
+    external_name: NonEmptyStr
+    weight: Optional[float] = Field(default=None, gt=0)
+
+class CreateBillRequest(BaseModel):
+    bill_name: StrippedStr
+    split_method: Literal["equal", "per_product", "weighted"]
+    participants: List[ParticipantRequest] = Field(min_length=1)
+    items: List[ItemRequest] = Field(min_length=1)
+    tax: float = Field(default=0, ge=0)
+    service_charge: float = Field(default=0, ge=0)
+
+    @model_validator(mode='after')
+    def check_split_quantities(self) -> 'CreateBillRequest':
+        if self.split_method == 'per_product':
+            names = {participant.external_name for participant in self.participants}
+            for item in self.items:
+                if item.split is None:
+                    continue
+                if sum(split.quantity for split in item.split) != item.quantity:
+                    raise ValueError(
+                        f'Split quantities for item "{item.name}" must sum up to the total quantity ({item.quantity})'
+                    )
+                unknown = [split.external_name for split in item.split if split.external_name not in names]
+                if unknown:
+                    raise ValueError(f'Split for item "{item.name}" references unknown participant "{unknown[0]}"')
+        if self.split_method == 'weighted' and any(p.weight is None for p in self.participants):
+            raise ValueError('Each participant must have a weight for the weighted split method')
+        return self
+
+create_bill_adapter = TypeAdapter(CreateBillRequest)
+
+def validation_errors(error: ValidationError) -> List[Dict[str, str]]:
+    """Field-level messages for a ValidationError, e.g. {'field': 'items.0.quantity', ...}."""
+    details = []
+    for err in error.errors():
+        message = str(err['ctx']['error']) if err['type'] == 'value_error' else err['msg']
+        details.append({'field': '.'.join(str(part) for part in err['loc']), 'message': message})
+    return details
+
+def _with_user(entry: Dict[str, Any], user: Optional[dict]) -> Dict[str, Any]:
+    entry['user_id'] = str(user['_id']) if user else None
+    entry['username'] = user['username'] if user else None
+    return entry
+
+def build_bill_document(bill_request: CreateBillRequest, creator: dict,
+                        users_by_name: Dict[str, dict]) -> Dict[str, Any]:
+    """Build the `bills` document for a validated create-bill request.
+
+    Amounts are computed in integer minor units by the split engine, so the
+    participants' amounts always add up to total_amount. Tax and service
+    charge are distributed in proportion to each share. In a per_product
+    bill, items without a split are shared equally. users_by_name maps
+    external names to registered users (see User.find_by_usernames); the
+    creator's own share is marked as paid.
+    """
+    creator_id = str(creator['_id'])
+    participants_in = bill_request.participants
+    index_by_name = {participant.external_name: i for i, participant in enumerate(participants_in)}
+
+    items = []
+    subtotal = 0
+    shared = 0
+    split_indices, split_amounts = [], []
+    prices = to_minor_many([item.price_per_unit for item in bill_request.items])
+    for item, price in zip(bill_request.items, prices):
+        subtotal += price * item.quantity
+        splits = None
+        if bill_request.split_method == 'per_product':
+            if item.split is None:
+                shared += price * item.quantity
+            else:
+                splits = []
+                for split in item.split:
+                    splits.append(_with_user(
+                        {'external_name': split.external_name, 'quantity': split.quantity},
+                        users_by_name.get(split.external_name)
+                    ))
+                    split_indices.append(index_by_name[split.external_name])
+                    split_amounts.append(price * split.quantity)
+        items.append({
+            'name': item.name,
+            'price_per_unit': item.price_per_unit,
+            'quantity': item.quantity,
+            'split': splits
+        })
+
+    count = len(participants_in)
+    if bill_request.split_method == 'equal':
+        amounts = split_equal(subtotal, count)
+    elif bill_request.split_method == 'weighted':
+        amounts = allocate(subtotal, [participant.weight for participant in participants_in])
+    else:
+        amounts = sum_by_participant(count, split_indices, split_amounts)
+        if shared:
+            amounts = [a + b for a, b in zip(amounts, split_equal(shared, count))]
+
+    tax = to_minor(bill_request.tax)
+    service_charge = to_minor(bill_request.service_charge)
+    amounts = add_charges(amounts, tax + service_charge)
+
+    participants = []
+    for participant, amount in zip(participants_in, amounts):
+        entry = _with_user({'external_name': participant.external_name}, users_by_name.get(participant.external_name))
+        entry['amount_due'] = from_minor(amount)
+        entry['status'] = 'paid' if entry['user_id'] == creator_id else 'unpaid'
+        if participant.weight is not None:
+            entry['weight'] = participant.weight
+        participants.append(entry)
+
+    now = datetime.utcnow()
+    return {
+        'bill_name': bill_request.bill_name,
+        'total_amount': from_minor(subtotal + tax + service_charge),
+        'created_by': creator_id,
+        'created_by_username': creator['username'],
+        'split_method': bill_request.split_method,
+        'participants': participants,
+        'items': items,
+        'tax': bill_request.tax,
+        'service_charge': bill_request.service_charge,
+        'created_at': now,
+        'updated_at': now,
+        'version': 1
+    }
@@ -0,0 +1,155 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from pymongo import UpdateOne, ReplaceOne
+from database import get_db
+from splitting import from_minor, to_minor
+
+# One document per user in the `ledgers` collection, keyed by user id:
+#   owed_to_me / owed_by_me  - totals in minor currency units
+#   counterparties           - net balance per counterparty (positive: they owe me)
+#   names                    - display name per counterparty key
+# Counterparty keys are the user id for registered users and 'x' + the hex
+# encoded name for external participants, so they are safe as field names.
+
+# A debt edge: (debtor key, debtor user id or None, debtor name, creditor user id, creditor name, amount in minor units)
+Edge = Tuple[str, Optional[str], str, str, str, int]
+
+def counterparty_key(participant: Dict[str, Any]) -> str:
+    if participant.get('user_id'):
+        return participant['user_id']
+    return 'x' + participant['external_name'].encode('utf-8').hex()
+
+def decode_counterparty_key(key: str) -> Dict[str, str]:
+    if key.startswith('x'):
+        return {'external_name': bytes.fromhex(key[1:]).decode('utf-8')}
+    return {'user_id': key}
+
+def participant_edge(bill: Dict[str, Any], participant: Dict[str, Any]) -> Edge:
+    return (
+        counterparty_key(participant),
+        participant.get('user_id'),
+        participant.get('username') or participant['external_name'],
+        bill['created_by'],
+        bill.get('created_by_username') or bill['created_by'],
+        to_minor(participant['amount_due'])
+    )
+
+def bill_edges(bill: Dict[str, Any]) -> List[Edge]:
+    """Debts a bill creates: every unpaid participant other than the creator owes the creator."""
+    return [
+        participant_edge(bill, participant)
+        for participant in bill.get('participants', [])
+        if participant['status'] == 'unpaid' and participant.get('user_id') != bill['created_by']
+    ]
+
+def _changes(edges: Iterable[Edge], sign: int) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Fold edges into per-user $inc/$set documents."""
+    changes = defaultdict(lambda: {'$inc': defaultdict(int), '$set': {}})
+    for debtor_key, debtor_id, debtor_name, creditor_id, creditor_name, amount in edges:
+        amount *= sign
+        creditor = changes[creditor_id]
+        creditor['$inc']['owed_to_me'] += amount
+        creditor['$inc'][f'counterparties.{debtor_key}'] += amount
+        creditor['$set'][f'names.{debtor_key}'] = debtor_name
+        if debtor_id:
+            debtor = changes[debtor_id]
+            debtor['$inc']['owed_by_me'] += amount
+            debtor['$inc'][f'counterparties.{creditor_id}'] -= amount
+            debtor['$set'][f'names.{creditor_id}'] = creditor_name
+    return changes
+
+class Ledger:
+    @staticmethod
+    def apply(edges: Iterable[Edge], sign: int = 1, session=None) -> None:
+        """Add (sign=1) or settle (sign=-1) debts with one bulk write.
+
+        Call inside the transaction that changes the bills, so the ledger
+        never drifts from them.
+        """
+        operations = []
+        for user_id, update in _changes(edges, sign).items():
+            document = {'$inc': dict(update['$inc'])}
+            if update['$set']:
+                document['$set'] = update['$set']
+            operations.append(UpdateOne({'_id': user_id}, document, upsert=True))
+        if operations:
+            get_db().ledgers.bulk_write(operations, ordered=False, session=session)
+
+    @staticmethod
+    def find(user_id: str) -> Dict[str, Any]:
+        """The user's ledger in major currency units, settled counterparties omitted."""
+        ledger = get_db().ledgers.find_one({'_id': user_id}) or {}
+        names = ledger.get('names', {})
+        counterparties = [
+            {**decode_counterparty_key(key), 'name': names.get(key), 'balance': from_minor(balance)}
+            for key, balance in ledger.get('counterparties', {}).items()
+            if balance
+        ]
+        counterparties.sort(key=lambda entry: -abs(entry['balance']))
+        owed_to_me = ledger.get('owed_to_me', 0)
+        owed_by_me = ledger.get('owed_by_me', 0)
+        return {
+            'owed_to_me': from_minor(owed_to_me),
+            'owed_by_me': from_minor(owed_by_me),
+            'net': from_minor(owed_to_me - owed_by_me),
+            'counterparties': counterparties
+        }
+
+    @staticmethod
+    def rebuild(apply: bool = True) -> Dict[str, Any]:
+        """Recompute every ledger from `bills` and report drift.
+
+        With apply=False only the drift report is returned. Unpaid
+        participant entries are streamed from the bills cursor, so only the
+        per-user totals are kept in memory.
+        """
+        db = get_db()
+        expected = defaultdict(lambda: {'owed_to_me': 0, 'owed_by_me': 0, 'counterparties': defaultdict(int), 'names': {}})
+        bills = db.bills.find(
+            {'participants.status': 'unpaid'},
+            {'created_by': 1, 'created_by_username': 1, 'participants': 1}
+        )
+        for bill in bills:
+            for user_id, update in _changes(bill_edges(bill), 1).items():
+                ledger = expected[user_id]
+                for field, amount in update['$inc'].items():
+                    if field.startswith('counterparties.'):
+                        ledger['counterparties'][field.split('.', 1)[1]] += amount
+                    else:
+                        ledger[field] += amount
+                for field, name in update['$set'].items():
+                    ledger['names'][field.split('.', 1)[1]] = name
+
+        drifted = []
+        stored_ids = set()
+        for stored in db.ledgers.find():
+            stored_ids.add(stored['_id'])
+            if _differs(stored, expected.get(stored['_id'])):
+                drifted.append(stored['_id'])
+        drifted.extend(user_id for user_id in expected if user_id not in stored_ids)
+
+        if apply and drifted:
+            empty = {'owed_to_me': 0, 'owed_by_me': 0, 'counterparties': {}, 'names': {}}
+            db.ledgers.bulk_write([
+                ReplaceOne({'_id': user_id}, _plain(expected.get(user_id, empty)), upsert=True)
+                for user_id in drifted
+            ], ordered=False)
+
+        return {'ledgers': len(stored_ids | set(expected)), 'drifted': sorted(drifted), 'repaired': apply}
+
+def _plain(ledger: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'owed_to_me': ledger['owed_to_me'],
+        'owed_by_me': ledger['owed_by_me'],
+        'counterparties': dict(ledger['counterparties']),
+        'names': dict(ledger['names'])
+    }
+
+def _differs(stored: Dict[str, Any], expected: Optional[Dict[str, Any]]) -> bool:
+    expected_counterparties = {k: v for k, v in (expected or {}).get('counterparties', {}).items() if v}
+    stored_counterparties = {k: v for k, v in stored.get('counterparties', {}).items() if v}
+    return (
+        stored.get('owed_to_me', 0) != (expected or {}).get('owed_to_me', 0)
+        or stored.get('owed_by_me', 0) != (expected or {}).get('owed_by_me', 0)
+        or stored_counterparties != expected_counterparties
+    )
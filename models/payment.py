@@ -0,0 +1,189 @@
+from datetime import datetime
+from typing import Any, Dict, List
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from models.bill import bill_user_ids
+from models.ledger import Ledger, participant_edge
+from models.user import User
+
+class PaymentError(Exception):
+    """A payment that can't go through, with the HTTP status to report."""
+
+    def __init__(self, message: str, status_code: int = 400, **details: Any):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.details = details
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'error': self.message, **self.details}
+
+# Bill fields a payment needs: the payer's entry, and who to notify / credit
+PAYMENT_PROJECTION = {
+    'created_by': 1,
+    'created_by_username': 1,
+    'participants.user_id': 1,
+    'participants.username': 1,
+    'participants.external_name': 1,
+    'participants.status': 1,
+    'participants.amount_due': 1
+}
+
+def _raise_unpayable(db, bill_id: str, user_id: str, session) -> None:
+    """Work out why the conditional bill update matched nothing."""
+    bill = db.bills.find_one(
+        {'_id': ObjectId(bill_id)},
+        {'participants': {'$elemMatch': {'user_id': user_id}}},
+        session=session
+    )
+    if not bill:
+        raise PaymentError('Bill not found', 404)
+    if not bill.get('participants'):
+        raise PaymentError('User is not a participant in this bill', 403)
+    raise PaymentError('Already paid', 400)
+
+def pay_participant(db, session, bill_id: str, user_id: str) -> Dict[str, Any]:
+    """Settle the user's share of a bill. Must run inside a transaction.
+
+    Both writes are conditional, so no prior reads are needed: the
+    participant only flips if still unpaid, and the balance is only
+    decremented if it covers the amount due. Raises PaymentError (which
+    aborts the transaction) when either condition fails.
+    """
+    bill = db.bills.find_one_and_update(
+        {
+            '_id': ObjectId(bill_id),
+            'participants': {'$elemMatch': {'user_id': user_id, 'status': 'unpaid'}}
+        },
+        {
+            '$set': {
+                'participants.$.status': 'paid',
+                'updated_at': datetime.utcnow()
+            },
+            '$inc': {'version': 1}
+        },
+        projection=PAYMENT_PROJECTION,
+        session=session
+    )
+    if bill is None:
+        _raise_unpayable(db, bill_id, user_id, session)
+
+    participant = next(p for p in bill['participants'] if p.get('user_id') == user_id)
+    amount_due = float(participant['amount_due'])
+
+    user = db.users.find_one_and_update(
+        {'_id': ObjectId(user_id), 'balance': {'$gte': amount_due}},
+        {'$inc': {'balance': -amount_due}},
+        projection={'balance': 1},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if user is None:
+        current = db.users.find_one({'_id': ObjectId(user_id)}, {'balance': 1}, session=session)
+        raise PaymentError(
+            'Insufficient balance',
+            400,
+            amount_due=amount_due,
+            current_balance=float(current['balance']) if current else 0.0
+        )
+
+    Ledger.apply([participant_edge(bill, participant)], -1, session=session)
+    affected_user_ids = bill_user_ids(bill)
+    User.bump_bills_version(affected_user_ids, session=session)
+
+    return {
+        'amount_paid': amount_due,
+        'new_balance': user['balance'],
+        'affected_user_ids': affected_user_ids
+    }
+
+def pay_participants(db, session, bill_ids: List[str], user_id: str) -> Dict[str, Any]:
+    """Settle the user's share of several bills at once. Must run inside a transaction.
+
+    Bills that can't be paid (unknown, not a participant, already paid) are
+    reported per bill and skipped. The rest are paid together: one read of
+    all bills, one conditional balance decrement for the total and one
+    bulk write for the participant updates. Raises PaymentError if the
+    balance doesn't cover the total or nothing is payable.
+    """
+    results = {bill_id: None for bill_id in bill_ids}
+    valid_ids = []
+    for bill_id in bill_ids:
+        if ObjectId.is_valid(bill_id):
+            valid_ids.append(ObjectId(bill_id))
+        else:
+            results[bill_id] = {'bill_id': bill_id, 'status': 'error', 'error': 'Invalid bill ID format'}
+
+    payable = {}
+    edges = []
+    affected_user_ids = set()
+    user_ids_by_bill = {}
+    for bill in db.bills.find(
+        {'_id': {'$in': valid_ids}},
+        PAYMENT_PROJECTION,
+        session=session
+    ):
+        bill_id = str(bill['_id'])
+        participant = next((p for p in bill['participants'] if p.get('user_id') == user_id), None)
+        if not participant:
+            results[bill_id] = {'bill_id': bill_id, 'status': 'error', 'error': 'User is not a participant in this bill'}
+        elif participant['status'] == 'paid':
+            results[bill_id] = {'bill_id': bill_id, 'status': 'error', 'error': 'Already paid'}
+        else:
+            payable[bill_id] = float(participant['amount_due'])
+            edges.append(participant_edge(bill, participant))
+            user_ids_by_bill[bill_id] = bill_user_ids(bill)
+            affected_user_ids.update(user_ids_by_bill[bill_id])
+
+    for bill_id, result in results.items():
+        if result is None and bill_id not in payable:
+            results[bill_id] = {'bill_id': bill_id, 'status': 'error', 'error': 'Bill not found'}
+
+    if not payable:
+        raise PaymentError('No payable bills', 400, results=list(results.values()))
+
+    total = sum(payable.values())
+    user = db.users.find_one_and_update(
+        {'_id': ObjectId(user_id), 'balance': {'$gte': total}},
+        {'$inc': {'balance': -total}},
+        projection={'balance': 1},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if user is None:
+        current = db.users.find_one({'_id': ObjectId(user_id)}, {'balance': 1}, session=session)
+        raise PaymentError(
+            'Insufficient balance',
+            400,
+            amount_due=total,
+            current_balance=float(current['balance']) if current else 0.0
+        )
+
+    now = datetime.utcnow()
+    result = db.bills.bulk_write([
+        UpdateOne(
+            {
+                '_id': ObjectId(bill_id),
+                'participants': {'$elemMatch': {'user_id': user_id, 'status': 'unpaid'}}
+            },
+            {'$set': {'participants.$.status': 'paid', 'updated_at': now}, '$inc': {'version': 1}}
+        )
+        for bill_id in payable
+    ], ordered=False, session=session)
+    if result.modified_count != len(payable):
+        raise PaymentError('Bills changed during payment, please retry', 409)
+
+    Ledger.apply(edges, -1, session=session)
+    affected_user_ids = sorted(affected_user_ids)
+    User.bump_bills_version(affected_user_ids, session=session)
+
+    for bill_id, amount in payable.items():
+        results[bill_id] = {'bill_id': bill_id, 'status': 'paid', 'amount_paid': amount}
+
+    return {
+        'results': list(results.values()),
+        'total_paid': total,
+        'new_balance': user['balance'],
+        'affected_user_ids': affected_user_ids,
+        'user_ids_by_bill': user_ids_by_bill
+    }
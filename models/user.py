@@ -1,13 +1,42 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Dict, Iterable, List, ClassVar
+from pymongo import ASCENDING, IndexModel
+from flask import g, has_request_context
 from database import get_db
 from bson import ObjectId
 
+def _identity_map() -> Optional[Dict[str, Dict[str, Optional[dict]]]]:
+    """Per-request cache of user documents, keyed by id and by username.
+
+    Lookups outside a request context are not cached.
+    """
+    if not has_request_context():
+        return None
+    if 'user_identity_map' not in g:
+        g.user_identity_map = {'id': {}, 'username': {}}
+    return g.user_identity_map
+
+def clear_identity_map() -> None:
+    """Drop the users cached for this request (e.g. between chunks of a bulk import)."""
+    if has_request_context():
+        g.pop('user_identity_map', None)
+
+def _remember(user: dict) -> None:
+    identity_map = _identity_map()
+    if identity_map is not None:
+        identity_map['id'][str(user['_id'])] = user
+        identity_map['username'][user['username']] = user
+
 class User(BaseModel):
     username: str
     balance: float = 0.0
     hashed_password: Optional[str] = None
 
+    # Indexes for the `users` collection, reconciled by indexes.ensure_indexes
+    INDEXES: ClassVar[List[IndexModel]] = [
+        IndexModel([('username', ASCENDING)], name='username_unique', unique=True),
+    ]
+
     class Config:
         json_schema_extra = {
             "example": {
@@ -18,9 +47,16 @@ class User(BaseModel):
     
     @staticmethod
     def find_by_id(user_id: str) -> Optional[dict]:
+        identity_map = _identity_map()
+        if identity_map is not None and str(user_id) in identity_map['id']:
+            return identity_map['id'][str(user_id)]
         try:
             db = get_db()
             user = db.users.find_one({'_id': ObjectId(user_id)})
+            if user:
+                _remember(user)
+            elif identity_map is not None:
+                identity_map['id'][str(user_id)] = None
             return user
         except Exception as e:
             print(f"Error finding user by ID: {str(e)}")
@@ -28,10 +64,59 @@ class User(BaseModel):
     
     @staticmethod
     def find_by_username(username: str) -> Optional[dict]:
+        return User.find_by_usernames([username]).get(username)
+
+    @staticmethod
+    def find_by_usernames(usernames: Iterable[str]) -> Dict[str, dict]:
+        """Resolve many usernames with a single `$in` query.
+
+        Returns a mapping of username to user document for the usernames
+        that exist. Results (including misses) are kept in the per-request
+        identity map, so repeated lookups don't go back to the database.
+        """
+        identity_map = _identity_map()
+        found = {}
+        missing = set()
+        for username in usernames:
+            if identity_map is not None and username in identity_map['username']:
+                if identity_map['username'][username] is not None:
+                    found[username] = identity_map['username'][username]
+            else:
+                missing.add(username)
+
+        if not missing:
+            return found
+
         try:
             db = get_db()
-            user = db.users.find_one({'username': username})
-            return user
+            for user in db.users.find({'username': {'$in': list(missing)}}):
+                _remember(user)
+                found[user['username']] = user
+                missing.discard(user['username'])
+            if identity_map is not None:
+                for username in missing:
+                    identity_map['username'][username] = None
         except Exception as e:
-            print(f"Error finding user by username: {str(e)}")
-            return None 
\ No newline at end of file
+            print(f"Error finding users by username: {str(e)}")
+        return found 
+
+    @staticmethod
+    def bump_bills_version(user_ids: Iterable[str], session=None) -> None:
+        """Mark the bill lists of these users as changed.
+
+        bills_version feeds the ETag of GET /api/bills, so every write that
+        changes a bill must bump it for the creator and registered participants.
+        """
+        object_ids = [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]
+        if not object_ids:
+            return
+        get_db().users.update_many(
+            {'_id': {'$in': object_ids}},
+            {'$inc': {'bills_version': 1}},
+            session=session
+        )
+
+    @staticmethod
+    def get_bills_version(user_id: str) -> int:
+        user = get_db().users.find_one({'_id': ObjectId(user_id)}, {'bills_version': 1})
+        return user.get('bills_version', 0) if user else 0
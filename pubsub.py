@@ -0,0 +1,247 @@
+"""Bill events for the SSE streams.
+
+Write paths publish an event after their transaction commits; each worker
+keeps the recent events in a ring buffer and hands them to its subscribed
+streams. PUBSUB_BACKEND decides how events reach the other workers:
+
+    memory - only the publishing worker (single-worker deployments, development)
+    redis  - Redis pub/sub on REDIS_URL
+    mongo  - inserts into `bill_events`, read back by a change stream on every
+             worker (needs a replica set; the TTL index comes from ensure-indexes)
+
+With redis and mongo every worker receives all events in the same order,
+so a client can resume with Last-Event-ID on any worker as long as the
+event is still in that worker's buffer.
+"""
+from collections import deque
+from datetime import datetime
+from typing import Any, ClassVar, Dict, Iterable, Iterator, List, Optional
+import os
+import queue
+import threading
+import time
+
+from bson import ObjectId
+from pymongo import IndexModel
+
+from json_provider import dumps_bytes
+
+PUBSUB_BACKEND = os.getenv('PUBSUB_BACKEND', 'memory').lower()
+PUBSUB_BUFFER_SIZE = int(os.getenv('PUBSUB_BUFFER_SIZE', 1000))
+# Events a slow stream may fall behind before it is closed (the client then resumes)
+PUBSUB_SUBSCRIBER_QUEUE = int(os.getenv('PUBSUB_SUBSCRIBER_QUEUE', 100))
+PUBSUB_EVENT_TTL = int(os.getenv('PUBSUB_EVENT_TTL', 3600))
+REDIS_CHANNEL = 'splitbill:bill-events'
+# A stream holds its worker for its whole life, which only cooperative
+# (gevent) workers can afford; gunicorn_config.py turns streams off for the
+# other worker classes and the stream routes answer with a fast 503
+SSE_ENABLED = os.getenv('SSE_ENABLED', 'true').lower() == 'true'
+SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+# Streams end after this long and the client reconnects with Last-Event-ID
+SSE_MAX_STREAM_SECONDS = float(os.getenv('SSE_MAX_STREAM_SECONDS', 600))
+SSE_RETRY_MS = int(os.getenv('SSE_RETRY_MS', 3000))
+
+class EventLog:
+    """The `bill_events` collection used by the mongo backend."""
+    INDEXES: ClassVar[List[IndexModel]] = [
+        IndexModel([('created_at', 1)], name='created_at_ttl', expireAfterSeconds=PUBSUB_EVENT_TTL),
+    ]
+
+def bill_topic(bill_id: str) -> str:
+    return f'bill:{bill_id}'
+
+def user_topic(user_id: str) -> str:
+    return f'user:{user_id}'
+
+class Subscription:
+    def __init__(self, topics: Iterable[str]):
+        self.topics = set(topics)
+        self.queue: 'queue.Queue[Optional[Dict[str, Any]]]' = queue.Queue(PUBSUB_SUBSCRIBER_QUEUE)
+        self.closed = False
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Too far behind: end the stream, the client resumes from its last event
+            self.closed = True
+
+    def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class Broker:
+    """Fans events out to this worker's subscriptions and keeps a replay buffer."""
+
+    def __init__(self, buffer_size: int = PUBSUB_BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._subscriptions: List[Subscription] = []
+
+    def dispatch(self, event: Dict[str, Any]) -> None:
+        topics = set(event['topics'])
+        with self._lock:
+            self._buffer.append(event)
+            subscriptions = [s for s in self._subscriptions if s.topics & topics]
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    def subscribe(self, topics: Iterable[str], last_event_id: Optional[str] = None):
+        """Register a subscription; returns it with the buffered events after last_event_id.
+
+        The backlog is None when last_event_id is no longer (or never was)
+        in the buffer, so the client knows it has to refetch.
+        """
+        subscription = Subscription(topics)
+        with self._lock:
+            backlog: Optional[List[Dict[str, Any]]] = []
+            if last_event_id:
+                events = list(self._buffer)
+                position = next((i for i, e in enumerate(events) if e['id'] == last_event_id), None)
+                if position is None:
+                    backlog = None
+                else:
+                    backlog = [e for e in events[position + 1:] if subscription.topics & set(e['topics'])]
+            self._subscriptions.append(subscription)
+        return subscription, backlog
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+class MemoryBackend:
+    def __init__(self, broker: Broker):
+        self.broker = broker
+
+    def start(self) -> None:
+        pass
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        self.broker.dispatch(event)
+
+class RedisBackend:
+    def __init__(self, broker: Broker, url: Optional[str] = None):
+        import redis
+        self.broker = broker
+        self.client = redis.Redis.from_url(url or os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+
+    def start(self) -> None:
+        threading.Thread(target=self._listen, name='pubsub-redis', daemon=True).start()
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        self.client.publish(REDIS_CHANNEL, dumps_bytes(event))
+
+    def _listen(self) -> None:
+        import orjson
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REDIS_CHANNEL)
+                for message in pubsub.listen():
+                    self.broker.dispatch(orjson.loads(message['data']))
+            except Exception as e:
+                print('Error reading bill events from Redis:', str(e))
+                time.sleep(1)
+
+class MongoBackend:
+    def __init__(self, broker: Broker):
+        self.broker = broker
+
+    def start(self) -> None:
+        threading.Thread(target=self._watch, name='pubsub-mongo', daemon=True).start()
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        from database import get_db
+        get_db().bill_events.insert_one({**event, '_id': ObjectId(event['id']), 'created_at': datetime.utcnow()})
+
+    def _watch(self) -> None:
+        from database import get_db
+        resume_token = None
+        while True:
+            try:
+                with get_db().bill_events.watch(
+                    [{'$match': {'operationType': 'insert'}}],
+                    resume_after=resume_token
+                ) as stream:
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        document = change['fullDocument']
+                        self.broker.dispatch({
+                            'id': document['id'],
+                            'type': document['type'],
+                            'topics': document['topics'],
+                            'data': document['data']
+                        })
+            except Exception as e:
+                print('Error watching bill events:', str(e))
+                time.sleep(1)
+
+_BACKENDS = {'memory': MemoryBackend, 'redis': RedisBackend, 'mongo': MongoBackend}
+
+broker = Broker()
+_backend = None
+_backend_pid = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """This process's backend, started on first use (listener threads don't survive fork)."""
+    global _backend, _backend_pid
+    if _backend is None or _backend_pid != os.getpid():
+        with _backend_lock:
+            if _backend is None or _backend_pid != os.getpid():
+                if PUBSUB_BACKEND not in _BACKENDS:
+                    raise ValueError(f'Unsupported PUBSUB_BACKEND: {PUBSUB_BACKEND}')
+                backend = _BACKENDS[PUBSUB_BACKEND](broker)
+                backend.start()
+                _backend, _backend_pid = backend, os.getpid()
+    return _backend
+
+def publish(event_type: str, bill_id: str, user_ids: Iterable[str], data: Dict[str, Any]) -> None:
+    """Publish a bill event to the bill's stream and to each affected user's stream.
+
+    Never raises: a lost event must not fail a write that already committed.
+    Does nothing when streams are off, since no one could read the event.
+    """
+    if not SSE_ENABLED:
+        return
+    event = {
+        'id': str(ObjectId()),
+        'type': event_type,
+        'topics': [bill_topic(bill_id)] + [user_topic(user_id) for user_id in user_ids],
+        'data': {'bill_id': bill_id, **data}
+    }
+    try:
+        get_backend().publish(event)
+    except Exception as e:
+        print('Error publishing bill event:', str(e))
+
+def format_event(event: Dict[str, Any]) -> bytes:
+    return b'id: %s\nevent: %s\ndata: %s\n\n' % (
+        event['id'].encode('utf-8'), event['type'].encode('utf-8'), dumps_bytes(event['data'])
+    )
+
+def stream(topics: Iterable[str], last_event_id: Optional[str] = None,
+           heartbeat: float = SSE_HEARTBEAT_SECONDS, max_seconds: float = SSE_MAX_STREAM_SECONDS) -> Iterator[bytes]:
+    """SSE body for the topics: missed events first, then live ones, with heartbeat comments."""
+    get_backend()
+    subscription, backlog = broker.subscribe(topics, last_event_id)
+    try:
+        yield b'retry: %d\n\n' % SSE_RETRY_MS
+        if backlog is None:
+            # The client missed events we no longer have; it has to refetch
+            yield b'event: reset\ndata: {}\n\n'
+        else:
+            for event in backlog:
+                yield format_event(event)
+        deadline = time.monotonic() + max_seconds
+        while not subscription.closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event = subscription.get(min(heartbeat, remaining))
+            yield format_event(event) if event is not None else b': heartbeat\n\n'
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,214 @@
+"""Count MongoDB round trips per request and hold routes to a query budget.
+
+Routes declare their budget with @query_budget; the command listener in
+database.py reports every command to the active counter. In tests, wrap a
+request in assert_query_budget() (or count_queries() to inspect the
+counts); in development set QUERY_BUDGET_MODE=log or raise to check every
+request against its route's budget ('raise' answers an overrun with a 500
+that lists the queries).
+
+    with assert_query_budget(endpoint='bill.handle_bills', method='POST', app=app):
+        client.post('/api/bills/', json=payload, headers=headers)
+
+mongomock has no command monitoring; call instrument_mongomock() once to
+count its collection calls the same way.
+
+Streamed responses (export, import) are only counted up to the point the
+view returns; queries made while the body streams are not.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+import functools
+import os
+
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'off').lower()
+
+# Shapes that show up at least this often in one request are reported as repeated
+REPEATED_THRESHOLD = 2
+
+_in_mongomock_call: ContextVar[bool] = ContextVar('in_mongomock_call', default=False)
+# Every active counter sees every command, so a test's counter and the dev middleware can nest
+_active: ContextVar[Tuple['QueryCounter', ...]] = ContextVar('query_counters', default=())
+
+class QueryBudgetExceeded(AssertionError):
+    def __init__(self, counter: 'QueryCounter', budget: int, label: str = 'request'):
+        self.counter = counter
+        self.budget = budget
+        super().__init__(f'{label} made {counter.total} MongoDB round trips (budget {budget})\n{counter.report()}')
+
+class QueryCounter:
+    """The commands sent while the counter is active, by query shape."""
+
+    def __init__(self):
+        self.shapes: List[str] = []
+
+    @property
+    def total(self) -> int:
+        return len(self.shapes)
+
+    def by_shape(self) -> Counter:
+        return Counter(self.shapes)
+
+    def repeated(self) -> Dict[str, int]:
+        return {shape: count for shape, count in self.by_shape().items() if count >= REPEATED_THRESHOLD}
+
+    def report(self) -> str:
+        repeated = self.repeated()
+        lines = []
+        for shape, count in self.by_shape().most_common():
+            marker = '  <- repeated' if shape in repeated else ''
+            lines.append(f'  {count:>3} x {shape}{marker}')
+        return '\n'.join(lines)
+
+def _keys(spec: Any) -> Any:
+    """The structure of a filter with every value replaced by '?'."""
+    if isinstance(spec, dict):
+        return {key: _keys(value) for key, value in sorted(spec.items())}
+    if isinstance(spec, (list, tuple)) and spec and isinstance(spec[0], dict):
+        return [_keys(spec[0])]
+    return '?'
+
+def command_shape(command_name: str, command: Dict[str, Any]) -> str:
+    """A command without its values, e.g. `find users {'username': {'$in': '?'}}`."""
+    collection = command.get(command_name)
+    if not isinstance(collection, str):
+        return command_name
+    if command_name == 'find':
+        spec = _keys(command.get('filter', {}))
+    elif command_name == 'findAndModify':
+        spec = _keys(command.get('query', {}))
+    elif command_name in ('update', 'delete'):
+        statements = command.get('updates' if command_name == 'update' else 'deletes') or [{}]
+        spec = _keys(statements[0].get('q', {}))
+    elif command_name == 'aggregate':
+        spec = [next(iter(stage), '?') for stage in command.get('pipeline', [])]
+    else:
+        spec = None
+    return f'{command_name} {collection} {spec}' if spec is not None else f'{command_name} {collection}'
+
+def record_command(command_name: str, command: Dict[str, Any]) -> None:
+    counters = _active.get()
+    if counters:
+        shape = command_shape(command_name, command)
+        for counter in counters:
+            counter.shapes.append(shape)
+
+@contextmanager
+def count_queries():
+    """Count the MongoDB round trips made inside the block."""
+    counter = QueryCounter()
+    token = _active.set(_active.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _active.reset(token)
+
+@contextmanager
+def assert_query_budget(budget: Optional[int] = None, endpoint: Optional[str] = None,
+                        method: str = 'GET', app=None):
+    """Fail if the block makes more round trips than `budget` (or the endpoint's declared budget)."""
+    if budget is None:
+        budget = budget_for(app.view_functions[endpoint], method)
+    with count_queries() as counter:
+        yield counter
+    if budget is not None and counter.total > budget:
+        raise QueryBudgetExceeded(counter, budget, endpoint or 'block')
+
+def query_budget(limit: Optional[int] = None, **per_method: int):
+    """Declare how many MongoDB round trips a view may make, overall or per HTTP method."""
+    def decorator(view):
+        view.query_budget = {'*': limit, **{method.upper(): n for method, n in per_method.items()}}
+        return view
+    return decorator
+
+def budget_for(view, method: str) -> Optional[int]:
+    budgets = getattr(view, 'query_budget', None)
+    if budgets is None:
+        return None
+    return budgets.get(method.upper(), budgets['*'])
+
+# mongomock Collection method -> (command name, field the first argument maps to)
+_MONGOMOCK_COMMANDS = {
+    'find': ('find', 'filter'),
+    'find_one': ('find', 'filter'),
+    'count_documents': ('aggregate', None),
+    'aggregate': ('aggregate', 'pipeline'),
+    'find_one_and_update': ('findAndModify', 'query'),
+    'insert_one': ('insert', None),
+    'insert_many': ('insert', None),
+    'update_one': ('update', 'updates'),
+    'update_many': ('update', 'updates'),
+    'replace_one': ('update', 'updates'),
+    'bulk_write': ('update', None),
+    'delete_one': ('delete', 'deletes'),
+    'delete_many': ('delete', 'deletes'),
+}
+
+def _mongomock_command(collection: str, command_name: str, field: Optional[str], args, kwargs) -> Dict[str, Any]:
+    command = {command_name: collection}
+    argument = args[0] if args else kwargs.get('filter', kwargs.get('pipeline'))
+    if field in ('updates', 'deletes'):
+        command[field] = [{'q': argument or {}}]
+    elif field:
+        command[field] = argument or ({} if field != 'pipeline' else [])
+    return command
+
+def instrument_mongomock() -> None:
+    """Report each top-level mongomock Collection call as one round trip."""
+    from mongomock.collection import Collection
+
+    def instrument(method, command_name, field):
+        original = getattr(Collection, method)
+        if getattr(original, 'query_budget_instrumented', False):
+            return
+
+        @functools.wraps(original)
+        def wrapper(self, *args, **kwargs):
+            if _in_mongomock_call.get():
+                return original(self, *args, **kwargs)
+            record_command(command_name, _mongomock_command(self.name, command_name, field, args, kwargs))
+            token = _in_mongomock_call.set(True)
+            try:
+                return original(self, *args, **kwargs)
+            finally:
+                _in_mongomock_call.reset(token)
+
+        wrapper.query_budget_instrumented = True
+        setattr(Collection, method, wrapper)
+
+    for method, (command_name, field) in _MONGOMOCK_COMMANDS.items():
+        instrument(method, command_name, field)
+
+def init_app(app, mode: str = QUERY_BUDGET_MODE) -> None:
+    """Check every request against its route's budget (mode 'log' or 'raise')."""
+    if mode not in ('log', 'raise'):
+        return
+    from flask import g, jsonify, request
+
+    @app.before_request
+    def start_query_count():
+        g.query_counter = QueryCounter()
+        g.query_counter_token = _active.set(_active.get() + (g.query_counter,))
+
+    @app.after_request
+    def check_query_budget(response):
+        counter = g.get('query_counter')
+        view = app.view_functions.get(request.endpoint)
+        budget = budget_for(view, request.method) if view else None
+        if counter is None or budget is None or counter.total <= budget:
+            return response
+        error = QueryBudgetExceeded(counter, budget, f'{request.method} {request.endpoint}')
+        print('Query budget exceeded:', str(error))
+        if mode == 'raise':
+            # Replace the response so the overrun can't go unnoticed in development
+            response = jsonify({'error': str(error), 'budget': budget, 'queries': dict(counter.by_shape())})
+            response.status_code = 500
+        return response
+
+    @app.teardown_request
+    def stop_query_count(exc=None):
+        token = g.pop('query_counter_token', None)
+        if token is not None:
+            _active.reset(token)
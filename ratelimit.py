@@ -0,0 +1,266 @@
+"""Rate limiting shared by every gunicorn worker.
+
+RATELIMIT_STORAGE_URI picks where the counters live:
+
+    mmap:///path/to/file   - a shared-memory counter table for one host
+                             (gunicorn_config.py defaults to this when it runs several workers)
+    redis://host:6379/0    - Redis, shared by every host (defaults to REDIS_URL when set)
+    fakeredis://           - in-process stand-in for Redis in tests
+    memory://              - per-process counters (the Flask-Limiter default)
+
+Requests are keyed by the JWT identity when a valid token is sent and by
+remote address otherwise, so users behind one NAT don't share a budget.
+Routes add their own limits on top of RATE_LIMIT with @rate_limit.
+Only the fixed-window strategy is supported by the mmap storage.
+"""
+from typing import Optional
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+from flask import g, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from limits.storage import Storage
+from limits.storage.redis import RedisStorage
+
+from cache import LRUCache
+
+DEFAULT_RATE_LIMIT = os.getenv('RATE_LIMIT', '100 per minute')
+LOGIN_RATE_LIMIT = os.getenv('LOGIN_RATE_LIMIT', '10 per minute')
+REGISTER_RATE_LIMIT = os.getenv('REGISTER_RATE_LIMIT', '5 per minute')
+PAYMENT_RATE_LIMIT = os.getenv('PAYMENT_RATE_LIMIT', '30 per minute')
+BULK_RATE_LIMIT = os.getenv('BULK_RATE_LIMIT', '10 per minute')
+
+# Off switch for benchmarks and load tests
+RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
+
+RATELIMIT_MMAP_SLOTS = int(os.getenv('RATELIMIT_MMAP_SLOTS', 65536))
+RATELIMIT_TOKEN_CACHE_SIZE = int(os.getenv('RATELIMIT_TOKEN_CACHE_SIZE', 10000))
+
+def storage_uri() -> str:
+    if os.getenv('RATELIMIT_STORAGE_URI'):
+        return os.getenv('RATELIMIT_STORAGE_URI')
+    if os.getenv('REDIS_URL'):
+        return os.getenv('REDIS_URL')
+    return 'memory://'
+
+# Verified token -> identity. Decoding a JWT is most of the limiter's cost per
+# request; an entry only decides which budget a request counts against, the
+# view still verifies the token itself.
+_identities = LRUCache(RATELIMIT_TOKEN_CACHE_SIZE, 60)
+
+def identity_key() -> str:
+    """The JWT identity if the request carries a valid token, else the remote address."""
+    if 'rate_limit_key' in g:
+        return g.rate_limit_key
+    token = request.headers.get('Authorization', '')
+    cached = _identities.get('tokens', token) if token else None
+    identity = cached.decode('utf-8') if cached is not None else None
+    if identity is None and token:
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except Exception:
+            identity = None
+        if identity:
+            _identities.set('tokens', token, identity.encode('utf-8'))
+    g.rate_limit_key = f'user:{identity}' if identity else f'ip:{get_remote_address()}'
+    return g.rate_limit_key
+
+# Slot layout: key hash (unsigned 64 bit), count (signed 64 bit), expiry (double, epoch seconds)
+_SLOT = struct.Struct('=Qqd')
+# Keys hash to a bucket of this many slots; a bucket is locked as a unit
+_BUCKET_SLOTS = 8
+
+class MmapStorage(Storage):
+    """Fixed-window counters in a memory-mapped file shared by every process on the host.
+
+    The file is a hash table of fixed-size buckets; each bucket is guarded
+    by an fcntl byte-range lock, so workers contend only when their keys
+    share a bucket. When every slot of a bucket holds a live counter, the
+    one closest to expiry is evicted, so size RATELIMIT_MMAP_SLOTS well
+    above the number of keys active in one window.
+    """
+
+    STORAGE_SCHEME = ['mmap']
+
+    def __init__(self, uri: Optional[str] = None, slots: int = RATELIMIT_MMAP_SLOTS, **options):
+        super().__init__(uri, **options)
+        self.path = uri[len('mmap://'):] if uri else '/tmp/splitbill-ratelimit'
+        self.buckets = max(1, slots // _BUCKET_SLOTS)
+        self.size = self.buckets * _BUCKET_SLOTS * _SLOT.size
+        self._map = None
+        self._fd = None
+        self._pid = None
+        self._open_lock = threading.Lock()
+
+    def _open(self):
+        # Opened per process: an inherited mapping would be fine, but not the thread lock state
+        if self._map is not None and self._pid == os.getpid():
+            return self._map
+        with self._open_lock:
+            if self._map is None or self._pid != os.getpid():
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                fcntl.lockf(fd, fcntl.LOCK_EX)
+                try:
+                    if os.fstat(fd).st_size != self.size:
+                        os.ftruncate(fd, 0)
+                        os.ftruncate(fd, self.size)
+                finally:
+                    fcntl.lockf(fd, fcntl.LOCK_UN)
+                self._map = mmap.mmap(fd, self.size)
+                self._fd = fd
+                self._pid = os.getpid()
+        return self._map
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # Zero marks an empty slot
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+    def _bucket(self, key: str):
+        key_hash = self._hash(key)
+        offset = (key_hash % self.buckets) * _BUCKET_SLOTS * _SLOT.size
+        return key_hash, offset
+
+    def _find(self, table, key_hash: int, offset: int, now: float, create: bool):
+        """Return the slot offset for key_hash in the bucket, claiming one if `create`."""
+        free = None
+        oldest = None
+        for index in range(_BUCKET_SLOTS):
+            slot = offset + index * _SLOT.size
+            slot_hash, count, expiry = _SLOT.unpack_from(table, slot)
+            if slot_hash == key_hash:
+                if expiry > now:
+                    return slot
+                if not create:
+                    return None
+                _SLOT.pack_into(table, slot, key_hash, 0, 0.0)
+                return slot
+            if free is None and (slot_hash == 0 or expiry <= now):
+                free = slot
+            if oldest is None or expiry < oldest[1]:
+                oldest = (slot, expiry)
+        if not create:
+            return None
+        slot = free if free is not None else oldest[0]
+        _SLOT.pack_into(table, slot, key_hash, 0, 0.0)
+        return slot
+
+    def _with_bucket(self, key: str, fn):
+        table = self._open()
+        key_hash, offset = self._bucket(key)
+        length = _BUCKET_SLOTS * _SLOT.size
+        with self.lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, offset)
+            try:
+                return fn(table, key_hash, offset, time.time())
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset)
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1) -> int:
+        def increment(table, key_hash, offset, now):
+            slot = self._find(table, key_hash, offset, now, create=True)
+            _, count, expires_at = _SLOT.unpack_from(table, slot)
+            count += amount
+            if elastic_expiry or count == amount:
+                expires_at = now + expiry
+            _SLOT.pack_into(table, slot, key_hash, count, expires_at)
+            return count
+        return self._with_bucket(key, increment)
+
+    def get(self, key: str) -> int:
+        def read(table, key_hash, offset, now):
+            slot = self._find(table, key_hash, offset, now, create=False)
+            return _SLOT.unpack_from(table, slot)[1] if slot is not None else 0
+        return self._with_bucket(key, read)
+
+    def get_expiry(self, key: str) -> int:
+        def read(table, key_hash, offset, now):
+            slot = self._find(table, key_hash, offset, now, create=False)
+            return int(_SLOT.unpack_from(table, slot)[2]) if slot is not None else int(now)
+        return self._with_bucket(key, read)
+
+    def clear(self, key: str) -> None:
+        def remove(table, key_hash, offset, now):
+            slot = self._find(table, key_hash, offset, now, create=False)
+            if slot is not None:
+                _SLOT.pack_into(table, slot, 0, 0, 0.0)
+        self._with_bucket(key, remove)
+
+    def check(self) -> bool:
+        try:
+            self._open()
+            return True
+        except OSError:
+            return False
+
+    def reset(self) -> Optional[int]:
+        table = self._open()
+        with self.lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                live = sum(
+                    1 for slot in range(0, self.size, _SLOT.size)
+                    if _SLOT.unpack_from(table, slot)[0] and _SLOT.unpack_from(table, slot)[2] > now
+                )
+                table[:] = bytes(self.size)
+                return live
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+class FakeRedisStorage(RedisStorage):
+    """RedisStorage on an in-process fakeredis server, for tests without Redis.
+
+    fakeredis can't run Lua without `lupa`, so counters use the plain
+    INCRBY/EXPIRE path; only the fixed-window strategy works.
+    """
+
+    STORAGE_SCHEME = ['fakeredis']
+    DEPENDENCIES = {'fakeredis': None}
+
+    def __init__(self, uri: str, **options):
+        Storage.__init__(self, uri, **options)
+        import fakeredis
+        self.storage = fakeredis.FakeStrictRedis()
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1) -> int:
+        return self._incr(key, expiry, self.storage, elastic_expiry, amount)
+
+    def reset(self) -> Optional[int]:
+        keys = self.storage.keys('LIMITS*')
+        if keys:
+            self.storage.delete(*keys)
+        return len(keys)
+
+limiter = Limiter(
+    key_func=identity_key,
+    default_limits=[DEFAULT_RATE_LIMIT],
+    strategy='fixed-window',
+    # A storage outage shouldn't take the API down with it
+    swallow_errors=True,
+    in_memory_fallback_enabled=True
+)
+
+def rate_limit(limit: str):
+    """Add a per-route limit on top of the default one (applied by init_app)."""
+    def decorator(view):
+        view.rate_limit = limit
+        return view
+    return decorator
+
+def init_app(app) -> Limiter:
+    app.config.setdefault('RATELIMIT_STORAGE_URI', storage_uri())
+    app.config.setdefault('RATELIMIT_ENABLED', RATELIMIT_ENABLED)
+    limiter.init_app(app)
+    for endpoint, view in list(app.view_functions.items()):
+        if getattr(view, 'rate_limit', None):
+            app.view_functions[endpoint] = limiter.limit(view.rate_limit, override_defaults=False)(view)
+    return limiter
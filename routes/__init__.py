@@ -2,5 +2,7 @@
 
 from .auth import auth_bp
 from .bill import bill_bp
+from .ledger import ledger_bp
+from .settlement import settlement_bp
 
-__all__ = ['auth_bp', 'bill_bp'] 
\ No newline at end of file
+__all__ = ['auth_bp', 'bill_bp', 'ledger_bp', 'settlement_bp'] 
\ No newline at end of file
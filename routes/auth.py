@@ -1,13 +1,18 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required, unset_jwt_cookies
-import bcrypt
 from bson import ObjectId
 from database import get_db
 from datetime import datetime, timedelta
+from querybudget import query_budget
+from admission import admission_priority
+from ratelimit import LOGIN_RATE_LIMIT, REGISTER_RATE_LIMIT, rate_limit
+from security import PAYMENT_SESSION_TTL, create_payment_token, hash_password, check_password, needs_rehash
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/register', methods=['POST'])
+@rate_limit(REGISTER_RATE_LIMIT)
+@query_budget(2)
 def register():
     try:
         data = request.get_json()
@@ -33,8 +38,7 @@ def register():
             return jsonify({'error': 'Username already exists'}), 409
 
         # Hash the password
-        salt = bcrypt.gensalt()
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
+        hashed_password = hash_password(password)
 
         # Create new user
         user = {
@@ -55,6 +59,9 @@ def register():
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit(LOGIN_RATE_LIMIT)
+@query_budget(2)
+@admission_priority('critical')
 def login():
     try:
         data = request.get_json()
@@ -67,9 +74,16 @@ def login():
         db = get_db()
         user = db.users.find_one({'username': username})
 
-        if not user or not bcrypt.checkpw(password.encode('utf-8'), user['hashed_password']):
+        if not user or not check_password(password, user['hashed_password']):
             return jsonify({'error': 'Invalid username or password'}), 401
 
+        # Upgrade (or downgrade) the hash when the configured cost changed
+        if needs_rehash(user['hashed_password']):
+            db.users.update_one(
+                {'_id': user['_id']},
+                {'$set': {'hashed_password': hash_password(password), 'updated_at': datetime.utcnow()}}
+            )
+
         # Create access token with 24-hour expiration
         access_token = create_access_token(
             identity=str(user['_id']),
@@ -88,7 +102,36 @@ def login():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@auth_bp.route('/payment-session', methods=['POST'])
+@rate_limit(LOGIN_RATE_LIMIT)
+@query_budget(1)
+@admission_priority('critical')
+@jwt_required()
+def create_payment_session():
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        password = data.get('password')
+
+        if not password:
+            return jsonify({'error': 'Missing password'}), 400
+
+        db = get_db()
+        user = db.users.find_one({'_id': ObjectId(current_user_id)}, {'hashed_password': 1})
+
+        if not user or not check_password(password, user['hashed_password']):
+            return jsonify({'error': 'Invalid password'}), 401
+
+        return jsonify({
+            'payment_token': create_payment_token(current_user_id),
+            'expires_in': PAYMENT_SESSION_TTL
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @auth_bp.route('/logout', methods=['POST'])
+@query_budget(0)
 @jwt_required()
 def logout():
     try:
@@ -98,6 +141,7 @@ def logout():
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/profile', methods=['GET'])
+@query_budget(1)
 @jwt_required()
 def get_profile():
     try:
@@ -118,6 +162,7 @@ def get_profile():
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/balance', methods=['POST'])
+@query_budget(2)
 @jwt_required()
 def add_balance():
     try:
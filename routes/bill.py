@@ -1,15 +1,53 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.bill import Bill, Item, ItemSplit, Participant
-from models.user import User
+from models.bill import (
+    Bill, bill_etag, bill_list_etag, bill_user_ids, has_bill_access,
+    build_bill_document, create_bill_adapter, validation_errors
+)
+from models.user import User, clear_identity_map
+from models.ledger import Ledger, bill_edges, participant_edge
+from models.payment import PaymentError, pay_participant, pay_participants
 from bson import ObjectId
+from pydantic import ValidationError
+from werkzeug.http import http_date
 from datetime import datetime
 from database import get_db
-import bcrypt
+from cache import bill_list_cache
+from json_provider import dumps_bytes
+from security import has_payment_token, check_password
+from querybudget import query_budget
+from admission import admission_priority
+from ratelimit import BULK_RATE_LIMIT, PAYMENT_RATE_LIMIT, rate_limit
+import pubsub
+import csv
+import io
+import os
 
 bill_bp = Blueprint('bill', __name__)
 
+# @query_budget: MongoDB round trips each route may make (see querybudget.py).
+# Writes count their transaction commit; streamed routes only count the setup.
+# @admission_priority: which requests are shed first under overload (see admission.py).
+# @rate_limit: per-route limits on top of the default one (see ratelimit.py).
+
+BILLS_PAGE_DEFAULT = int(os.getenv('BILLS_PAGE_DEFAULT', 20))
+BILLS_PAGE_MAX = int(os.getenv('BILLS_PAGE_MAX', 100))
+PAY_BATCH_MAX = int(os.getenv('PAY_BATCH_MAX', 50))
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 200))
+EXPORT_FIELDS = [
+    'bill_name', 'total_amount', 'created_by', 'created_by_username', 'split_method',
+    'participants', 'items', 'tax', 'service_charge', 'created_at', 'updated_at'
+]
+EXPORT_CSV_COLUMNS = [
+    'bill_id', 'bill_name', 'created_at', 'created_by_username', 'split_method', 'total_amount',
+    'row_type', 'item_name', 'participant', 'quantity', 'price_per_unit', 'amount_due', 'status'
+]
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 500))
+IMPORT_CHUNK_MAX = int(os.getenv('IMPORT_CHUNK_MAX', 5000))
+
 @bill_bp.route('/', methods=['GET', 'POST', 'OPTIONS'])
+@query_budget(GET=3, POST=6)
+@admission_priority(GET='low', POST='normal')
 @jwt_required()
 def handle_bills():
     if request.method == 'OPTIONS':
@@ -19,14 +57,71 @@ def handle_bills():
     elif request.method == 'POST':
         return create_bill()
 
+@bill_bp.route('/events', methods=['GET', 'OPTIONS'])
+@query_budget(0)
+@admission_priority('exempt')
+@jwt_required(locations=['headers', 'query_string'])
+def handle_user_events():
+    if request.method == 'OPTIONS':
+        return '', 204
+    if not pubsub.SSE_ENABLED:
+        return streams_unavailable()
+    return event_stream([pubsub.user_topic(get_jwt_identity())])
+
+@bill_bp.route('/<bill_id>/events', methods=['GET', 'OPTIONS'])
+@query_budget(1)
+@admission_priority('exempt')
+@jwt_required(locations=['headers', 'query_string'])
+def handle_bill_events(bill_id):
+    if request.method == 'OPTIONS':
+        return '', 204
+    if not pubsub.SSE_ENABLED:
+        return streams_unavailable()
+    return get_bill_events(bill_id)
+
 @bill_bp.route('/<bill_id>', methods=['GET', 'OPTIONS'])
+@query_budget(2)
+@admission_priority('low')
 @jwt_required()
 def handle_bill(bill_id):
     if request.method == 'OPTIONS':
         return '', 204
     return get_bill(bill_id)
 
+@bill_bp.route('/export', methods=['GET', 'OPTIONS'])
+@rate_limit(BULK_RATE_LIMIT)
+@query_budget(1)
+@admission_priority('low')
+@jwt_required()
+def handle_bill_export():
+    if request.method == 'OPTIONS':
+        return '', 204
+    return export_bills()
+
+@bill_bp.route('/import', methods=['POST', 'OPTIONS'])
+@rate_limit(BULK_RATE_LIMIT)
+@query_budget(1)
+@admission_priority('low')
+@jwt_required()
+def handle_bill_import():
+    if request.method == 'OPTIONS':
+        return '', 204
+    return import_bills()
+
+@bill_bp.route('/pay-batch', methods=['POST', 'OPTIONS'])
+@rate_limit(PAYMENT_RATE_LIMIT)
+@query_budget(8)
+@admission_priority('critical')
+@jwt_required()
+def handle_batch_payment():
+    if request.method == 'OPTIONS':
+        return '', 204
+    return pay_bills_batch()
+
 @bill_bp.route('/<bill_id>/pay', methods=['POST', 'OPTIONS'])
+@rate_limit(PAYMENT_RATE_LIMIT)
+@query_budget(7)
+@admission_priority('critical')
 @jwt_required()
 def handle_bill_payment(bill_id):
     if request.method == 'OPTIONS':
@@ -34,6 +129,8 @@ def handle_bill_payment(bill_id):
     return pay_bill(bill_id)
 
 @bill_bp.route('/<bill_id>/participants/<int:participant_index>/pay', methods=['POST', 'OPTIONS'])
+@query_budget(5)
+@admission_priority('critical')
 @jwt_required()
 def handle_participant_payment(bill_id, participant_index):
     if request.method == 'OPTIONS':
@@ -43,6 +140,35 @@ def handle_participant_payment(bill_id, participant_index):
 def get_bills():
     try:
         current_user_id = get_jwt_identity()
+        
+        # The list only changes when bills_version is bumped, so a matching
+        # If-None-Match costs one indexed read and an empty response
+        etag = bill_list_etag(current_user_id, User.get_bills_version(current_user_id), request.args)
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+        
+        cached = bill_list_cache.get(current_user_id, etag)
+        if cached is not None:
+            response = current_app.response_class(cached, mimetype='application/json')
+            response.set_etag(etag)
+            return response, 200
+        
+        # Paginated listing: ?limit=&cursor=&view=summary
+        if any(arg in request.args for arg in ('limit', 'cursor', 'view')):
+            response, status = get_bills_page(current_user_id)
+        else:
+            response, status = get_all_bills(current_user_id)
+        if status == 200:
+            bill_list_cache.set(current_user_id, etag, response.get_data())
+            response.set_etag(etag)
+        return response, status
+        
+    except Exception as e:
+        print('Error getting bills:', str(e))
+        return jsonify({'error': str(e)}), 500
+
+def get_all_bills(current_user_id):
+    try:
         db = get_db()
         
         # Find bills where user is either creator or participant
@@ -53,180 +179,295 @@ def get_bills():
             ]
         }).sort([('created_at', -1)])  # Use list of tuples for sort
         
-        # Convert ObjectId to string for JSON serialization
-        bills_list = []
-        for bill in bills:
-            bill['_id'] = str(bill['_id'])
-            bills_list.append(bill)
-        
-        return jsonify(bills_list), 200
+        return jsonify(list(bills)), 200
         
     except Exception as e:
         print('Error getting bills:', str(e))
         return jsonify({'error': str(e)}), 500
 
+def not_modified(etag):
+    response = make_response('', 304)
+    response.set_etag(etag)
+    return response
+
+def get_bills_page(current_user_id):
+    try:
+        limit = int(request.args.get('limit', BILLS_PAGE_DEFAULT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit < 1 or limit > BILLS_PAGE_MAX:
+        return jsonify({'error': f'limit must be between 1 and {BILLS_PAGE_MAX}'}), 400
+    
+    view = request.args.get('view', 'full')
+    if view not in ('full', 'summary'):
+        return jsonify({'error': 'Invalid view. Must be either "full" or "summary"'}), 400
+    
+    try:
+        bills, next_cursor = Bill.find_page(
+            current_user_id,
+            limit,
+            cursor=request.args.get('cursor'),
+            summary=view == 'summary'
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'bills': bills, 'next_cursor': next_cursor}), 200
+
+def resolve_participant_users(bill_request):
+    """Look up every external_name in a create-bill request in one query."""
+    names = {participant.external_name for participant in bill_request.participants}
+    for item in bill_request.items:
+        names.update(split.external_name for split in item.split or [])
+    return User.find_by_usernames(names)
+
+def validation_error_body(error):
+    details = validation_errors(error)
+    first = details[0]
+    message = f"{first['field']}: {first['message']}" if first['field'] else first['message']
+    return {'error': message, 'details': details}
+
+def validation_error_response(error):
+    return jsonify(validation_error_body(error)), 400
+
 def create_bill():
     current_user_id = get_jwt_identity()
-    data = request.get_json()
     
     try:
-        # Validate required fields
-        required_fields = ['bill_name', 'split_method', 'participants', 'items']
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({'error': f'Missing required field: {field}'}), 400
-        
-        if data['split_method'] not in ['equal', 'per_product']:
-            return jsonify({'error': 'Invalid split method. Must be either "equal" or "per_product"'}), 400
+        # Validate the whole payload in one pass
+        try:
+            bill_request = create_bill_adapter.validate_python(request.get_json(silent=True))
+        except ValidationError as e:
+            return validation_error_response(e)
         
         # Get creator's username
         creator = User.find_by_id(current_user_id)
         if not creator:
             return jsonify({'error': 'Creator not found'}), 404
         
-        # Calculate total from items
-        total_amount = sum(
-            item.get('price_per_unit', 0) * item.get('quantity', 0)
-            for item in data.get('items', [])
-        )
+        # Resolve all registered users referenced by the bill up front
+        users_by_name = resolve_participant_users(bill_request)
         
-        # Validate items
-        items = []
-        for item in data.get('items', []):
-            if not all(k in item for k in ['name', 'price_per_unit', 'quantity']):
-                return jsonify({'error': 'Each item must have name, price_per_unit, and quantity'}), 400
-            
-            if item['price_per_unit'] <= 0 or item['quantity'] <= 0:
-                return jsonify({'error': 'Price and quantity must be greater than 0'}), 400
-            
-            item_data = {
-                'name': item['name'].strip(),
-                'price_per_unit': float(item['price_per_unit']),
-                'quantity': int(item['quantity']),
-                'split': None
-            }
-            
-            # Handle per-product split
-            if data['split_method'] == 'per_product' and 'split' in item:
-                total_split_quantity = sum(split.get('quantity', 0) for split in item['split'])
-                if total_split_quantity != item['quantity']:
-                    return jsonify({
-                        'error': f'Split quantities for item "{item["name"]}" must sum up to the total quantity ({item["quantity"]})'
-                    }), 400
-                
-                item_splits = []
-                for split in item['split']:
-                    if not split.get('external_name') or split.get('quantity', 0) <= 0:
-                        return jsonify({'error': 'Invalid split data'}), 400
-                    
-                    # Try to find user by username
-                    user = User.find_by_username(split['external_name'])
-                    split_data = {
-                        'external_name': split['external_name'],
-                        'quantity': int(split['quantity'])
-                    }
-                    if user:
-                        split_data.update({
-                            'user_id': str(user['_id']),
-                            'username': user['username']
-                        })
-                    item_splits.append(ItemSplit(**split_data))
-                item_data['split'] = item_splits
-            
-            items.append(Item(**item_data))
+        bill = build_bill_document(bill_request, creator, users_by_name)
         
-        # Process participants and calculate amounts
-        participants = []
-        if data['split_method'] == 'equal':
-            amount_per_person = total_amount / len(data['participants'])
-            
-            for participant in data['participants']:
-                if not participant.get('external_name'):
-                    return jsonify({'error': 'Each participant must have an external_name'}), 400
-                
-                # Try to find user by username
-                user = User.find_by_username(participant['external_name'])
-                
-                participant_data = {
-                    'external_name': participant['external_name'],
-                    'amount_due': round(amount_per_person, 2),
-                    'status': 'unpaid'  # Default status
-                }
-                
-                if user:
-                    participant_data.update({
-                        'user_id': str(user['_id']),
-                        'username': user['username']
-                    })
-                    # If this participant is the bill creator, mark as paid
-                    if str(user['_id']) == current_user_id:
-                        participant_data['status'] = 'paid'
-                
-                participants.append(Participant(**participant_data))
-        else:  # per_product split
-            # Calculate amount per participant based on their item splits
-            participant_amounts = {}
-            for item in items:
-                if not item.split:
-                    continue
-                price_per_unit = item.price_per_unit
-                for split in item.split:
-                    external_name = split.external_name
-                    if external_name not in participant_amounts:
-                        participant_amounts[external_name] = 0
-                    participant_amounts[external_name] += price_per_unit * split.quantity
-            
-            # Create participants list with calculated amounts
-            for participant in data['participants']:
-                external_name = participant['external_name']
-                # Initialize amount to 0 if participant has no items
-                amount = participant_amounts.get(external_name, 0)
-                
-                # Try to find user by username
-                user = User.find_by_username(external_name)
-                
-                participant_data = {
-                    'external_name': external_name,
-                    'amount_due': round(amount, 2),
-                    'status': 'unpaid'  # Default status
-                }
-                
-                if user:
-                    participant_data.update({
-                        'user_id': str(user['_id']),
-                        'username': user['username']
-                    })
-                    # If this participant is the bill creator, mark as paid
-                    if str(user['_id']) == current_user_id:
-                        participant_data['status'] = 'paid'
-                
-                participants.append(Participant(**participant_data))
-        
-        # Create and save the bill
-        bill = Bill(
-            bill_name=data['bill_name'].strip(),
-            total_amount=total_amount,
-            created_by=current_user_id,
-            created_by_username=creator['username'],
-            split_method=data['split_method'],
-            participants=participants,
-            items=items
-        )
+        # Record the bill's debts in the ledger atomically with the insert
+        def insert_bill(session):
+            Bill.insert(bill, session=session)
+            Ledger.apply(bill_edges(bill), session=session)
+        
+        with get_db().client.start_session() as session:
+            session.with_transaction(insert_bill)
         
-        if not bill.save():
-            return jsonify({'error': 'Failed to save bill'}), 500
+        affected_user_ids = bill_user_ids(bill)
+        User.bump_bills_version(affected_user_ids)
+        bill_list_cache.invalidate(affected_user_ids)
+        pubsub.publish('bill.created', str(bill['_id']), affected_user_ids, {
+            'bill_name': bill['bill_name'],
+            'total_amount': bill['total_amount'],
+            'created_by': bill['created_by']
+        })
             
-        return jsonify(bill.to_dict()), 201
+        return jsonify(bill), 201
         
     except Exception as e:
         print('Error creating bill:', str(e))  # Add logging
         return jsonify({'error': str(e)}), 500
 
+def csv_safe(value):
+    """Stop spreadsheet apps from evaluating user-provided text as a formula."""
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+def bill_csv_rows(bill):
+    """Flatten one bill into CSV rows: one per participant, item and item split."""
+    header = [
+        str(bill['_id']),
+        csv_safe(bill['bill_name']),
+        http_date(bill['created_at']),  # same format as created_at in the JSON responses
+        csv_safe(bill['created_by_username']),
+        bill['split_method'],
+        bill['total_amount']
+    ]
+    for participant in bill.get('participants', []):
+        yield header + ['participant', '', csv_safe(participant['external_name']), '', '',
+                        participant['amount_due'], participant['status']]
+    for item in bill.get('items', []):
+        yield header + ['item', csv_safe(item['name']), '', item['quantity'], item['price_per_unit'], '', '']
+        for split in item.get('split') or []:
+            yield header + ['item_split', csv_safe(item['name']), csv_safe(split['external_name']),
+                            split['quantity'], item['price_per_unit'], '', '']
+
+def export_bills():
+    current_user_id = get_jwt_identity()
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'Invalid format. Must be either "ndjson" or "csv"'}), 400
+    
+    # Server-side cursor: only one batch of bills is in memory at a time
+    cursor = get_db().bills.find(
+        {
+            '$or': [
+                {'created_by': current_user_id},
+                {'participants.user_id': current_user_id}
+            ]
+        },
+        {field: 1 for field in EXPORT_FIELDS},
+        batch_size=EXPORT_BATCH_SIZE
+    ).sort([('created_at', -1), ('_id', -1)])
+    
+    def generate_ndjson():
+        with cursor:
+            for bill in cursor:
+                yield dumps_bytes(bill) + b'\n'
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_CSV_COLUMNS)
+        with cursor:
+            for bill in cursor:
+                writer.writerows(bill_csv_rows(bill))
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    if export_format == 'csv':
+        body, mimetype = generate_csv(), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(), 'application/x-ndjson'
+    
+    response = current_app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=bills.{export_format}'
+    return response
+
+def import_bills():
+    current_user_id = get_jwt_identity()
+    
+    try:
+        chunk_size = int(request.args.get('chunk_size', IMPORT_CHUNK_SIZE))
+    except ValueError:
+        return jsonify({'error': 'chunk_size must be an integer'}), 400
+    if chunk_size < 1 or chunk_size > IMPORT_CHUNK_MAX:
+        return jsonify({'error': f'chunk_size must be between 1 and {IMPORT_CHUNK_MAX}'}), 400
+    
+    creator = User.find_by_id(current_user_id)
+    if not creator:
+        return jsonify({'error': 'Creator not found'}), 404
+    
+    # Read the body line by line and answer with one NDJSON result per line,
+    # so neither the upload nor the report is ever held in memory
+    def generate():
+        summary = {'created': 0, 'failed': 0}
+        chunk = []
+        
+        def flush():
+            for result in insert_import_chunk(chunk, creator):
+                summary['created' if result['status'] == 'created' else 'failed'] += 1
+                yield dumps_bytes(result) + b'\n'
+            chunk.clear()
+        
+        for line_number, line in enumerate(request.stream, 1):
+            if not line.strip():
+                continue
+            try:
+                chunk.append((line_number, create_bill_adapter.validate_json(line)))
+            except ValidationError as e:
+                summary['failed'] += 1
+                yield dumps_bytes({'line': line_number, 'status': 'error', **validation_error_body(e)}) + b'\n'
+            if len(chunk) >= chunk_size:
+                yield from flush()
+        if chunk:
+            yield from flush()
+        yield dumps_bytes({'summary': summary}) + b'\n'
+    
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def insert_import_chunk(chunk, creator):
+    """Insert one chunk of validated import lines and their ledger debts in one transaction.
+
+    Returns a result per line; a chunk is created or fails as a whole.
+    Usernames are resolved for the whole chunk at once.
+    """
+    try:
+        clear_identity_map()
+        names = set()
+        for _, bill_request in chunk:
+            names.update(p.external_name for p in bill_request.participants)
+        users_by_name = User.find_by_usernames(names)
+        
+        documents = [build_bill_document(bill_request, creator, users_by_name) for _, bill_request in chunk]
+        edges = [edge for document in documents for edge in bill_edges(document)]
+        
+        def insert_chunk(session):
+            get_db().bills.insert_many(documents, session=session)
+            Ledger.apply(edges, session=session)
+        
+        with get_db().client.start_session() as session:
+            session.with_transaction(insert_chunk)
+    
+    except Exception as e:
+        print('Error importing bills:', str(e))
+        return [{'line': line_number, 'status': 'error', 'error': str(e)} for line_number, _ in chunk]
+    
+    # The bills are committed; a failure from here on only delays cache refreshes
+    try:
+        affected_user_ids = {user_id for document in documents for user_id in bill_user_ids(document)}
+        User.bump_bills_version(affected_user_ids)
+        bill_list_cache.invalidate(affected_user_ids)
+    except Exception as e:
+        print('Error refreshing bill lists after import:', str(e))
+    return [
+        {'line': line_number, 'status': 'created', '_id': document['_id']}
+        for (line_number, _), document in zip(chunk, documents)
+    ]
+
+def authorize_payment(db, user_id, password):
+    """A payment is authorized by a payment-session token or by the password."""
+    if has_payment_token(user_id):
+        return True
+    if not password:
+        return False
+    user = db.users.find_one({'_id': ObjectId(user_id)}, {'hashed_password': 1})
+    return bool(user) and check_password(password, user['hashed_password'])
+
+def streams_unavailable():
+    # Not a shed: this worker class never serves streams, so there is nothing to retry
+    return jsonify({'error': 'Live updates are not available on this server'}), 503
+
+def event_stream(topics):
+    """Stream bill events as SSE; EventSource resends the last id as Last-Event-ID."""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = current_app.response_class(pubsub.stream(topics, last_event_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let a proxy buffer the stream
+    return response
+
+def get_bill_events(bill_id):
+    try:
+        if not ObjectId.is_valid(bill_id):
+            return jsonify({'error': 'Invalid bill ID format'}), 400
+        
+        header = get_db().bills.find_one({'_id': ObjectId(bill_id)}, {'created_by': 1, 'participants.user_id': 1})
+        if not header:
+            return jsonify({'error': 'Bill not found'}), 404
+        if not has_bill_access(header, get_jwt_identity()):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        return event_stream([pubsub.bill_topic(bill_id)])
+    
+    except Exception as e:
+        print('Error opening bill events:', str(e))
+        return jsonify({'error': str(e)}), 500
+
 @bill_bp.route('/<bill_id>/pay', methods=['POST'])
 @jwt_required()
 def pay_bill(bill_id):
     current_user_id = get_jwt_identity()
-    data = request.get_json()
+    # A payment token replaces the password, so the body may be empty
+    data = request.get_json(silent=True) or {}
     
     try:
         if not ObjectId.is_valid(bill_id):
@@ -234,86 +475,79 @@ def pay_bill(bill_id):
 
         db = get_db()
         
-        # Start a session for transaction
+        # Authorize before opening the transaction so hashing doesn't hold it open
+        if not authorize_payment(db, current_user_id, data.get('password', '')):
+            return jsonify({'error': 'Invalid password'}), 401
+        
+        # with_transaction retries on TransientTransactionError (e.g. write
+        # conflicts with concurrent payers) and UnknownTransactionCommitResult
         with db.client.start_session() as session:
-            with session.start_transaction():
-                # Find the bill
-                bill = db.bills.find_one({'_id': ObjectId(bill_id)})
-                if not bill:
-                    return jsonify({'error': 'Bill not found'}), 404
-                
-                # Find the current user's participant entry
-                participant = None
-                participant_index = None
-                for i, p in enumerate(bill['participants']):
-                    if p.get('user_id') == current_user_id:
-                        participant = p
-                        participant_index = i
-                        break
-                
-                if not participant:
-                    return jsonify({'error': 'User is not a participant in this bill'}), 403
-                
-                if participant['status'] == 'paid':
-                    return jsonify({'error': 'Already paid'}), 400
-                
-                # Get user and verify password
-                user = db.users.find_one({'_id': ObjectId(current_user_id)})
-                if not user or not bcrypt.checkpw(data.get('password', '').encode('utf-8'), user['hashed_password']):
-                    return jsonify({'error': 'Invalid password'}), 401
-                
-                amount_due = float(participant['amount_due'])
-                current_balance = float(user['balance'])
-                
-                # Verify amount matches what user owes
-                if current_balance < amount_due:
-                    return jsonify({
-                        'error': 'Insufficient balance',
-                        'amount_due': amount_due,
-                        'current_balance': current_balance
-                    }), 400
-                
-                # Update user's balance
-                result = db.users.update_one(
-                    {'_id': ObjectId(current_user_id)},
-                    {'$inc': {'balance': -amount_due}},
-                    session=session
-                )
-                
-                if result.modified_count == 0:
-                    raise Exception('Failed to update user balance')
-                
-                # Mark participant as paid
-                result = db.bills.update_one(
-                    {'_id': ObjectId(bill_id)},
-                    {
-                        '$set': {
-                            f'participants.{participant_index}.status': 'paid',
-                            'updated_at': datetime.utcnow()
-                        }
-                    },
-                    session=session
-                )
-                
-                if result.modified_count == 0:
-                    raise Exception('Failed to update bill status')
-                
-                # Get updated user data
-                updated_user = db.users.find_one(
-                    {'_id': ObjectId(current_user_id)},
-                    session=session
-                )
-                
-                return jsonify({
-                    'message': 'Payment successful',
-                    'new_balance': updated_user['balance'],
-                    'amount_paid': amount_due
-                }), 200
+            result = session.with_transaction(
+                lambda s: pay_participant(db, s, bill_id, current_user_id)
+            )
+        bill_list_cache.invalidate(result['affected_user_ids'])
+        pubsub.publish('participant.paid', bill_id, result['affected_user_ids'], {
+            'user_id': current_user_id,
+            'amount_paid': result['amount_paid']
+        })
+        
+        return jsonify({
+            'message': 'Payment successful',
+            'new_balance': result['new_balance'],
+            'amount_paid': result['amount_paid']
+        }), 200
         
+    except PaymentError as e:
+        return jsonify(e.to_dict()), e.status_code
     except Exception as e:
         print('Error processing payment:', str(e))  # Add logging
         return jsonify({'error': str(e)}), 500
 
+def pay_bills_batch():
+    current_user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    
+    try:
+        bill_ids = data.get('bill_ids')
+        if not isinstance(bill_ids, list) or not bill_ids or not all(isinstance(b, str) for b in bill_ids):
+            return jsonify({'error': 'bill_ids must be a non-empty list of bill IDs'}), 400
+        
+        # Drop duplicates, keeping the order the client sent
+        bill_ids = list(dict.fromkeys(bill_ids))
+        if len(bill_ids) > PAY_BATCH_MAX:
+            return jsonify({'error': f'At most {PAY_BATCH_MAX} bills can be paid at once'}), 400
+        
+        db = get_db()
+        
+        # One authorization check for the whole batch
+        if not authorize_payment(db, current_user_id, data.get('password', '')):
+            return jsonify({'error': 'Invalid password'}), 401
+        
+        with db.client.start_session() as session:
+            result = session.with_transaction(
+                lambda s: pay_participants(db, s, bill_ids, current_user_id)
+            )
+        bill_list_cache.invalidate(result['affected_user_ids'])
+        for paid in result['results']:
+            if paid['status'] == 'paid':
+                pubsub.publish('participant.paid', paid['bill_id'], result['user_ids_by_bill'][paid['bill_id']], {
+                    'user_id': current_user_id,
+                    'amount_paid': paid['amount_paid']
+                })
+        
+        return jsonify({
+            'message': 'Payment successful',
+            'results': result['results'],
+            'total_paid': result['total_paid'],
+            'new_balance': result['new_balance']
+        }), 200
+        
+    except PaymentError as e:
+        return jsonify(e.to_dict()), e.status_code
+    except Exception as e:
+        print('Error processing batch payment:', str(e))
+        return jsonify({'error': str(e)}), 500
+
 @bill_bp.route('/<bill_id>', methods=['GET'])
 @jwt_required()
 def get_bill(bill_id):
@@ -321,21 +555,29 @@ def get_bill(bill_id):
         current_user = get_jwt_identity()
         db = get_db()
         
+        # Conditional GET: compare against the version fields only
+        if request.if_none_match:
+            header = db.bills.find_one(
+                {'_id': ObjectId(bill_id)},
+                {'version': 1, 'updated_at': 1, 'created_by': 1, 'participants.user_id': 1}
+            )
+            if header and has_bill_access(header, current_user):
+                etag = bill_etag(header)
+                if request.if_none_match.contains(etag):
+                    return not_modified(etag)
+        
         # Find the bill
         bill = db.bills.find_one({'_id': ObjectId(bill_id)})
         if not bill:
             return jsonify({'error': 'Bill not found'}), 404
             
         # Check if user has access to this bill
-        if bill['created_by'] != current_user and not any(
-            p.get('user_id') == current_user for p in bill['participants']
-        ):
+        if not has_bill_access(bill, current_user):
             return jsonify({'error': 'Access denied'}), 403
             
-        # Convert ObjectId to string
-        bill['_id'] = str(bill['_id'])
-        
-        return jsonify(bill), 200
+        response = jsonify(bill)
+        response.set_etag(bill_etag(bill))
+        return response, 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -370,22 +612,37 @@ def mark_participant_as_paid(bill_id, participant_index):
         if participant['status'] == 'paid':
             return jsonify({'error': 'Participant already marked as paid'}), 400
             
-        # Update participant status to paid
-        result = db.bills.update_one(
-            {'_id': ObjectId(bill_id)},
-            {
-                '$set': {
-                    f'participants.{participant_index}.status': 'paid',
-                    'updated_at': datetime.utcnow()
-                }
-            }
-        )
+        # Update participant status to paid, settling the ledger in the same transaction
+        def mark_paid(session):
+            result = db.bills.update_one(
+                {
+                    '_id': ObjectId(bill_id),
+                    f'participants.{participant_index}.status': 'unpaid'
+                },
+                {
+                    '$set': {
+                        f'participants.{participant_index}.status': 'paid',
+                        'updated_at': datetime.utcnow()
+                    },
+                    '$inc': {'version': 1}
+                },
+                session=session
+            )
+            if result.modified_count == 0:
+                raise Exception('Failed to update participant status')
+            Ledger.apply([participant_edge(bill, participant)], -1, session=session)
         
-        if result.modified_count == 0:
-            raise Exception('Failed to update participant status')
+        with db.client.start_session() as session:
+            session.with_transaction(mark_paid)
         
-        # Get updated bill
-        updated_bill = db.bills.find_one({'_id': ObjectId(bill_id)})
+        affected_user_ids = bill_user_ids(bill)
+        User.bump_bills_version(affected_user_ids)
+        bill_list_cache.invalidate(affected_user_ids)
+        pubsub.publish('participant.paid', bill_id, affected_user_ids, {
+            'participant_index': participant_index,
+            'participant_name': participant['external_name'],
+            'amount_paid': participant['amount_due']
+        })
         
         return jsonify({
             'message': 'Participant marked as paid successfully',
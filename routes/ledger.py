@@ -0,0 +1,18 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models.ledger import Ledger
+from querybudget import query_budget
+
+ledger_bp = Blueprint('ledger', __name__)
+
+@ledger_bp.route('/', methods=['GET', 'OPTIONS'])
+@query_budget(1)
+@jwt_required()
+def get_ledger():
+    if request.method == 'OPTIONS':
+        return '', 204
+    try:
+        return jsonify(Ledger.find(get_jwt_identity())), 200
+    except Exception as e:
+        print('Error getting ledger:', str(e))
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,91 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from bson import ObjectId
+from cache import settlement_cache
+from database import get_db
+from querybudget import query_budget
+from json_provider import dumps_bytes
+from models.bill import bill_etag, has_bill_access
+from models.ledger import bill_edges, decode_counterparty_key
+from settlements import minimize_transfers, net_balances
+from splitting import from_minor
+import hashlib
+import os
+
+settlement_bp = Blueprint('settlement', __name__)
+
+SETTLEMENT_MAX_BILLS = int(os.getenv('SETTLEMENT_MAX_BILLS', 200))
+
+@settlement_bp.route('/', methods=['GET', 'OPTIONS'])
+@query_budget(2)
+@jwt_required()
+def get_settlements():
+    if request.method == 'OPTIONS':
+        return '', 204
+    try:
+        current_user_id = get_jwt_identity()
+        bill_ids = list(dict.fromkeys(b for b in request.args.get('bills', '').split(',') if b))
+        if not bill_ids:
+            return jsonify({'error': 'bills must be a comma-separated list of bill IDs'}), 400
+        if len(bill_ids) > SETTLEMENT_MAX_BILLS:
+            return jsonify({'error': f'At most {SETTLEMENT_MAX_BILLS} bills can be settled at once'}), 400
+        if not all(ObjectId.is_valid(bill_id) for bill_id in bill_ids):
+            return jsonify({'error': 'Invalid bill ID format'}), 400
+
+        db = get_db()
+        object_ids = [ObjectId(bill_id) for bill_id in bill_ids]
+
+        # Versions and access fields only; the plan is cached per list of bill versions
+        headers = list(db.bills.find(
+            {'_id': {'$in': object_ids}},
+            {'version': 1, 'updated_at': 1, 'created_by': 1, 'participants.user_id': 1}
+        ))
+        if len(headers) != len(bill_ids):
+            found = {str(header['_id']) for header in headers}
+            return jsonify({'error': 'Bill not found', 'bill_ids': [b for b in bill_ids if b not in found]}), 404
+        if not all(has_bill_access(header, current_user_id) for header in headers):
+            return jsonify({'error': 'Access denied'}), 403
+
+        # In request order: the body echoes the bill ids as they were asked for
+        etags = {str(header['_id']): bill_etag(header) for header in headers}
+        cache_key = hashlib.sha1(','.join(etags[bill_id] for bill_id in bill_ids).encode('utf-8')).hexdigest()
+        body = settlement_cache.get('settlements', cache_key)
+        if body is None:
+            bills = db.bills.find(
+                {'_id': {'$in': object_ids}},
+                {'created_by': 1, 'created_by_username': 1, 'participants': 1}
+            )
+            body = dumps_bytes(settlement_plan(bill_ids, bills))
+            settlement_cache.set('settlements', cache_key, body)
+
+        return current_app.response_class(body, mimetype='application/json'), 200
+
+    except Exception as e:
+        print('Error computing settlements:', str(e))
+        return jsonify({'error': str(e)}), 500
+
+def settlement_plan(bill_ids, bills):
+    """Net every unpaid share across the bills and compute the transfers that settle them."""
+    names = {}
+    debts = []
+    for bill in bills:
+        for debtor_key, _, debtor_name, creditor_id, creditor_name, amount in bill_edges(bill):
+            names[debtor_key] = debtor_name
+            names[creditor_id] = creditor_name
+            debts.append((debtor_key, creditor_id, amount))
+
+    def person(key):
+        return {**decode_counterparty_key(key), 'name': names.get(key)}
+
+    balances = net_balances(debts)
+    return {
+        'bills': bill_ids,
+        'balances': [
+            {**person(key), 'balance': from_minor(balance)}
+            for key, balance in sorted(balances.items(), key=lambda entry: entry[1])
+        ],
+        'transfers': [
+            {'from': person(debtor), 'to': person(creditor), 'amount': from_minor(amount)}
+            for debtor, creditor, amount in minimize_transfers(balances)
+        ]
+    }
@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from flask import request
+from flask_jwt_extended import create_access_token, decode_token
+import bcrypt
+import metrics
+import os
+import threading
+import time
+
+# bcrypt releases the GIL, so hashing on a small pool of real threads lets a
+# threaded/cooperative worker keep serving other requests meanwhile.
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+BCRYPT_POOL_SIZE = int(os.getenv('BCRYPT_POOL_SIZE', 2))
+BCRYPT_TIMEOUT = float(os.getenv('BCRYPT_TIMEOUT', 10))
+
+_bcrypt_pool = None
+_bcrypt_pool_lock = threading.Lock()
+_bcrypt_stats = {}
+_bcrypt_stats_lock = threading.Lock()
+
+# Step-up payment authorization: a short-lived token carrying this scope
+# authorizes payments without re-checking the password.
+PAYMENT_SCOPE = 'payment'
+PAYMENT_TOKEN_HEADER = 'X-Payment-Token'
+PAYMENT_SESSION_TTL = int(os.getenv('PAYMENT_SESSION_TTL', 300))  # 5 minutes
+
+def create_payment_token(user_id: str) -> str:
+    return create_access_token(
+        identity=user_id,
+        additional_claims={'scope': PAYMENT_SCOPE},
+        expires_delta=timedelta(seconds=PAYMENT_SESSION_TTL)
+    )
+
+def has_payment_token(user_id: str) -> bool:
+    """True if the request carries a valid, unexpired payment token for user_id."""
+    token = request.headers.get(PAYMENT_TOKEN_HEADER)
+    if not token:
+        return False
+    try:
+        claims = decode_token(token)
+    except Exception:
+        return False
+    return claims.get('scope') == PAYMENT_SCOPE and claims.get('sub') == user_id
+
+def _get_bcrypt_pool() -> ThreadPoolExecutor:
+    global _bcrypt_pool
+    if _bcrypt_pool is None:
+        with _bcrypt_pool_lock:
+            if _bcrypt_pool is None:
+                _bcrypt_pool = ThreadPoolExecutor(
+                    max_workers=BCRYPT_POOL_SIZE,
+                    thread_name_prefix='bcrypt'
+                )
+    return _bcrypt_pool
+
+def _gevent_threadpool():
+    """gevent's native thread pool when threading is monkey-patched, else None."""
+    try:
+        from gevent import monkey, get_hub
+    except ImportError:
+        return None
+    if not monkey.is_module_patched('threading'):
+        return None
+    return get_hub().threadpool
+
+def _record_bcrypt_timing(operation: str, seconds: float) -> None:
+    metrics.BCRYPT_LATENCY.labels(operation).observe(seconds)
+    with _bcrypt_stats_lock:
+        stats = _bcrypt_stats.setdefault(operation, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+        stats['count'] += 1
+        stats['total_seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+def _run_bcrypt(operation: str, fn, *args):
+    start = time.perf_counter()
+    try:
+        threadpool = _gevent_threadpool()
+        if threadpool is not None:
+            return threadpool.spawn(fn, *args).get(timeout=BCRYPT_TIMEOUT)
+        return _get_bcrypt_pool().submit(fn, *args).result(timeout=BCRYPT_TIMEOUT)
+    finally:
+        _record_bcrypt_timing(operation, time.perf_counter() - start)
+
+def hash_password(password: str) -> bytes:
+    return _run_bcrypt('hash', bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS))
+
+def check_password(password: str, hashed_password: bytes) -> bool:
+    if not password or not hashed_password:
+        return False
+    return _run_bcrypt('check', bcrypt.checkpw, password.encode('utf-8'), hashed_password)
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """True if the hash was made with a different cost than BCRYPT_ROUNDS."""
+    try:
+        return int(hashed_password.split(b'$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def get_bcrypt_stats() -> dict:
+    """Per-operation counts and timings since the worker started."""
+    with _bcrypt_stats_lock:
+        return {
+            operation: {
+                **stats,
+                'mean_seconds': stats['total_seconds'] / stats['count'] if stats['count'] else 0.0
+            }
+            for operation, stats in _bcrypt_stats.items()
+        }
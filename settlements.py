@@ -0,0 +1,55 @@
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Tuple
+import heapq
+
+# A debt: (debtor, creditor, amount in minor units)
+Debt = Tuple[Hashable, Hashable, int]
+
+def net_balances(debts: Iterable[Debt]) -> Dict[Hashable, int]:
+    """Net position per person: positive if they are owed money, negative if they owe."""
+    balances = defaultdict(int)
+    for debtor, creditor, amount in debts:
+        if debtor == creditor or not amount:
+            continue
+        balances[debtor] -= amount
+        balances[creditor] += amount
+    return {person: balance for person, balance in balances.items() if balance}
+
+def minimize_transfers(balances: Dict[Hashable, int]) -> List[Debt]:
+    """A small set of transfers that settles every balance.
+
+    People whose debt exactly matches someone's credit are paired first,
+    then the largest debtor pays the largest creditor until one of them is
+    settled (greedy, with two heaps). This uses at most n - 1 transfers and
+    runs in O(n log n), which keeps groups of thousands in milliseconds.
+    """
+    transfers = []
+    remaining = dict(balances)
+
+    # Exact matches settle two people with one transfer
+    creditors_by_amount = defaultdict(list)
+    for person, balance in remaining.items():
+        if balance > 0:
+            creditors_by_amount[balance].append(person)
+    for person, balance in list(remaining.items()):
+        if balance < 0 and creditors_by_amount.get(-balance):
+            creditor = creditors_by_amount[-balance].pop()
+            transfers.append((person, creditor, -balance))
+            del remaining[person]
+            del remaining[creditor]
+
+    # Heap entries carry an insertion counter so people are never compared
+    creditors = [(-balance, i, person) for i, (person, balance) in enumerate(remaining.items()) if balance > 0]
+    debtors = [(balance, i, person) for i, (person, balance) in enumerate(remaining.items()) if balance < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+    while creditors and debtors:
+        credit, credit_order, creditor = heapq.heappop(creditors)
+        debt, debt_order, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor, creditor, amount))
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, credit_order, creditor))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debt_order, debtor))
+    return transfers
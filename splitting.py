@@ -0,0 +1,137 @@
+from decimal import Decimal, ROUND_HALF_UP
+from fractions import Fraction
+from math import lcm
+from typing import List, Optional, Sequence, Union
+import os
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only used for large bills
+    np = None
+
+# All split math is done in integer minor units (e.g. cents) so shares
+# always add up to the bill total exactly.
+CURRENCY_MINOR_UNITS = int(os.getenv('CURRENCY_MINOR_UNITS', 2))
+MINOR_PER_MAJOR = 10 ** CURRENCY_MINOR_UNITS
+
+# Use the NumPy allocation path from this many participants on
+NUMPY_THRESHOLD = int(os.getenv('SPLIT_NUMPY_THRESHOLD', 256))
+_INT64_SAFE = 2 ** 62
+_FLOAT64_EXACT = 2 ** 53
+
+Weight = Union[int, float, Fraction]
+
+def to_minor(amount: Union[int, float, Decimal]) -> int:
+    """Convert an amount in major units (as stored and sent by clients) to minor units."""
+    if isinstance(amount, int):
+        return amount * MINOR_PER_MAJOR
+    scaled = amount * MINOR_PER_MAJOR
+    nearest = round(scaled)
+    if abs(scaled - nearest) < 1e-6:
+        return int(nearest)
+    # More precision than the currency has: round half up on the decimal value
+    value = Decimal(str(amount)) * MINOR_PER_MAJOR
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def to_minor_many(amounts: Sequence[Union[int, float, Decimal]]) -> List[int]:
+    """to_minor over a whole list, vectorized with NumPy for large inputs.
+
+    Values that are not within 1e-6 of a whole number of minor units (or too
+    large for float64 to hold exactly) go through to_minor one by one, so
+    the result is always the same as calling to_minor on each amount.
+    """
+    if np is None or len(amounts) < NUMPY_THRESHOLD:
+        return [to_minor(amount) for amount in amounts]
+    scaled = np.fromiter(amounts, dtype=np.float64, count=len(amounts)) * MINOR_PER_MAJOR
+    nearest = np.rint(scaled)
+    exact = (np.abs(scaled - nearest) < 1e-6) & (np.abs(nearest) < _FLOAT64_EXACT)
+    result = np.where(exact, nearest, 0).astype(np.int64).tolist()
+    for index in np.flatnonzero(~exact).tolist():
+        result[index] = to_minor(amounts[index])
+    return result
+
+def from_minor(units: int) -> float:
+    return units / MINOR_PER_MAJOR
+
+def _integer_weights(weights: Sequence[Weight]) -> List[int]:
+    """Scale weights to integers with the same ratios."""
+    if all(isinstance(w, int) for w in weights):
+        return list(weights)
+    fractions = [Fraction(str(w)) if isinstance(w, float) else Fraction(w) for w in weights]
+    scale = lcm(*(f.denominator for f in fractions)) if fractions else 1
+    return [int(f * scale) for f in fractions]
+
+def _allocate_numpy(total: int, weights: List[int], weight_sum: int) -> List[int]:
+    w = np.asarray(weights, dtype=np.int64)
+    shares, remainders = np.divmod(w * total, weight_sum)
+    leftover = total - int(shares.sum())
+    if leftover:
+        # Largest remainder first, earlier participant wins ties
+        order = np.lexsort((np.arange(len(w)), -remainders))
+        shares[order[:leftover]] += 1
+    return shares.tolist()
+
+def allocate(total: int, weights: Sequence[Weight]) -> List[int]:
+    """Split `total` minor units in proportion to `weights` (largest-remainder method).
+
+    The result always sums to `total`; leftover units go to the largest
+    fractional shares, ties to the earlier entry.
+    """
+    if total < 0:
+        raise ValueError('total must not be negative')
+    if not weights:
+        raise ValueError('at least one weight is required')
+    weights = _integer_weights(weights)
+    if any(w < 0 for w in weights):
+        raise ValueError('weights must not be negative')
+    weight_sum = sum(weights)
+    if weight_sum == 0:
+        raise ValueError('weights must not all be zero')
+
+    if np is not None and len(weights) >= NUMPY_THRESHOLD and total * max(weights) < _INT64_SAFE:
+        return _allocate_numpy(total, weights, weight_sum)
+
+    shares, remainders = [], []
+    for weight in weights:
+        share, remainder = divmod(total * weight, weight_sum)
+        shares.append(share)
+        remainders.append(remainder)
+    leftover = total - sum(shares)
+    for index in sorted(range(len(weights)), key=lambda i: (-remainders[i], i))[:leftover]:
+        shares[index] += 1
+    return shares
+
+def split_equal(total: int, count: int) -> List[int]:
+    return allocate(total, [1] * count)
+
+def _sum_by_participant_numpy(count: int, indices: Sequence[int], amounts: Sequence[int]) -> Optional[List[int]]:
+    try:
+        values = np.fromiter(amounts, dtype=np.int64, count=len(amounts))
+    except OverflowError:
+        return None
+    if int(values.max()) * len(values) >= _FLOAT64_EXACT:
+        return None
+    # bincount sums in float64, exact while every partial sum stays below 2**53
+    totals = np.bincount(np.fromiter(indices, dtype=np.intp, count=len(indices)), weights=values, minlength=count)
+    return totals.astype(np.int64).tolist()
+
+def sum_by_participant(count: int, indices: Sequence[int], amounts: Sequence[int]) -> List[int]:
+    """Total the per-line amounts (e.g. price x quantity of an item split) per participant."""
+    if np is not None and len(indices) >= NUMPY_THRESHOLD:
+        totals = _sum_by_participant_numpy(count, indices, amounts)
+        if totals is not None:
+            return totals
+    totals = [0] * count
+    for index, amount in zip(indices, amounts):
+        totals[index] += amount
+    return totals
+
+def add_charges(amounts: Sequence[int], charges: int) -> List[int]:
+    """Distribute tax/service charges in proportion to each share.
+
+    If nobody has a share yet, the charges are split equally.
+    """
+    if not charges:
+        return list(amounts)
+    weights = amounts if any(amounts) else [1] * len(amounts)
+    return [amount + charge for amount, charge in zip(amounts, allocate(charges, weights))]
@@ -0,0 +1,74 @@
+"""Shared fixtures: the app on an in-memory mongomock database.
+
+mongomock has no sessions or command monitoring, so transactional writes
+run without a session and every collection call is counted as one round
+trip (see benchmarks/backends.py and querybudget.instrument_mongomock).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings read at import time must be in place before the app is imported
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('JWT_SECRET_KEY', 'test-secret')
+os.environ.setdefault('RATELIMIT_STORAGE_URI', 'memory://')
+os.environ.setdefault('PUBSUB_BACKEND', 'memory')
+
+import pytest  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from benchmarks.backends import use_mongomock  # noqa: E402
+
+PASSWORD = 'Test1234'
+
+use_mongomock()
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def db():
+    import database
+    return database.get_db()
+
+
+@pytest.fixture(autouse=True)
+def clean_state(app, db):
+    """Every test starts with an empty database, cold caches and fresh rate-limit windows."""
+    import cache
+    import ratelimit
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+    cache.bill_list_cache.local.clear()
+    cache.settlement_cache.clear()
+    ratelimit.limiter.reset()
+    yield
+
+
+@pytest.fixture
+def make_user(app, db):
+    """Insert a user straight into the database; returns (user document, auth headers)."""
+    from datetime import datetime
+    from security import hash_password
+
+    def make(username, balance=1000000):
+        now = datetime.utcnow()
+        user = {'username': username, 'hashed_password': hash_password(PASSWORD), 'balance': balance,
+                'bills_version': 0, 'created_at': now, 'updated_at': now}
+        db.users.insert_one(user)
+        with app.app_context():
+            token = create_access_token(identity=str(user['_id']))
+        return user, {'Authorization': f'Bearer {token}'}
+    return make
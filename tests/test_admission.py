@@ -0,0 +1,128 @@
+"""Admission control: per-class shares of the in-flight limit, per worker or per host."""
+import multiprocessing
+import time
+
+import pytest
+
+import admission
+from admission import AdmissionController, HostAdmissionController
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'admission')
+
+
+def test_worker_controller_keeps_capacity_for_critical():
+    controller = AdmissionController(4)
+    assert controller.limits == {'critical': 4, 'normal': 3, 'low': 2}
+    assert controller.try_acquire('low')
+    assert controller.try_acquire('low')
+    assert not controller.try_acquire('low')
+    assert controller.try_acquire('normal')
+    assert not controller.try_acquire('normal')
+    assert controller.try_acquire('critical')
+    assert not controller.try_acquire('critical')
+    controller.release()
+    assert controller.try_acquire('critical')
+
+
+def _hold(path, acquired, done):
+    controller = HostAdmissionController(4, path)
+    assert controller.try_acquire('critical')
+    acquired.set()
+    done.wait(30)
+    controller.release()
+
+
+def _hold_and_exit(path):
+    # Acquires and exits without releasing, like a worker killed mid-request
+    HostAdmissionController(4, path).try_acquire('critical')
+
+
+def test_host_controller_counts_requests_of_other_processes(path):
+    context = multiprocessing.get_context('fork')
+    done = context.Event()
+    holders = []
+    for _ in range(2):
+        acquired = context.Event()
+        process = context.Process(target=_hold, args=(path, acquired, done))
+        process.start()
+        assert acquired.wait(30)
+        holders.append(process)
+
+    controller = HostAdmissionController(4, path)
+    try:
+        assert controller.total_in_flight() == 2
+        assert not controller.try_acquire('low')
+        assert controller.try_acquire('normal')
+        assert not controller.try_acquire('normal')
+        assert controller.try_acquire('critical')
+        assert not controller.try_acquire('critical')
+    finally:
+        done.set()
+        for process in holders:
+            process.join(30)
+
+    assert controller.total_in_flight() == 2
+    controller.release()
+    controller.release()
+    assert controller.total_in_flight() == 0
+
+
+def test_host_controller_reclaims_slots_of_dead_processes(path):
+    context = multiprocessing.get_context('fork')
+    for _ in range(4):
+        process = context.Process(target=_hold_and_exit, args=(path,))
+        process.start()
+        process.join(30)
+
+    controller = HostAdmissionController(4, path)
+    assert controller.total_in_flight() == 0
+    assert controller.try_acquire('low')
+
+
+def test_default_controller(monkeypatch, capsys):
+    monkeypatch.setattr(admission, 'ADMISSION_MAX_IN_FLIGHT', 8)
+    assert isinstance(admission.default_controller(), AdmissionController)
+
+    monkeypatch.setattr(admission, 'ADMISSION_MAX_IN_FLIGHT', 0)
+    monkeypatch.setattr(admission, 'ADMISSION_HOST_MAX_IN_FLIGHT', 9)
+    assert isinstance(admission.default_controller(), HostAdmissionController)
+
+    monkeypatch.setattr(admission, 'ADMISSION_HOST_MAX_IN_FLIGHT', 0)
+    controller = admission.default_controller()
+    assert controller.max_in_flight == 0
+    assert 'X-Request-Start' in capsys.readouterr().out
+
+
+def test_busy_worker_sheds_with_retry_after(app, client, make_user, monkeypatch):
+    _, headers = make_user('alice')
+    controller = app.extensions['admission']
+    monkeypatch.setattr(controller, 'max_in_flight', 1)
+    monkeypatch.setattr(controller, 'limits', admission.class_limits(1))
+    monkeypatch.setattr(controller, 'in_flight', 1)  # another request holds the only slot
+
+    response = client.get('/api/bills/?limit=5', headers=headers)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(admission.ADMISSION_RETRY_AFTER)
+    assert client.get('/api/health/live').status_code == 200
+
+
+@pytest.mark.parametrize('endpoint, method', [
+    ('bill.handle_bill', 'GET'),
+    ('bill.handle_bills', 'GET'),
+    ('bill.handle_bill_export', 'GET'),
+])
+def test_polling_is_low_priority(app, endpoint, method):
+    assert admission.priority_for(app.view_functions[endpoint], method) == 'low'
+
+
+def test_bill_poll_is_shed_on_queue_wait_before_payments(client, make_user, monkeypatch):
+    _, headers = make_user('alice')
+    waited = {**headers, 'X-Request-Start': f't={time.time() - 2:.3f}'}
+    response = client.get('/api/bills/000000000000000000000000', headers=waited)
+    assert response.status_code == 503
+    assert response.get_json()['reason'] == 'queue_wait'
+    response = client.post('/api/bills/000000000000000000000000/pay', json={'password': 'wrong'}, headers=waited)
+    assert response.status_code == 401
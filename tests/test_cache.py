@@ -0,0 +1,80 @@
+"""The bill list cache: local LRU tier with a byte budget, shared Redis tier."""
+import fakeredis
+import pytest
+
+from cache import BillListCache, LRUCache
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def make_cache(server, **options):
+    return BillListCache(redis_client=fakeredis.FakeStrictRedis(server=server), **options)
+
+
+def test_hit_from_another_instance(server):
+    worker_a, worker_b = make_cache(server), make_cache(server)
+    worker_a.set('user-1', 'etag-1', b'[{"bill": 1}]')
+    assert worker_b.local.get('user-1', 'etag-1') is None
+    assert worker_b.get('user-1', 'etag-1') == b'[{"bill": 1}]'
+    # Kept in the local tier after the first shared hit
+    assert worker_b.local.get('user-1', 'etag-1') == b'[{"bill": 1}]'
+
+
+def test_invalidation_reaches_every_instance(server):
+    worker_a, worker_b = make_cache(server), make_cache(server)
+    worker_a.set('user-1', 'etag-1', b'[1]')
+    worker_a.set('user-2', 'etag-1', b'[2]')
+    worker_a.invalidate(['user-1'])
+
+    assert worker_a.get('user-1', 'etag-1') is None
+    assert worker_b.get('user-1', 'etag-1') is None
+    assert worker_b.get('user-2', 'etag-1') == b'[2]'
+
+
+def test_entries_expire_in_redis(server):
+    cache = make_cache(server, ttl=30)
+    cache.set('user-1', 'etag-1', b'[1]')
+    assert 0 < cache.redis.ttl('bills:user-1') <= 30
+
+
+def test_oversized_responses_are_not_cached(server):
+    worker_a, worker_b = make_cache(server, max_entry_bytes=8), make_cache(server)
+    worker_a.set('user-1', 'etag-1', b'x' * 9)
+    assert worker_a.get('user-1', 'etag-1') is None
+    assert worker_b.get('user-1', 'etag-1') is None
+
+
+def test_unreachable_redis_falls_back_to_the_local_tier():
+    class Unreachable:
+        def __getattr__(self, name):
+            raise ConnectionError('redis is down')
+
+    cache = BillListCache(redis_client=Unreachable())
+    cache.set('user-1', 'etag-1', b'[1]')
+    assert cache.get('user-1', 'etag-1') == b'[1]'
+    assert cache.get('user-1', 'etag-2') is None
+    cache.invalidate(['user-1'])
+    assert cache.get('user-1', 'etag-1') is None
+
+
+def test_lru_byte_budget_evicts_least_recently_used():
+    cache = LRUCache(max_entries=100, ttl=60, max_bytes=10)
+    cache.set('a', '1', b'xxxx')
+    cache.set('b', '1', b'xxxx')
+    cache.get('a', '1')
+    cache.set('c', '1', b'xxxx')
+    assert cache.get('b', '1') is None
+    assert cache.get('a', '1') == b'xxxx'
+    assert cache.size == 8
+
+    cache.set('a', '1', b'xx')  # replacing an entry only counts the new value
+    assert cache.size == 6
+    cache.set('d', '1', b'x' * 11)  # larger than the whole budget
+    assert cache.get('d', '1') is None
+    cache.invalidate('a')
+    assert cache.size == 4
+    cache.clear()
+    assert cache.size == 0
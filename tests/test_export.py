@@ -0,0 +1,26 @@
+"""Bill export: NDJSON and CSV stream the same bills in the same formats."""
+import csv
+import io
+import json
+
+
+def test_csv_and_ndjson_agree_on_created_at(client, make_user):
+    _, headers = make_user('alice')
+    response = client.post('/api/bills/', headers=headers, json={
+        'bill_name': '=SUM(A1)',
+        'split_method': 'equal',
+        'participants': [{'external_name': 'alice'}, {'external_name': 'Charlie'}],
+        'items': [{'name': 'Soto', 'price_per_unit': 20000, 'quantity': 2}]
+    })
+    assert response.status_code == 201
+
+    ndjson = [json.loads(line) for line in client.get('/api/bills/export', headers=headers).get_data().splitlines()]
+    rows = list(csv.DictReader(io.StringIO(
+        client.get('/api/bills/export?format=csv', headers=headers).get_data(as_text=True))))
+
+    assert len(ndjson) == 1
+    assert {row['created_at'] for row in rows} == {ndjson[0]['created_at']}
+    assert {row['bill_id'] for row in rows} == {ndjson[0]['_id']}
+    # Formula-looking text is neutralised for spreadsheet apps
+    assert rows[0]['bill_name'] == "'=SUM(A1)"
+    assert [row['row_type'] for row in rows] == ['participant', 'participant', 'item']
@@ -0,0 +1,55 @@
+"""gunicorn_config.py defaults per worker class, and how they yield to the environment or .env."""
+import functools
+import importlib
+import os
+import sys
+
+import dotenv
+import pytest
+
+
+@pytest.fixture
+def load_config(monkeypatch, tmp_path):
+    def load(dotenv_text='', **env):
+        path = tmp_path / '.env'
+        path.write_text(dotenv_text)
+        monkeypatch.setattr(dotenv, 'load_dotenv', functools.partial(dotenv.load_dotenv, path))
+        monkeypatch.setattr(os, 'environ', {key: value for key, value in os.environ.items()
+                                            if not key.startswith(('MONGODB_', 'RATELIMIT_', 'REDIS_', 'ADMISSION_'))})
+        os.environ.update(env)
+        sys.modules.pop('gunicorn_config', None)
+        try:
+            return importlib.import_module('gunicorn_config')
+        finally:
+            sys.modules.pop('gunicorn_config', None)
+    return load
+
+
+def test_defaults_apply_without_dotenv(load_config):
+    load_config(GUNICORN_WORKER_CLASS='sync', GUNICORN_WORKERS='4')
+    assert os.environ['MONGODB_MAX_POOL_SIZE'] == '2'
+    assert os.environ['RATELIMIT_STORAGE_URI'].startswith('mmap://')
+
+
+def test_dotenv_values_win_over_defaults(load_config):
+    load_config('MONGODB_MAX_POOL_SIZE=100\nREDIS_URL=redis://localhost:6379/0\n',
+                GUNICORN_WORKER_CLASS='sync', GUNICORN_WORKERS='4')
+    assert os.environ['MONGODB_MAX_POOL_SIZE'] == '100'
+    assert 'RATELIMIT_STORAGE_URI' not in os.environ
+
+
+def test_environment_wins_over_dotenv(load_config):
+    load_config('MONGODB_MAX_POOL_SIZE=100\n', MONGODB_MAX_POOL_SIZE='7', GUNICORN_WORKERS='1')
+    assert os.environ['MONGODB_MAX_POOL_SIZE'] == '7'
+
+
+@pytest.mark.parametrize('worker_class', ['sync', 'gthread'])
+def test_no_in_flight_limit_on_workers_that_cannot_exceed_it(load_config, worker_class):
+    load_config(GUNICORN_WORKER_CLASS=worker_class, GUNICORN_WORKERS='4')
+    assert 'ADMISSION_MAX_IN_FLIGHT' not in os.environ
+    assert 'ADMISSION_HOST_MAX_IN_FLIGHT' not in os.environ
+
+
+def test_gevent_in_flight_limit_is_the_pool_size(load_config):
+    load_config(GUNICORN_WORKER_CLASS='gevent', GUNICORN_WORKERS='4', GUNICORN_WORKER_CONNECTIONS='1000')
+    assert os.environ['ADMISSION_MAX_IN_FLIGHT'] == os.environ['MONGODB_MAX_POOL_SIZE'] == '100'
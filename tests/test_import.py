@@ -0,0 +1,58 @@
+"""Bulk import: each chunk of bills goes in with its ledger debts in one transaction."""
+import json
+
+import pytest
+
+from models.ledger import Ledger
+from models.user import User
+
+
+@pytest.fixture
+def alice(make_user):
+    return make_user('alice')
+
+
+def import_body(count):
+    return '\n'.join(json.dumps({
+        'bill_name': f'Imported {i}',
+        'split_method': 'equal',
+        'participants': [{'external_name': 'alice'}, {'external_name': 'Charlie'}],
+        'items': [{'name': 'Soto', 'price_per_unit': 20000, 'quantity': 2}]
+    }) for i in range(count))
+
+
+def run_import(client, headers, count, chunk_size=2):
+    response = client.post(f'/api/bills/import?chunk_size={chunk_size}', data=import_body(count), headers=headers)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data().splitlines()]
+
+
+def test_import_creates_bills_and_ledger_entries(client, db, alice):
+    results = run_import(client, alice[1], 3)
+    assert results[-1] == {'summary': {'created': 3, 'failed': 0}}
+    assert db.bills.count_documents({}) == 3
+    assert db.ledgers.count_documents({}) > 0
+
+
+def test_ledger_failure_fails_the_whole_chunk(client, db, alice, monkeypatch):
+    calls = []
+
+    def apply(edges, sign=1, session=None):
+        calls.append(session)
+        if len(calls) == 2:
+            raise RuntimeError('ledger unavailable')
+    monkeypatch.setattr(Ledger, 'apply', staticmethod(apply))
+
+    results = run_import(client, alice[1], 3)
+    assert all(session is not None for session in calls)
+    assert results[-1] == {'summary': {'created': 2, 'failed': 1}}
+    assert {result['line']: result['status'] for result in results[:-1]} == {1: 'created', 2: 'created', 3: 'error'}
+
+
+def test_refresh_failure_after_commit_still_reports_created(client, alice, monkeypatch):
+    def bump(user_ids, session=None):
+        raise RuntimeError('users collection unavailable')
+    monkeypatch.setattr(User, 'bump_bills_version', staticmethod(bump))
+
+    results = run_import(client, alice[1], 3)
+    assert results[-1] == {'summary': {'created': 3, 'failed': 0}}
@@ -0,0 +1,106 @@
+"""The incremental ledger: kept in step with bills by every write path, and free of drift."""
+import json
+
+import pytest
+
+from conftest import PASSWORD
+from models.ledger import Ledger
+
+
+@pytest.fixture
+def alice(make_user):
+    return make_user('alice')
+
+
+@pytest.fixture
+def bob(make_user):
+    return make_user('bob')
+
+
+def lunch(name='Lunch'):
+    # 60000 split three ways: bob and Charlie each owe alice 20000
+    return {
+        'bill_name': name,
+        'split_method': 'equal',
+        'participants': [{'external_name': 'alice'}, {'external_name': 'bob'}, {'external_name': 'Charlie'}],
+        'items': [{'name': 'Soto', 'price_per_unit': 20000, 'quantity': 3}]
+    }
+
+
+@pytest.fixture
+def bill_id(client, alice, bob):
+    response = client.post('/api/bills/', json=lunch(), headers=alice[1])
+    assert response.status_code == 201
+    return response.get_json()['_id']
+
+
+def ledger(client, user):
+    response = client.get('/api/ledger/', headers=user[1])
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def balances(entry):
+    return {counterparty.get('user_id') or counterparty['external_name']: counterparty['balance']
+            for counterparty in entry['counterparties']}
+
+
+def assert_no_drift():
+    assert Ledger.rebuild(apply=False)['drifted'] == []
+
+
+def test_new_bill_adds_debts_to_the_creator(client, alice, bob, bill_id):
+    entry = ledger(client, alice)
+    assert (entry['owed_to_me'], entry['owed_by_me'], entry['net']) == (40000, 0, 40000)
+    assert balances(entry) == {str(bob[0]['_id']): 20000, 'Charlie': 20000}
+
+    entry = ledger(client, bob)
+    assert (entry['owed_to_me'], entry['owed_by_me'], entry['net']) == (0, 20000, -20000)
+    assert balances(entry) == {str(alice[0]['_id']): -20000}
+    assert_no_drift()
+
+
+def test_paying_a_share_settles_it(client, alice, bob, bill_id):
+    response = client.post(f'/api/bills/{bill_id}/pay', json={'password': PASSWORD}, headers=bob[1])
+    assert response.status_code == 200, response.get_json()
+
+    assert balances(ledger(client, alice)) == {'Charlie': 20000}
+    entry = ledger(client, bob)
+    assert (entry['owed_by_me'], entry['counterparties']) == (0, [])
+    assert_no_drift()
+
+
+def test_marking_an_external_participant_paid_settles_it(client, alice, bob, bill_id):
+    response = client.post(f'/api/bills/{bill_id}/participants/2/pay', headers=alice[1])
+    assert response.status_code == 200, response.get_json()
+
+    entry = ledger(client, alice)
+    assert entry['owed_to_me'] == 20000
+    assert balances(entry) == {str(bob[0]['_id']): 20000}
+    assert_no_drift()
+
+
+def test_import_adds_debts(client, alice, bob):
+    body = '\n'.join(json.dumps(lunch(f'Imported {i}')) for i in range(3))
+    response = client.post('/api/bills/import?chunk_size=2', data=body, headers=alice[1])
+    assert response.status_code == 200
+    assert json.loads(response.get_data().splitlines()[-1]) == {'summary': {'created': 3, 'failed': 0}}
+
+    assert ledger(client, alice)['owed_to_me'] == 120000
+    assert ledger(client, bob)['owed_by_me'] == 60000
+    assert_no_drift()
+
+
+def test_rebuild_reports_and_repairs_drift(client, db, alice, bob, bill_id):
+    alice_id, bob_id = str(alice[0]['_id']), str(bob[0]['_id'])
+    db.ledgers.update_one({'_id': alice_id}, {'$inc': {'owed_to_me': 1}})
+    db.ledgers.delete_one({'_id': bob_id})
+
+    report = Ledger.rebuild(apply=False)
+    assert report['drifted'] == sorted([alice_id, bob_id])
+    assert not report['repaired']
+
+    assert Ledger.rebuild()['drifted'] == sorted([alice_id, bob_id])
+    assert_no_drift()
+    assert ledger(client, alice)['owed_to_me'] == 40000
+    assert ledger(client, bob)['owed_by_me'] == 20000
@@ -0,0 +1,46 @@
+"""Payment-session tokens authorize payments only, never a request on their own."""
+import pytest
+
+from conftest import PASSWORD
+
+
+@pytest.fixture
+def alice(make_user):
+    return make_user('alice')
+
+
+@pytest.fixture
+def payment_token(client, alice):
+    response = client.post('/api/auth/payment-session', json={'password': PASSWORD}, headers=alice[1])
+    assert response.status_code == 200
+    return response.get_json()['payment_token']
+
+
+@pytest.mark.parametrize('method, path', [
+    ('GET', '/api/auth/profile'),
+    ('POST', '/api/auth/balance'),
+    ('POST', '/api/auth/payment-session'),
+    ('GET', '/api/bills/'),
+    ('POST', '/api/bills/pay-batch'),
+])
+def test_payment_token_is_rejected_as_bearer_token(client, payment_token, method, path):
+    response = client.open(path, method=method, json={'amount': 1, 'password': PASSWORD},
+                           headers={'Authorization': f'Bearer {payment_token}'})
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize('body', [{'json': {}}, {}], ids=['empty json', 'no body'])
+def test_payment_token_authorizes_payment(client, make_user, alice, payment_token, body):
+    _, bob_headers = make_user('bob')
+    response = client.post('/api/bills/', headers=bob_headers, json={
+        'bill_name': 'Lunch',
+        'split_method': 'equal',
+        'participants': [{'external_name': 'alice'}, {'external_name': 'bob'}],
+        'items': [{'name': 'Soto', 'price_per_unit': 20000, 'quantity': 2}]
+    })
+    bill_id = response.get_json()['_id']
+
+    response = client.post(f'/api/bills/{bill_id}/pay', headers={**alice[1], 'X-Payment-Token': payment_token},
+                           **body)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['amount_paid'] == 20000
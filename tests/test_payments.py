@@ -0,0 +1,128 @@
+"""Payment error paths: single bills and batches."""
+import pytest
+from bson import ObjectId
+
+from conftest import PASSWORD
+
+
+@pytest.fixture
+def alice(make_user):
+    return make_user('alice')
+
+
+@pytest.fixture
+def bob(make_user):
+    return make_user('bob')
+
+
+@pytest.fixture
+def make_bill(client, alice, bob):
+    """Alice's bill: bob owes 20000, Charlie (external) owes 20000."""
+    def make(name='Lunch', participants=('alice', 'bob', 'Charlie')):
+        response = client.post('/api/bills/', headers=alice[1], json={
+            'bill_name': name,
+            'split_method': 'equal',
+            'participants': [{'external_name': p} for p in participants],
+            'items': [{'name': 'Soto', 'price_per_unit': 20000, 'quantity': len(participants)}]
+        })
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()['_id']
+    return make
+
+
+def pay(client, user, bill_id):
+    return client.post(f'/api/bills/{bill_id}/pay', json={'password': PASSWORD}, headers=user[1])
+
+
+def pay_batch(client, user, bill_ids):
+    return client.post('/api/bills/pay-batch', json={'bill_ids': bill_ids, 'password': PASSWORD}, headers=user[1])
+
+
+def test_already_paid(client, bob, make_bill):
+    bill_id = make_bill()
+    assert pay(client, bob, bill_id).status_code == 200
+    response = pay(client, bob, bill_id)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Already paid'
+
+
+def test_not_a_participant(client, make_user, make_bill):
+    carol = make_user('carol')
+    response = pay(client, carol, make_bill())
+    assert response.status_code == 403
+    assert response.get_json()['error'] == 'User is not a participant in this bill'
+
+
+def test_bill_not_found(client, bob):
+    response = pay(client, bob, str(ObjectId()))
+    assert response.status_code == 404
+
+
+def test_wrong_password(client, bob, make_bill):
+    response = client.post(f'/api/bills/{make_bill()}/pay', json={'password': 'wrong'}, headers=bob[1])
+    assert response.status_code == 401
+
+
+def test_insufficient_balance(client, db, bob, make_bill):
+    bill_id = make_bill()
+    db.users.update_one({'_id': bob[0]['_id']}, {'$set': {'balance': 500}})
+    response = pay(client, bob, bill_id)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Insufficient balance', 'amount_due': 20000.0, 'current_balance': 500.0}
+
+
+def test_batch_reports_each_bill(client, bob, make_bill):
+    payable = make_bill('Lunch')
+    paid = make_bill('Dinner')
+    assert pay(client, bob, paid).status_code == 200
+    not_mine = make_bill('Coffee', participants=('alice', 'Charlie'))
+    missing = str(ObjectId())
+
+    response = pay_batch(client, bob, [payable, paid, not_mine, 'not-an-id', missing])
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert body['results'] == [
+        {'bill_id': payable, 'status': 'paid', 'amount_paid': 20000.0},
+        {'bill_id': paid, 'status': 'error', 'error': 'Already paid'},
+        {'bill_id': not_mine, 'status': 'error', 'error': 'User is not a participant in this bill'},
+        {'bill_id': 'not-an-id', 'status': 'error', 'error': 'Invalid bill ID format'},
+        {'bill_id': missing, 'status': 'error', 'error': 'Bill not found'},
+    ]
+    assert body['total_paid'] == 20000.0
+    assert body['new_balance'] == 1000000 - 40000
+
+
+def test_batch_with_nothing_payable(client, bob, make_bill):
+    paid = make_bill()
+    assert pay(client, bob, paid).status_code == 200
+    response = pay_batch(client, bob, [paid, str(ObjectId())])
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['error'] == 'No payable bills'
+    assert [result['error'] for result in body['results']] == ['Already paid', 'Bill not found']
+
+
+def test_batch_insufficient_balance_covers_the_total(client, db, bob, make_bill):
+    bill_ids = [make_bill(f'Lunch {i}') for i in range(3)]
+    db.users.update_one({'_id': bob[0]['_id']}, {'$set': {'balance': 50000}})
+    response = pay_batch(client, bob, bill_ids)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Insufficient balance', 'amount_due': 60000.0, 'current_balance': 50000.0}
+
+
+def test_batch_conflict_when_bills_change_during_payment(client, db, bob, make_bill, monkeypatch):
+    bill_ids = [make_bill(f'Lunch {i}') for i in range(2)]
+    bills = type(db.bills)
+    bulk_write = bills.bulk_write
+
+    def concurrent_payment(self, requests, *args, **kwargs):
+        # Another request pays bob's share of the first bill after the batch read it
+        if self.name == 'bills':
+            db.bills.update_one({'_id': ObjectId(bill_ids[0]), 'participants.user_id': str(bob[0]['_id'])},
+                                {'$set': {'participants.$.status': 'paid'}})
+        return bulk_write(self, requests, *args, **kwargs)
+    monkeypatch.setattr(bills, 'bulk_write', concurrent_payment)
+
+    response = pay_batch(client, bob, bill_ids)
+    assert response.status_code == 409
+    assert response.get_json()['error'] == 'Bills changed during payment, please retry'
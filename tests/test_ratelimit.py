@@ -0,0 +1,131 @@
+"""The shared mmap counter table and the per-user rate-limit key."""
+import multiprocessing
+
+import pytest
+from flask import g
+
+import ratelimit
+from ratelimit import MmapStorage, identity_key
+from security import create_payment_token
+
+
+@pytest.fixture
+def uri(tmp_path):
+    return f'mmap://{tmp_path}/ratelimit'
+
+
+def _hammer(uri, key, times):
+    storage = MmapStorage(uri, slots=1024)
+    for _ in range(times):
+        storage.incr(key, 60)
+
+
+def test_mmap_counter_is_shared_across_processes(uri):
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_hammer, args=(uri, 'user:a', 500)) for _ in range(4)]
+    processes.append(context.Process(target=_hammer, args=(uri, 'user:b', 300)))
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    storage = MmapStorage(uri, slots=1024)
+    assert storage.get('user:a') == 2000
+    assert storage.get('user:b') == 300
+
+
+def test_mmap_counter_survives_fork(uri):
+    # A storage opened before the fork reopens its mapping in the child
+    storage = MmapStorage(uri, slots=1024)
+    storage.incr('user:a', 60)
+    process = multiprocessing.get_context('fork').Process(target=_hammer, args=(uri, 'user:a', 10))
+    process.start()
+    process.join(30)
+    assert storage.incr('user:a', 60) == 12
+
+
+def test_mmap_counter_expires(uri, monkeypatch):
+    storage = MmapStorage(uri, slots=1024)
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, 'time', lambda: now[0])
+    assert storage.incr('user:a', 60) == 1
+    assert storage.incr('user:a', 60) == 2
+    assert storage.get_expiry('user:a') == 1060
+    now[0] = 1061.0
+    assert storage.get('user:a') == 0
+    assert storage.incr('user:a', 60) == 1
+
+
+def test_mmap_full_bucket_evicts_the_counter_closest_to_expiry(uri, monkeypatch):
+    storage = MmapStorage(uri, slots=8)  # a single bucket
+    monkeypatch.setattr(ratelimit.time, 'time', lambda: 1000.0)
+    for index in range(8):
+        storage.incr(f'user:{index}', 60 + index)
+    storage.incr('user:new', 60)
+    assert storage.get('user:0') == 0
+    assert all(storage.get(f'user:{index}') == 1 for index in range(1, 8))
+    assert storage.get('user:new') == 1
+
+
+def test_mmap_clear_and_reset(uri):
+    storage = MmapStorage(uri, slots=1024)
+    storage.incr('user:a', 60)
+    storage.incr('user:b', 60)
+    storage.clear('user:a')
+    assert storage.get('user:a') == 0
+    assert storage.reset() == 1
+    assert storage.get('user:b') == 0
+
+
+@pytest.fixture
+def user_token(app, make_user):
+    user, headers = make_user('alice')
+    return str(user['_id']), headers['Authorization']
+
+
+def test_identity_key_uses_the_jwt_identity(app, user_token):
+    user_id, authorization = user_token
+    with app.test_request_context(headers={'Authorization': authorization}):
+        assert identity_key() == f'user:{user_id}'
+
+
+@pytest.mark.parametrize('authorization', [None, 'Bearer not-a-token'])
+def test_identity_key_falls_back_to_the_address(app, authorization):
+    headers = {'Authorization': authorization} if authorization else {}
+    with app.test_request_context(headers=headers, environ_base={'REMOTE_ADDR': '10.0.0.7'}):
+        assert identity_key() == 'ip:10.0.0.7'
+
+
+def test_identity_key_ignores_payment_tokens(app, user_token):
+    user_id, _ = user_token
+    with app.app_context():
+        token = create_payment_token(user_id)
+    with app.test_request_context(headers={'Authorization': f'Bearer {token}'},
+                                  environ_base={'REMOTE_ADDR': '10.0.0.7'}):
+        assert identity_key() == 'ip:10.0.0.7'
+
+
+def test_identity_key_caches_verified_tokens(app, user_token, monkeypatch):
+    user_id, authorization = user_token
+    with app.test_request_context(headers={'Authorization': authorization}):
+        identity_key()
+
+    def no_verification(*args, **kwargs):
+        raise AssertionError('token verified again')
+    monkeypatch.setattr(ratelimit, 'verify_jwt_in_request', no_verification)
+    with app.test_request_context(headers={'Authorization': authorization}):
+        assert identity_key() == f'user:{user_id}'
+        assert g.rate_limit_key == f'user:{user_id}'
+
+
+def test_limits_are_counted_per_user(app, client, make_user):
+    # Two users behind one address each get the full payment-session budget
+    limit = int(ratelimit.LOGIN_RATE_LIMIT.split()[0])
+    alice = make_user('alice')[1]
+    bob = make_user('bob')[1]
+    statuses = [client.post('/api/auth/payment-session', json={'password': 'wrong'}, headers=alice).status_code
+                for _ in range(limit + 1)]
+    assert statuses[:limit] == [401] * limit
+    assert statuses[limit] == 429
+    assert client.post('/api/auth/payment-session', json={'password': 'wrong'}, headers=bob).status_code == 401
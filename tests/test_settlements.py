@@ -0,0 +1,88 @@
+"""Settling debts across bills: net balances, the transfers that clear them, and the endpoint."""
+from collections import defaultdict
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from settlements import minimize_transfers, net_balances
+
+people = st.sampled_from([f'p{i}' for i in range(12)])
+debts = st.lists(st.tuples(people, people, st.integers(min_value=0, max_value=10 ** 9)), max_size=80)
+
+
+def apply_transfers(balances, transfers):
+    remaining = defaultdict(int, balances)
+    for debtor, creditor, amount in transfers:
+        remaining[debtor] += amount
+        remaining[creditor] -= amount
+    return remaining
+
+
+def test_net_balances_nets_and_drops_settled_people():
+    assert net_balances([('a', 'b', 500), ('b', 'a', 200), ('c', 'b', 100)]) == {'a': -300, 'b': 400, 'c': -100}
+    # Self-debts, zero amounts and people who end up even are left out
+    assert net_balances([('a', 'a', 100), ('a', 'b', 0), ('a', 'b', 50), ('b', 'a', 50)]) == {}
+
+
+@settings(max_examples=300, deadline=None)
+@given(debts)
+def test_transfers_settle_every_balance_exactly(debts):
+    balances = net_balances(debts)
+    assert sum(balances.values()) == 0
+    transfers = minimize_transfers(balances)
+    assert all(amount > 0 for _, _, amount in transfers)
+    assert all(debtor != creditor for debtor, creditor, _ in transfers)
+    assert not any(apply_transfers(balances, transfers).values())
+    assert len(transfers) <= max(len(balances) - 1, 0)
+
+
+@settings(max_examples=300, deadline=None)
+@given(debts)
+def test_money_only_flows_from_debtors_to_creditors(debts):
+    balances = net_balances(debts)
+    for debtor, creditor, _ in minimize_transfers(balances):
+        assert balances[debtor] < 0 < balances[creditor]
+
+
+def test_exact_matches_are_paired_first():
+    # Greedy alone would pay the largest creditor first and need four transfers
+    balances = {'a': -70, 'b': -30, 'c': 50, 'd': 30, 'e': 20}
+    transfers = minimize_transfers(balances)
+    assert ('b', 'd', 30) in transfers
+    assert not any(apply_transfers(balances, transfers).values())
+    assert len(transfers) == 3
+
+
+def test_equal_debts_pair_with_distinct_creditors():
+    transfers = minimize_transfers({'a': -10, 'b': -10, 'c': 10, 'd': 10})
+    assert len(transfers) == 2
+    assert {debtor for debtor, _, _ in transfers} == {'a', 'b'}
+    assert {creditor for _, creditor, _ in transfers} == {'c', 'd'}
+
+
+@pytest.fixture
+def shared_bills(client, make_user):
+    _, alice = make_user('alice')
+    make_user('bob')
+    bill_ids = []
+    for name, price in [('Lunch', 20000), ('Dinner', 60000)]:
+        response = client.post('/api/bills/', headers=alice, json={
+            'bill_name': name,
+            'split_method': 'equal',
+            'participants': [{'external_name': 'alice'}, {'external_name': 'bob'}, {'external_name': 'Charlie'}],
+            'items': [{'name': 'Soto', 'price_per_unit': price, 'quantity': 3}]
+        })
+        assert response.status_code == 201
+        bill_ids.append(response.get_json()['_id'])
+    return alice, bill_ids
+
+
+def test_settlement_echoes_bills_in_request_order(client, shared_bills):
+    headers, bill_ids = shared_bills
+    first = client.get(f"/api/settlements/?bills={','.join(bill_ids)}", headers=headers).get_json()
+    second = client.get(f"/api/settlements/?bills={','.join(reversed(bill_ids))}", headers=headers).get_json()
+    assert first['bills'] == bill_ids
+    assert second['bills'] == bill_ids[::-1]
+    assert first['transfers'] == second['transfers']
+    # alice is owed bob's and Charlie's shares of both bills
+    assert sorted(transfer['amount'] for transfer in first['transfers']) == [80000, 80000]
@@ -0,0 +1,145 @@
+"""Property tests for the split engine, on the pure-Python and NumPy paths."""
+from contextlib import contextmanager
+from fractions import Fraction
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+import splitting
+
+PATHS = ['python']
+if splitting.np is not None:
+    PATHS.append('numpy')
+
+amounts = st.integers(min_value=0, max_value=10 ** 12)
+weights = st.lists(st.integers(min_value=0, max_value=10 ** 6), min_size=1, max_size=60).filter(any)
+
+
+@contextmanager
+def split_path(path):
+    """Force every call inside the block through one implementation."""
+    numpy_module, threshold = splitting.np, splitting.NUMPY_THRESHOLD
+    if path == 'numpy':
+        splitting.NUMPY_THRESHOLD = 1
+    else:
+        splitting.np = None
+    try:
+        yield
+    finally:
+        splitting.np, splitting.NUMPY_THRESHOLD = numpy_module, threshold
+
+
+def assert_largest_remainder(total, weights, shares):
+    """Shares sum exactly, are never negative and round up in tie-break order."""
+    weight_sum = sum(weights)
+    assert sum(shares) == total
+    assert all(share >= 0 for share in shares)
+    rounded_up = []
+    for index, (weight, share) in enumerate(zip(weights, shares)):
+        floor, remainder = divmod(total * weight, weight_sum)
+        assert share in (floor, floor + 1)
+        rounded_up.append((share > floor, remainder, index))
+    # Anyone rounded up beats everyone who wasn't: larger remainder, then earlier index
+    up = [(-remainder, index) for is_up, remainder, index in rounded_up if is_up]
+    down = [(-remainder, index) for is_up, remainder, index in rounded_up if not is_up]
+    if up and down:
+        assert max(up) < min(down)
+
+
+@pytest.mark.parametrize('path', PATHS)
+@settings(max_examples=300, deadline=None)
+@given(total=amounts, weights=weights)
+def test_allocate_is_exact_and_follows_tie_break(path, total, weights):
+    with split_path(path):
+        shares = splitting.allocate(total, weights)
+    assert_largest_remainder(total, weights, shares)
+
+
+@settings(max_examples=300, deadline=None)
+@given(total=amounts, weights=weights)
+def test_allocate_paths_agree(total, weights):
+    if splitting.np is None:
+        pytest.skip('numpy is not installed')
+    with split_path('numpy'):
+        vectorized = splitting.allocate(total, weights)
+    with split_path('python'):
+        assert vectorized == splitting.allocate(total, weights)
+
+
+@pytest.mark.parametrize('path', PATHS)
+@settings(max_examples=200, deadline=None)
+@given(total=amounts, weights=st.lists(
+    st.one_of(st.floats(min_value=0.01, max_value=100, allow_nan=False).map(lambda w: round(w, 2)),
+              st.fractions(min_value=Fraction(1, 50), max_value=100, max_denominator=50)),
+    min_size=1, max_size=30))
+def test_allocate_scales_fractional_weights(path, total, weights):
+    with split_path(path):
+        shares = splitting.allocate(total, weights)
+    assert_largest_remainder(total, splitting._integer_weights(weights), shares)
+
+
+@pytest.mark.parametrize('path', PATHS)
+@settings(max_examples=300, deadline=None)
+@given(total=amounts, count=st.integers(min_value=1, max_value=500))
+def test_split_equal_gives_extra_units_to_earlier_participants(path, total, count):
+    with split_path(path):
+        shares = splitting.split_equal(total, count)
+    assert len(shares) == count
+    assert sum(shares) == total
+    floor, leftover = divmod(total, count)
+    assert shares == [floor + 1] * leftover + [floor] * (count - leftover)
+
+
+@pytest.mark.parametrize('path', PATHS)
+@settings(max_examples=300, deadline=None)
+@given(data=st.data(), count=st.integers(min_value=1, max_value=50))
+def test_sum_by_participant_matches_line_totals(path, data, count):
+    lines = data.draw(st.lists(st.tuples(st.integers(0, count - 1), amounts), max_size=300))
+    indices = [index for index, _ in lines]
+    line_amounts = [amount for _, amount in lines]
+    with split_path(path):
+        totals = splitting.sum_by_participant(count, indices, line_amounts)
+    assert len(totals) == count
+    assert sum(totals) == sum(line_amounts)
+    assert all(total >= 0 for total in totals)
+    for index in range(count):
+        assert totals[index] == sum(amount for i, amount in lines if i == index)
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_sum_by_participant_stays_exact_past_float64(path):
+    # Large enough that summing in float64 would lose units
+    line_amounts = [2 ** 53 + 1, 2 ** 53 + 1, 3]
+    with split_path(path):
+        assert splitting.sum_by_participant(2, [0, 0, 1], line_amounts) == [2 ** 54 + 2, 3]
+
+
+@pytest.mark.parametrize('path', PATHS)
+@settings(max_examples=300, deadline=None)
+@given(shares=st.lists(amounts, min_size=1, max_size=60), charges=amounts)
+def test_add_charges_is_exact_and_proportional(path, shares, charges):
+    with split_path(path):
+        charged = splitting.add_charges(shares, charges)
+    assert sum(charged) == sum(shares) + charges
+    assert all(after >= before for before, after in zip(shares, charged))
+    weights = shares if any(shares) else [1] * len(shares)
+    assert_largest_remainder(charges, weights, [after - before for before, after in zip(shares, charged)])
+
+
+@pytest.mark.parametrize('path', PATHS)
+@settings(max_examples=200, deadline=None)
+@given(prices=st.lists(st.one_of(
+    st.integers(min_value=0, max_value=10 ** 20),
+    st.floats(min_value=0, max_value=10 ** 9, allow_nan=False),
+    st.floats(min_value=0, max_value=10 ** 6).map(lambda p: round(p, 2)),
+    st.decimals(min_value=0, max_value=10 ** 6, places=3),
+), max_size=50))
+def test_to_minor_many_matches_to_minor(path, prices):
+    with split_path(path):
+        assert splitting.to_minor_many(prices) == [splitting.to_minor(price) for price in prices]
+
+
+@pytest.mark.parametrize('total, weights', [(-1, [1]), (10, []), (10, [1, -1]), (10, [0, 0])])
+def test_allocate_rejects_invalid_input(total, weights):
+    with pytest.raises(ValueError):
+        splitting.allocate(total, weights)
@@ -0,0 +1,189 @@
+"""Live update streams: delivery, heartbeats and resume; off on worker classes
+that can't hold them; tokens kept out of the access log."""
+import importlib
+import json
+import os
+import sys
+
+import pytest
+from bson import ObjectId
+
+import pubsub
+from pubsub import Broker
+
+
+@pytest.fixture
+def topic():
+    return pubsub.bill_topic(str(ObjectId()))
+
+
+def open_stream(topics, last_event_id=None):
+    stream = pubsub.stream(topics, last_event_id, heartbeat=0.01, max_seconds=5)
+    assert next(stream) == b'retry: %d\n\n' % pubsub.SSE_RETRY_MS
+    return stream
+
+
+def parse_event(chunk):
+    fields = dict(line.split(': ', 1) for line in chunk.decode('utf-8').strip().split('\n'))
+    return fields['event'], fields['id'], json.loads(fields['data'])
+
+
+def make_event(topic, event_type='participant.paid'):
+    return {'id': str(ObjectId()), 'type': event_type, 'topics': [topic], 'data': {}}
+
+
+def test_published_events_reach_the_stream(topic):
+    stream = open_stream([topic])
+    bill_id = topic.split(':', 1)[1]
+    pubsub.publish('participant.paid', bill_id, ['user-1'], {'amount_paid': 500})
+    event_type, _, data = parse_event(next(stream))
+    assert event_type == 'participant.paid'
+    assert data == {'bill_id': bill_id, 'amount_paid': 500}
+    stream.close()
+
+
+def test_other_topics_are_not_delivered(topic):
+    stream = open_stream([topic])
+    pubsub.publish('participant.paid', str(ObjectId()), [], {})
+    assert next(stream) == b': heartbeat\n\n'
+    stream.close()
+
+
+def test_idle_stream_sends_heartbeats_until_max_seconds(topic):
+    stream = pubsub.stream([topic], heartbeat=0.01, max_seconds=0.05)
+    chunks = list(stream)
+    assert chunks[0].startswith(b'retry: ')
+    assert len(chunks) > 2
+    assert set(chunks[1:]) == {b': heartbeat\n\n'}
+
+
+def test_resume_replays_events_after_last_event_id(topic):
+    events = [make_event(topic) for _ in range(3)]
+    events.insert(2, make_event(pubsub.bill_topic(str(ObjectId()))))
+    for event in events:
+        pubsub.broker.dispatch(event)
+
+    stream = open_stream([topic], last_event_id=events[0]['id'])
+    assert [parse_event(next(stream))[1] for _ in range(2)] == [events[1]['id'], events[3]['id']]
+    assert next(stream) == b': heartbeat\n\n'
+    stream.close()
+
+
+def test_resume_from_an_evicted_id_sends_reset(topic):
+    broker = Broker(buffer_size=2)
+    events = [make_event(topic) for _ in range(3)]
+    for event in events:
+        broker.dispatch(event)
+
+    _, backlog = broker.subscribe([topic], last_event_id=events[0]['id'])
+    assert backlog is None
+    _, backlog = broker.subscribe([topic], last_event_id=events[1]['id'])
+    assert [event['id'] for event in backlog] == [events[2]['id']]
+
+    stream = open_stream([topic], last_event_id=str(ObjectId()))
+    assert next(stream) == b'event: reset\ndata: {}\n\n'
+    stream.close()
+
+
+def test_slow_subscriber_is_closed(topic, monkeypatch):
+    monkeypatch.setattr(pubsub, 'PUBSUB_SUBSCRIBER_QUEUE', 2)
+    broker = Broker()
+    subscription, _ = broker.subscribe([topic])
+    for _ in range(3):
+        broker.dispatch(make_event(topic))
+    assert subscription.closed
+
+
+def test_user_stream_over_http(client, make_user):
+    user, headers = make_user('alice')
+    response = client.get('/api/bills/events', headers=headers, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry: ')
+
+    created = client.post('/api/bills/', headers=headers, json={
+        'bill_name': 'Lunch',
+        'split_method': 'equal',
+        'participants': [{'external_name': 'alice'}, {'external_name': 'Charlie'}],
+        'items': [{'name': 'Soto', 'price_per_unit': 20000, 'quantity': 2}]
+    })
+    assert created.status_code == 201
+    event_type, _, data = parse_event(next(chunks))
+    assert event_type == 'bill.created'
+    assert data['bill_id'] == created.get_json()['_id']
+    response.close()
+
+
+@pytest.fixture
+def streams_disabled(monkeypatch):
+    monkeypatch.setattr(pubsub, 'SSE_ENABLED', False)
+
+
+def test_user_events_unavailable(client, make_user, streams_disabled):
+    _, headers = make_user('alice')
+    response = client.get('/api/bills/events', headers=headers)
+    assert response.status_code == 503
+    assert 'Retry-After' not in response.headers
+
+
+def test_bill_events_unavailable(client, make_user, streams_disabled):
+    _, headers = make_user('alice')
+    response = client.get('/api/bills/000000000000000000000000/events', headers=headers)
+    assert response.status_code == 503
+
+
+def test_nothing_is_published_when_streams_are_off(topic, streams_disabled, monkeypatch):
+    def no_backend():
+        raise AssertionError('backend started')
+    monkeypatch.setattr(pubsub, 'get_backend', no_backend)
+    subscription, _ = pubsub.broker.subscribe([topic])
+    pubsub.publish('participant.paid', topic.split(':', 1)[1], [], {})
+    assert subscription.get(0) is None
+    pubsub.broker.unsubscribe(subscription)
+
+
+def load_gunicorn_config(monkeypatch, **env):
+    monkeypatch.setattr(os, 'environ', {key: value for key, value in os.environ.items()
+                                        if not key.startswith(('SSE_', 'PUBSUB_'))})
+    for key, value in env.items():
+        os.environ[key] = value
+    sys.modules.pop('gunicorn_config', None)
+    try:
+        return importlib.import_module('gunicorn_config')
+    finally:
+        sys.modules.pop('gunicorn_config', None)
+
+
+@pytest.mark.parametrize('worker_class, enabled', [('sync', 'false'), ('gthread', 'false'), ('gevent', 'true')])
+def test_streams_only_enabled_on_gevent(monkeypatch, worker_class, enabled):
+    load_gunicorn_config(monkeypatch, GUNICORN_WORKER_CLASS=worker_class, GUNICORN_WORKERS='1')
+    assert os.environ['SSE_ENABLED'] == enabled
+
+
+@pytest.mark.parametrize('env, backend', [
+    ({'GUNICORN_WORKER_CLASS': 'gevent', 'GUNICORN_WORKERS': '1'}, None),
+    ({'GUNICORN_WORKER_CLASS': 'gevent', 'GUNICORN_WORKERS': '4'}, 'mongo'),
+    ({'GUNICORN_WORKER_CLASS': 'gevent', 'GUNICORN_WORKERS': '4', 'REDIS_URL': 'redis://localhost:6379/0'}, 'redis'),
+    ({'GUNICORN_WORKER_CLASS': 'gevent', 'GUNICORN_WORKERS': '4', 'PUBSUB_BACKEND': 'memory'}, 'memory'),
+    # Streams are off, so nothing is published and no backend is needed
+    ({'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_WORKERS': '4'}, None),
+    ({'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_WORKERS': '4', 'REDIS_URL': 'redis://localhost:6379/0'}, None),
+    ({'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_WORKERS': '4', 'SSE_ENABLED': 'true'}, 'mongo'),
+])
+def test_shared_pubsub_backend_with_several_workers(monkeypatch, env, backend):
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    load_gunicorn_config(monkeypatch, **env)
+    assert os.environ.get('PUBSUB_BACKEND') == backend
+
+
+@pytest.mark.parametrize('value, redacted', [
+    ('GET /api/bills/events?jwt=a.b.c HTTP/1.1', 'GET /api/bills/events?jwt=[redacted] HTTP/1.1'),
+    ('jwt=a.b.c&last_event_id=5', 'jwt=[redacted]&last_event_id=5'),
+    ('last_event_id=5&jwt=a.b.c', 'last_event_id=5&jwt=[redacted]'),
+    ('GET /api/bills/?notjwt=1 HTTP/1.1', 'GET /api/bills/?notjwt=1 HTTP/1.1'),
+    ('', ''),
+])
+def test_access_log_redacts_stream_tokens(monkeypatch, value, redacted):
+    config = load_gunicorn_config(monkeypatch, GUNICORN_WORKERS='1')
+    assert config.redact_tokens(value) == redacted